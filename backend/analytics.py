@@ -0,0 +1,275 @@
+"""
+Weekly and monthly nutrition trends
+
+Trends are read from summary documents in nutrition_summaries, one per user,
+unit ("week" or "month") and period start. Adding a meal counts a change on
+the week and month it falls in, and periods with changes since they were last
+computed are recomputed from db.meals with an aggregation pipeline the next
+time trends are read. A trends page costs at most one small pipeline over the
+user's recent meals instead of a scan of all of them.
+
+`flask rebuild-trends` recomputes every summary at once, grouping with $dateTrunc.
+"""
+
+from datetime import date as Date, datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from nutrition import NUTRIENTS
+from recommend import daily_recommended
+
+UNITS = ("week", "month")
+DEFAULT_PERIODS = 8
+
+# how many summaries to write per bulk request when rebuilding
+REBUILD_BATCH_SIZE = 1000
+
+
+def period_start(date, unit):
+    """
+    Return the first day of the week (from Monday) or month a date is in
+    """
+    day = Date.fromisoformat(date)
+    if unit == "week":
+        day -= timedelta(days=day.weekday())
+    else:
+        day = day.replace(day=1)
+    return day.isoformat()
+
+
+def period_end(start, unit):
+    """
+    Return the first day after the period starting on start
+    """
+    day = Date.fromisoformat(start)
+    if unit == "week":
+        return (day + timedelta(days=7)).isoformat()
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1).isoformat()
+
+
+def recent_periods(unit, count, today=None):
+    """
+    Return the starts of the last count periods up to today, newest first
+    """
+    start = period_start(today or Date.today().isoformat(), unit)
+    starts = [start]
+    while len(starts) < count:
+        start = period_start((Date.fromisoformat(start) - timedelta(days=1)).isoformat(), unit)
+        starts.append(start)
+    return starts
+
+
+def summary_pipeline(match, period_key):
+    """
+    Pipeline that adds up meals by day, then days by period
+    match: $match filter on meals
+    period_key: expression giving a day's period start from its "$_id.date"
+    """
+    by_day = {"_id": {"user_id": "$user_id", "date": "$date"}, "meals": {"$sum": 1}}
+    by_period = {
+        "_id": {"user_id": "$_id.user_id", "start": period_key},
+        "days": {"$sum": 1},
+        "meals": {"$sum": "$meals"},
+    }
+    for nutrient in NUTRIENTS:
+        by_day[nutrient] = {"$sum": f"$nutrition.{nutrient}"}
+        by_period[nutrient] = {"$sum": f"${nutrient}"}
+        by_period[f"below_{nutrient}"] = {
+            "$sum": {"$cond": [{"$lt": [f"${nutrient}", daily_recommended[nutrient]]}, 1, 0]}
+        }
+    return [{"$match": match}, {"$group": by_day}, {"$group": by_period}]
+
+
+def _truncate(unit):
+    # the period start as a date string, worked out on the server
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": {"$dateTrunc": {
+        "date": {"$dateFromString": {"dateString": "$_id.date", "format": "%Y-%m-%d", "onError": None}},
+        "unit": unit,
+        "startOfWeek": "monday",
+    }}}}
+
+
+def _switch(starts, unit):
+    # the period start for a known set of periods, without date operators
+    return {"$switch": {"branches": [
+        {
+            "case": {"$and": [
+                {"$gte": ["$_id.date", start]},
+                {"$lt": ["$_id.date", period_end(start, unit)]},
+            ]},
+            "then": start,
+        }
+        for start in starts
+    ], "default": None}}
+
+
+def _summary(result):
+    return {
+        "days": result["days"],
+        "meals": result["meals"],
+        "totals": {nutrient: result[nutrient] for nutrient in NUTRIENTS},
+        "days_below": {nutrient: result[f"below_{nutrient}"] for nutrient in NUTRIENTS},
+    }
+
+
+def _empty_summary():
+    return {
+        "days": 0,
+        "meals": 0,
+        "totals": dict.fromkeys(NUTRIENTS, 0),
+        "days_below": dict.fromkeys(NUTRIENTS, 0),
+    }
+
+
+def mark_stale(summaries, days, session=None):
+    """
+    Record a change to the week and month of each day
+    days: iterable of (user_id, date)
+    session: optional session to write in
+    """
+    keys = {
+        (user_id, unit, period_start(date, unit))
+        for user_id, date in days
+        for unit in UNITS
+    }
+    if keys:
+        summaries.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "unit": unit, "start": start},
+                {"$inc": {"changes": 1}},
+                upsert=True,
+            )
+            for user_id, unit, start in keys
+        ], ordered=False, session=session)
+
+
+def _is_stale(doc):
+    return doc is None or doc.get("changes", 0) != doc.get("refreshed_changes", -1)
+
+
+def refresh_periods(db, user_id, unit, starts, seen=None, session=None):
+    """
+    Recompute a user's summaries for some periods with one pipeline
+    seen: dict of period start -> change count read before recomputing
+    session: optional session to read in
+    returns: dict of period start -> summary document
+    """
+    seen = seen or {}
+    match = {"user_id": user_id, "date": {"$gte": min(starts), "$lt": period_end(max(starts), unit)}}
+    results = {start: _empty_summary() for start in starts}
+    for result in db.meals.aggregate(summary_pipeline(match, _switch(starts, unit)), session=session):
+        if result["_id"]["start"] in results:
+            results[result["_id"]["start"]] = _summary(result)
+
+    now = datetime.now(timezone.utc)
+    for start, summary in results.items():
+        # changes made while the pipeline ran keep the period stale
+        summary.update(refreshed_changes=seen.get(start, 0), refreshed_at=now)
+    db.nutrition_summaries.bulk_write([
+        UpdateOne(
+            {"user_id": user_id, "unit": unit, "start": start},
+            {"$set": summary, "$setOnInsert": {"changes": 0}},
+            upsert=True,
+        )
+        for start, summary in results.items()
+    ], ordered=False)
+    return results
+
+
+def _trend(start, unit, summary):
+    days = summary["days"]
+    return {
+        "start": start,
+        "end": (Date.fromisoformat(period_end(start, unit)) - timedelta(days=1)).isoformat(),
+        "days": days,
+        "meals": summary["meals"],
+        "averages": {
+            nutrient: round(summary["totals"][nutrient] / days, 1) if days else 0
+            for nutrient in NUTRIENTS
+        },
+        "days_below": summary["days_below"],
+    }
+
+
+def get_trends(db, user_id, unit="week", periods=DEFAULT_PERIODS, today=None, session=None):
+    """
+    Return a user's averages per nutrient and days below the daily value for
+    each of the last periods weeks or months, newest first
+    session: optional session to read in
+    """
+    starts = recent_periods(unit, periods, today)
+    docs = {
+        doc["start"]: doc
+        for doc in db.nutrition_summaries.find(
+            {"user_id": user_id, "unit": unit, "start": {"$in": starts}}, session=session
+        )
+    }
+    stale = [start for start in starts if _is_stale(docs.get(start))]
+    if stale:
+        seen = {start: docs[start].get("changes", 0) for start in stale if start in docs}
+        docs.update(refresh_periods(db, user_id, unit, stale, seen, session))
+    return [_trend(start, unit, docs[start]) for start in starts]
+
+
+def streaks(daily_totals, user_id, today=None, session=None):
+    """
+    Return (current, longest) runs of consecutive days with a meal logged,
+    the current run counts until a full day is missed
+    """
+    days = daily_totals.find({"user_id": user_id}, {"_id": 0, "date": 1, "meals": 1}, session=session)
+    dates = []
+    for doc in days.sort("date", 1):
+        if doc.get("meals", 0) <= 0:
+            continue
+        try:
+            dates.append(Date.fromisoformat(doc["date"]))
+        except (TypeError, ValueError):
+            # days saved before dates were checked
+            continue
+    longest = run = 0
+    previous = None
+    for day in dates:
+        run = run + 1 if previous and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+
+    today = Date.fromisoformat(today) if today else Date.today()
+    current = run if previous and today - previous <= timedelta(days=1) else 0
+    return current, longest
+
+
+def rebuild_summaries(db, units=UNITS):
+    """
+    Recompute every summary from every meal, returns the number of summaries written
+    """
+    started = datetime.now(timezone.utc)
+    count = 0
+    for unit in units:
+        # like refresh_periods, changes made while the pipeline runs keep their period stale
+        seen = {
+            (doc["user_id"], doc["start"]): doc.get("changes", 0)
+            for doc in db.nutrition_summaries.find({"unit": unit}, {"user_id": 1, "start": 1, "changes": 1})
+        }
+        batch = []
+        for result in db.meals.aggregate(summary_pipeline({}, _truncate(unit)), allowDiskUse=True):
+            # meals whose date isn't a day
+            if result["_id"]["start"] is None:
+                continue
+            user_id, start = result["_id"]["user_id"], result["_id"]["start"]
+            key = {"user_id": user_id, "unit": unit, "start": start}
+            summary = dict(_summary(result), refreshed_changes=seen.get((user_id, start), 0), refreshed_at=started)
+            batch.append(UpdateOne(key, {"$set": summary, "$setOnInsert": {"changes": 0}}, upsert=True))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                db.nutrition_summaries.bulk_write(batch, ordered=False)
+                count += len(batch)
+                batch = []
+        if batch:
+            db.nutrition_summaries.bulk_write(batch, ordered=False)
+            count += len(batch)
+
+    # periods that no longer have any meals
+    db.nutrition_summaries.delete_many({"$or": [
+        {"refreshed_at": {"$exists": False}},
+        {"refreshed_at": {"$lt": started}},
+    ]})
+    return count
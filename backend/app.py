@@ -1,105 +1,402 @@
+import time
+
+# startup is measured from here to the first request
+IMPORT_STARTED = time.perf_counter()
+
+import click
 import os
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, Response, g, jsonify, make_response, render_template, request, redirect, session, stream_with_context, url_for
 from flask_login import LoginManager, UserMixin, current_user, login_user, login_required, logout_user
 import pymongo
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId
-from werkzeug.security import generate_password_hash
-from werkzeug.security import check_password_hash
 from datetime import datetime, timezone
-import requests
-from recommend import recommend_meal
-
-# function to get nutrition facts from api 
-def get_nutrition_facts(food_name):
-   """
-   Given a food name use USDA api to get nutrition facts
-   """
-   key = os.getenv("FOOD_API_KEY")
-
-   # send req and get data
-   search_url = f"https://api.nal.usda.gov/fdc/v1/foods/search?api_key={key}&query={food_name}"
-   search_response = requests.get(search_url)
-
-   # handle errors
-   if search_response.status_code != 200:
-      return {
-         "calories": 0,
-         "protein": 0,
-         "carbohydrates": 0,
-         "fiber": 0,
-         "calcium": 0
-      } 
-   search_data = search_response.json()
-
-   # return default values when search not found
-   if not search_data["foods"]:
-      return {
-         "calories": 0,
-         "protein": 0,
-         "carbohydrates": 0,
-         "fiber": 0,
-         "calcium": 0
-      } 
-   
-   # get first food results
-   fdc_id = search_data["foods"][0]["fdcId"]
-
-   # use food id to make request
-   food_url = f"https://api.nal.usda.gov/fdc/v1/food/{fdc_id}?api_key={key}"
-   food_response = requests.get(food_url)
-
-   # handle errors
-   if food_response.status_code != 200:
-      return {
-         "calories": 0,
-         "protein": 0,
-         "carbohydrates": 0,
-         "fiber": 0,
-         "calcium": 0,
-         
-      } 
-   food_data = food_response.json()
-
-   # get nutrients for food and return values
-   nutrients = food_data.get("labelNutrients", {})
-
-   return {
-      "calories": nutrients.get("calories", {}).get("value", 0),
-      "protein": nutrients.get("protein", {}).get("value", 0),
-      "carbohydrates": nutrients.get("carbohydrates", {}).get("value", 0),
-      "fiber": nutrients.get("fiber", {}).get("value", 0),
-      "calcium": nutrients.get("calcium", {}).get("value", 0),
-   }
-
-# get env variables from .env
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from nutrition_cache import NutritionCache
+from nutrition import empty_nutrition, resolve_nutrition, total_nutrition
+from usda_client import USDAClient
+from food_db import FoodDatabase
+from food_parser import PhraseTrie, known_food_names, parse_food_input
+from jobs import JobQueue
+from indexes import ensure_indexes, index_report, is_transient
+from pagination import latest_meal, meal_page
+from meal_io import export_meals, import_meals, read_csv, read_ndjson
+from metrics import REGISTRY, REQUEST_LATENCY, REQUESTS, MongoCommandTimer, SlowRequestProfiler, dependency_timer, shared_metrics
+from singleflight import SingleFlight
+from ttl_cache import TTLCache
+from assets import StaticAssets, build as build_assets, compress_response
+from http_cache import add_validators, make_etag, not_modified, template_version
+from markupsafe import Markup
+from passwords import PasswordHasher, PasswordPoolBusy
+from recommend import daily_recommended
+from meal_recommendations import is_current, recommend_for_meal, recompute_recommendations
+from analytics import UNITS, get_trends, mark_stale, rebuild_summaries, streaks
+from read_routing import ReadRouter, write_token
+from rollups import add_meal_totals, rebuild_daily_totals, update_meal_totals, valid_date
+
+# get env variables from .env, before anything below reads its settings
 load_dotenv()
 
+# shared client for the USDA api
+usda = USDAClient()
+
+# MongoClient options that can be set from the environment, options in
+# MONGO_URI are used when these aren't set
+MONGO_CLIENT_OPTIONS = {
+   "maxPoolSize": "MONGO_MAX_POOL_SIZE",
+   "minPoolSize": "MONGO_MIN_POOL_SIZE",
+   "maxIdleTimeMS": "MONGO_MAX_IDLE_TIME_MS",
+   "waitQueueTimeoutMS": "MONGO_WAIT_QUEUE_TIMEOUT_MS",
+   "serverSelectionTimeoutMS": "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+   "connectTimeoutMS": "MONGO_CONNECT_TIMEOUT_MS",
+   "socketTimeoutMS": "MONGO_SOCKET_TIMEOUT_MS",
+}
+
 def create_app():
    """
    Create the Flask Application
    returns: app: the Flask application object
    """
+   created = time.perf_counter()
    app = Flask(__name__)
  
    # set secret and auto reload templates
    app.secret_key = os.getenv("SECRET_KEY", "supersecretkey12#4")
    app.config["TEMPLATES_AUTO_RELOAD"] = True
    
+   # fingerprinted static files with long cache headers once built
+   assets = StaticAssets(app.static_folder)
+   app.jinja_env.globals["asset_url_for"] = assets.url_for
+   app.view_functions["static"] = assets.send
+
+   compress_min_size = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+
+   @app.after_request
+   def compress(response):
+      return compress_response(response, compress_min_size)
+
+   @app.cli.command("build-assets")
+   def build_assets_command():
+      """
+      Fingerprint and compress the files in static/
+      """
+      print(f" * Built {len(build_assets(app.static_folder))} static files")
+
    # set up for flask login
    login_manager = LoginManager()
    login_manager.init_app(app)
    login_manager.login_view = "index"
 
-   cxn = pymongo.MongoClient(os.getenv("MONGO_URI"))
+   # connect=False waits for the first operation to connect, so a slow or
+   # missing mongo can't hold up startup
+   options = {
+      option: int(os.environ[variable])
+      for option, variable in MONGO_CLIENT_OPTIONS.items()
+      if os.getenv(variable)
+   }
+   cxn = pymongo.MongoClient(
+      os.getenv("MONGO_URI"), connect=False, event_listeners=[MongoCommandTimer()], **options
+   )
    db = cxn[os.getenv("MONGO_DBNAME")]
 
-   # testing for mongoDB connection
-   try:
-      cxn.admin.command("ping")
-      print(" * Connected to MongoDB")
-   except Exception as e:
-      print(" * Error connecting to MongodDB:", e)
+   # history, trends and summary pages can read from secondaries, see read_routing.py
+   reads = ReadRouter(cxn, db)
+   app.config["READ_ROUTER"] = reads
+
+   def user_reads():
+      """
+      Causal session for the user's reads that sees their own latest write
+      """
+      return reads.session(session.get("last_write"))
+
+   def remember_write(mongo_session):
+      """
+      Keep the operation time of the user's latest write in their cookie
+      """
+      token = write_token(mongo_session)
+      if token and token > session.get("last_write", [0, 0]):
+         session["last_write"] = token
+
+   startup = {"indexes": False, "index_errors": {}}
+   startup_times = {}
+
+   def prepare_database():
+      """
+      Check mongo is reachable and create indexes in the background
+      """
+      try:
+         cxn.admin.command("ping")
+         print(" * Connected to MongoDB")
+      except Exception as e:
+         print(" * Error connecting to MongodDB:", e)
+
+      # make sure login and meal queries are indexed, retrying until mongo is up
+      while True:
+         failed = ensure_indexes(db)
+         if not any(is_transient(e) for _, e in failed):
+            break
+         time.sleep(float(os.getenv("MONGO_STARTUP_RETRY", 30)))
+
+      # retrying won't fix these, readyz reports them until the data is fixed and the app restarted
+      startup["index_errors"] = {name: str(e) for name, e in failed}
+      for name, e in failed:
+         print(f" * Index {name} needs fixing by hand:", e)
+      startup["indexes"] = not failed
+
+   threading.Thread(target=prepare_database, name="mongo-startup", daemon=True).start()
+
+   meal_history_page_size = int(os.getenv("MEAL_HISTORY_PAGE_SIZE", 20))
+
+   # rendered meal lists keyed by the user's newest meal, so adding a meal
+   # moves every worker on to new entries
+   meal_list_cache = TTLCache(
+      "meal_lists",
+      int(os.getenv("MEAL_LIST_CACHE_SIZE", 5000)),
+      float(os.getenv("MEAL_LIST_CACHE_TTL", 600)),
+   )
+   app.config["MEAL_LIST_CACHE"] = meal_list_cache
+   templates_version = template_version(os.path.join(app.root_path, app.template_folder), assets.version)
+
+   def meal_list_page(view, page_size, token=None):
+      """
+      Return a page of the user's meals as a validated, cached fragment
+      returns: (304 response or None, rendered meal list, next page token, etag, last modified)
+      """
+      user_id = ObjectId(current_user.id)
+      meals_collection = reads.db("history").meals
+      with user_reads() as mongo_session:
+         latest = latest_meal(meals_collection, user_id, mongo_session)
+         latest_id = latest["_id"] if latest else None
+         last_modified = latest["added_at"] if latest else None
+         etag = make_etag(templates_version, view, current_user.id, latest_id, page_size, token)
+         response = not_modified(etag, last_modified)
+         if response is not None:
+            return response, None, None, etag, last_modified
+
+         key = (current_user.id, view, page_size, token, latest_id)
+         cached = meal_list_cache.get(key)
+         if cached is None:
+            meals, next_page = meal_page(meals_collection, user_id, page_size, token, mongo_session)
+            html = Markup(render_template("_meal_list.html", meals=meals)) if meals else ""
+            cached = (html, next_page)
+            meal_list_cache.set(key, cached)
+      return None, cached[0], cached[1], etag, last_modified
+
+   @app.cli.command("index-report")
+   def index_report_command():
+      """
+      Show index usage and check the hot queries are covered by an index
+      """
+      print(index_report(db))
+
+   @app.cli.command("rebuild-daily-totals")
+   def rebuild_daily_totals_command():
+      """
+      Rebuild the per user daily nutrition totals from the meals collection
+      """
+      print(f" * Rebuilt {rebuild_daily_totals(db)} daily totals")
+
+   @app.cli.command("rebuild-trends")
+   def rebuild_trends_command():
+      """
+      Recompute every weekly and monthly nutrition summary from the meals collection
+      """
+      print(f" * Rebuilt {rebuild_summaries(db)} nutrition summaries")
+
+   @app.cli.command("recompute-recommendations")
+   @click.option("--all", "force", is_flag=True, help="Recompute meals that are already up to date too")
+   def recompute_recommendations_command(force):
+      """
+      Store current recommendations on meals saved with older food tables
+      """
+      print(f" * Recomputed recommendations for {recompute_recommendations(db, force)} meals")
+
+   # cache usda lookups in memory and in mongo
+   nutrition_cache = NutritionCache(db.nutrition_cache)
+   app.config["NUTRITION_CACHE"] = nutrition_cache
+
+   # local food database answers most lookups without the api
+   food_db = FoodDatabase.open(os.getenv("FOOD_DB_PATH", "foods.db"))
+   if food_db is not None:
+      print(" * Using local food database", food_db.path)
+
+   # multi-word food names so "peanut butter" is looked up as one food
+   food_phrases = PhraseTrie(known_food_names(food_db))
+
+   # thread pool for looking up the foods in a meal concurrently
+   nutrition_executor = ThreadPoolExecutor(
+      max_workers=int(os.getenv("NUTRITION_WORKERS", 8)),
+      thread_name_prefix="nutrition",
+   )
+   nutrition_deadline = float(os.getenv("NUTRITION_DEADLINE", 10))
+   import_nutrition_deadline = float(os.getenv("IMPORT_NUTRITION_DEADLINE", 15))
+
+   # share in flight lookups for the same food between requests, and between
+   # workers too when NUTRITION_SHARED_LOCKS is set
+   shared_locks = os.getenv("NUTRITION_SHARED_LOCKS", "").lower() in ("1", "true", "yes")
+   nutrition_flights = SingleFlight(db.nutrition_locks if shared_locks else None)
+
+   def lookup_meal_nutrition(food_list, servings=None):
+      """
+      Get total nutrition facts for the foods in a meal, foods that miss
+      the deadline are left out of the totals
+      servings: optional list of servings of each food
+      returns: (total nutrition facts, list of foods that could not be resolved)
+      """
+      results, unresolved = resolve_nutrition(
+         food_list,
+         usda,
+         nutrition_executor,
+         nutrition_deadline,
+         nutrition_cache,
+         food_db,
+         nutrition_flights,
+      )
+      return total_nutrition(food_list, results, servings), unresolved
+
+   # optionally print where slow requests spend their time
+   slow_ms = os.getenv("PROFILE_SLOW_REQUESTS_MS")
+   profiler = SlowRequestProfiler(float(slow_ms) / 1000) if slow_ms else None
+
+   @app.before_request
+   def start_request_timer():
+      g.request_start = time.perf_counter()
+      if "first_request" not in startup_times:
+         startup_times["first_request"] = g.request_start - IMPORT_STARTED
+         print(f" * First request {startup_times['first_request'] * 1000:.0f} ms after import")
+      if profiler:
+         profiler.start()
+
+   @app.after_request
+   def record_request_metrics(response):
+      duration = time.perf_counter() - g.request_start
+      route = request.url_rule.rule if request.url_rule else "unmatched"
+      REQUEST_LATENCY.observe(duration, route, request.method)
+      REQUESTS.inc(route, request.method, str(response.status_code))
+      if profiler:
+         profiler.stop(f"{request.method} {request.path}", duration)
+      return response
+
+   REGISTRY.gauge_collector(
+      "nutrition_cache",
+      "Nutrition cache hits, misses, evictions and size",
+      lambda: [({"stat": stat}, value) for stat, value in nutrition_cache.stats().items()],
+   )
+   REGISTRY.gauge_collector(
+      "usda_circuit_open",
+      "1 while the USDA api circuit breaker is rejecting calls",
+      lambda: [({}, int(usda.breaker.state == "open"))],
+   )
+
+   # under gunicorn every worker writes its metrics here and a scrape adds them
+   # all up, see gunicorn.conf.py
+   metrics_dir = os.getenv("METRICS_DIR")
+   if metrics_dir:
+      shared_metrics(metrics_dir)
+
+   REGISTRY.gauge_collector(
+      "app_startup_seconds",
+      "Seconds spent in create_app and from importing the app to its first request",
+      lambda: [({"phase": phase}, value) for phase, value in startup_times.items()],
+   )
+
+   @app.route("/healthz")
+   def healthz():
+      """
+      Liveness probe, answers as long as the process can handle requests
+      """
+      return jsonify(status="ok")
+
+   @app.route("/readyz")
+   def readyz():
+      """
+      Readiness probe, fails while mongo can't be reached or an index couldn't be created
+
+      The USDA circuit breaker is reported but doesn't fail the probe, every
+      instance shares the api and meals can still be saved while it is down.
+      """
+      try:
+         with pymongo.timeout(float(os.getenv("READY_TIMEOUT", 1))):
+            cxn.admin.command("ping")
+         mongo = "ok"
+      except Exception as e:
+         mongo = f"unreachable: {e}"
+      body = {
+         "mongo": mongo,
+         "usda": usda.breaker.state,
+         "indexes": "ready" if startup["indexes"] else "pending",
+      }
+      if startup["index_errors"]:
+         body["indexes"] = "failed"
+         body["index_errors"] = startup["index_errors"]
+      return jsonify(body), 200 if mongo == "ok" and not startup["index_errors"] else 503
+
+   @app.route("/metrics")
+   def metrics():
+      """
+      Route for Prometheus to scrape app metrics
+      """
+      body = shared_metrics(metrics_dir).render() if metrics_dir else REGISTRY.render()
+      return Response(body, mimetype="text/plain; version=0.0.4")
+
+   def enrich_meal(payload):
+      """
+      Job that fills in nutrition facts for a pending meal
+      """
+      meal = db.meals.find_one({"_id": payload["meal_id"], "status": "pending"})
+      if not meal:
+         return
+      total_nutrition_facts, unresolved = lookup_meal_nutrition(meal["foods"], meal.get("servings"))
+      # the day's totals only have the nutrition the meal was saved with, empty
+      # or the foods an import already resolved
+      missing = {
+         nutrient: value - meal["nutrition"].get(nutrient, 0)
+         for nutrient, value in total_nutrition_facts.items()
+      }
+      recommendations = recommend_for_meal(
+         db.daily_totals, dict(meal, nutrition=total_nutrition_facts), missing
+      )
+      result = db.meals.update_one(
+         {"_id": meal["_id"], "status": "pending"},
+         {"$set": {
+            "nutrition": total_nutrition_facts,
+            "unresolved_foods": unresolved,
+            "status": "complete",
+            "recommendations": recommendations,
+         }},
+      )
+      # only the worker that completed the meal updates the day's totals
+      if result.modified_count:
+         old_nutrition = meal["nutrition"]
+         meal["nutrition"] = total_nutrition_facts
+         update_meal_totals(db.daily_totals, meal, old_nutrition)
+         mark_stale(db.nutrition_summaries, [(meal["user_id"], meal["date"])])
+
+   def give_up_on_meal(payload, error):
+      """
+      Mark a pending meal failed once its job runs out of attempts, so its page stops waiting
+      """
+      meal = db.meals.find_one({"_id": payload["meal_id"], "status": "pending"}, {"foods": 1, "unresolved_foods": 1})
+      if not meal:
+         return
+      db.meals.update_one(
+         {"_id": meal["_id"], "status": "pending"},
+         {"$set": {
+            "status": "failed",
+            "unresolved_foods": meal.get("unresolved_foods") or meal["foods"],
+            "error": str(error),
+         }},
+      )
+
+   # in async mode meals are saved straight away and nutrition is looked up
+   # by background workers
+   ingest_mode = os.getenv("INGEST_MODE", "sync")
+   job_queue = JobQueue(db.jobs, {"enrich_meal": enrich_meal}, failure_handlers={"enrich_meal": give_up_on_meal})
+   app.config["JOB_QUEUE"] = job_queue
+   if ingest_mode == "async":
+      job_queue.start()
    
    # class for user login
    class User(UserMixin):
@@ -108,13 +405,39 @@ def create_app():
             self.id = str(user_doc["_id"])
             self.username = user_doc["username"]
 
+   # bcrypt with a configurable cost, checked on a bounded pool
+   hasher = PasswordHasher()
+
+   # users rarely change, so keep recently loaded ones in memory instead of
+   # querying mongo on every request, or read them from the signed session
+   user_cache = TTLCache(
+      "users",
+      int(os.getenv("USER_CACHE_SIZE", 10000)),
+      float(os.getenv("USER_CACHE_TTL", 60)),
+   )
+   app.config["USER_CACHE"] = user_cache
+   users_in_session = os.getenv("USER_SESSION_MODE") == "session"
+
+   def remember_user(user):
+      """
+      Keep a logged in user's name so later requests don't need to load it
+      """
+      user_cache.set(user.id, user.username)
+      if users_in_session:
+         session["username"] = user.username
+
    @login_manager.user_loader
    def user_loader(id):
-      user_file = db.users.find_one({"_id": ObjectId(id)})
+      username = session.get("username") if users_in_session else user_cache.get(id)
+      if username is not None:
+         return User({"_id": id, "username": username})
+
+      user_file = db.users.find_one({"_id": ObjectId(id)}, {"username": 1})
       if user_file:
          user = User()
          user.id = str(user_file["_id"])
          user.username = user_file["username"]
+         remember_user(user)
          return user
       return None
    
@@ -136,10 +459,20 @@ def create_app():
             document = db.users.find_one({"username": username})
             if document:
                # compare passwords
-               if check_password_hash(document["password"], password):
-                  user = User()
-                  user.id = str(document["_id"])
+               try:
+                  correct = hasher.verify(document["password"], password)
+               except PasswordPoolBusy:
+                  return render_template("index.html", error="Too many people are logging in. Try again.")
+               if correct:
+                  # upgrade old hashes now that we know the password
+                  if hasher.needs_rehash(document["password"]):
+                     db.users.update_one(
+                        {"_id": document["_id"]},
+                        {"$set": {"password": hasher.hash(password)}},
+                     )
+                  user = User(document)
                   login_user(user)
+                  remember_user(user)
                   return redirect(url_for("home"))
                else:
                   return render_template("index.html", error="Incorrect Password. Try again.")
@@ -178,8 +511,16 @@ def create_app():
             return render_template("register.html", error="Username already exists.")
 
         # Insert into MongoDB
-        hashed_pw = generate_password_hash(password)
-        result = db.users.insert_one({"username": username, "password": hashed_pw})
+        try:
+            hashed_pw = hasher.hash(password)
+        except PasswordPoolBusy:
+            return render_template("register.html", error="Too many people are registering. Try again.")
+        try:
+            result = db.users.insert_one({"username": username, "password": hashed_pw})
+        except DuplicateKeyError:
+            # someone registered the same name since the check above
+            print("Username already exists")
+            return render_template("register.html", error="Username already exists.")
         print(f"User inserted with ID: {result.inserted_id}")
 
         user_doc = db.users.find_one({"_id": result.inserted_id})
@@ -191,6 +532,7 @@ def create_app():
 
         # Log user in
         login_user(user)
+        remember_user(user)
         print("User logged in — redirecting to /home")
 
         return redirect(url_for("home"))
@@ -203,6 +545,8 @@ def create_app():
       """
       Route for logging user out
       """
+      user_cache.invalidate(current_user.id)
+      session.pop("username", None)
       logout_user()
       return redirect(url_for("index"))
    
@@ -213,11 +557,12 @@ def create_app():
       Route for app home page
       """
       # get user's most recent foods
-      recent_meals = list(db.meals.find({
-         "user_id": ObjectId(current_user.id)
-      }).sort("added_at", -1))
+      response, meal_list, _, etag, last_modified = meal_list_page("home", 3)
+      if response is not None:
+         return response
 
-      return render_template("home.html", meals = recent_meals)
+      response = make_response(render_template("home.html", meal_list=meal_list))
+      return add_validators(response, etag, last_modified)
 
    @app.route("/meal-history")
    @login_required
@@ -225,10 +570,14 @@ def create_app():
       """
       Route for viewing meal history
       """
-      meals = list(db.meals.find({
-         "user_id": ObjectId(current_user.id)
-      }).sort("added_at", -1))
-      return render_template("meal_history.html", meals=meals)
+      response, meal_list, next_page, etag, last_modified = meal_list_page(
+         "history", meal_history_page_size, request.args.get("before")
+      )
+      if response is not None:
+         return response
+
+      response = make_response(render_template("meal_history.html", meal_list=meal_list, next_page=next_page))
+      return add_validators(response, etag, last_modified)
 
    @app.route("/add-meal", methods=["GET", "POST"])
    @login_required
@@ -240,40 +589,56 @@ def create_app():
          # get meal data from form
          food_input = request.form.get("food_list").strip()
          meal_type = request.form.get("meal_type")
-         date = request.form.get("date", datetime.now().strftime("%Y-%m-%d"))
-
-         # split food input into list
-         food_list = [food.strip() for food in food_input.split() if food.strip()]
-
-         # initialze nutrition count for meal
-         total_nutrition_facts = {
-            "calories": 0,
-            "protein": 0,
-            "carbohydrates": 0,
-            "fiber": 0,
-            "calcium": 0
-         }
+         try:
+            # checked before anything is written, totals and trends are keyed by the day
+            date = valid_date(request.form.get("date", datetime.now().strftime("%Y-%m-%d")))
+         except ValueError:
+            return render_template(
+               "add_meal.html",
+               date=datetime.now().strftime("%Y-%m-%d"),
+               food_list=food_input,
+               error="Enter the date as YYYY-MM-DD.",
+            ), 400
+
+         # parse food input into foods and servings of each
+         servings = parse_food_input(food_input, food_phrases)
+         food_list = list(servings)
 
-         # get nutrition facts for each food item
-         for food in food_list:
-            nutrition_facts = get_nutrition_facts(food)
-            total_nutrition_facts["calories"] += nutrition_facts["calories"]
-            total_nutrition_facts["protein"] += nutrition_facts["protein"]
-            total_nutrition_facts["carbohydrates"] += nutrition_facts["carbohydrates"]
-            total_nutrition_facts["fiber"] += nutrition_facts["fiber"]
-            total_nutrition_facts["calcium"] += nutrition_facts["calcium"]
-         
          # insert meal to db 
          meal = {
             "user_id": ObjectId(current_user.id),
             "food_input": food_input,
             "foods": food_list,
+            "servings": list(servings.values()),
             "meal_type": meal_type,
             "date": date,
-            "nutrition": total_nutrition_facts,
             "added_at": datetime.now(timezone.utc)
          }
-         meal_doc = db.meals.insert_one(meal).inserted_id
+
+         if ingest_mode == "async":
+            # save now and let a worker look up nutrition facts
+            meal["nutrition"] = empty_nutrition()
+            meal["unresolved_foods"] = []
+            meal["status"] = "pending"
+            with reads.session() as mongo_session:
+               meal_doc = db.meals.insert_one(meal, session=mongo_session).inserted_id
+               add_meal_totals(db.daily_totals, meal, session=mongo_session)
+               mark_stale(db.nutrition_summaries, [(meal["user_id"], meal["date"])], mongo_session)
+               remember_write(mongo_session)
+            job_queue.enqueue("enrich_meal", {"meal_id": meal_doc})
+            return redirect(url_for("meal_summary", meal_id=str(meal_doc)))
+
+         with dependency_timer("nutrition", "resolve"):
+            meal["nutrition"], meal["unresolved_foods"] = lookup_meal_nutrition(food_list, meal["servings"])
+         meal["status"] = "complete"
+         with dependency_timer("recommend", "recommend_for_meal"):
+            meal["recommendations"] = recommend_for_meal(db.daily_totals, meal, meal["nutrition"])
+         # written in one causal session so the pages read next can wait for it
+         with reads.session() as mongo_session:
+            meal_doc = db.meals.insert_one(meal, session=mongo_session).inserted_id
+            add_meal_totals(db.daily_totals, meal, session=mongo_session)
+            mark_stale(db.nutrition_summaries, [(meal["user_id"], meal["date"])], mongo_session)
+            remember_write(mongo_session)
          return redirect(url_for("meal_summary", meal_id=str(meal_doc)))
 
       # handle GET requests
@@ -287,10 +652,11 @@ def create_app():
       """
       # find meal from database
       try:
-         meal = db.meals.find_one({
-            "_id": ObjectId(meal_id),
-            "user_id": ObjectId(current_user.id)
-         })
+         with user_reads() as mongo_session:
+            meal = reads.db("summary").meals.find_one({
+               "_id": ObjectId(meal_id),
+               "user_id": ObjectId(current_user.id)
+            }, session=mongo_session)
       except:
          # return to home if error occurs
          return redirect(url_for("home"))
@@ -299,13 +665,117 @@ def create_app():
       if not meal:
          return redirect(url_for("home"))
 
-      recommendations = recommend_meal(meal["nutrition"])
-
-      return render_template("meal_summary.html", meal=meal, recommendations=recommendations)
-
+      # nutrition is still being looked up, the page refreshes until it's done
+      if meal.get("status") == "pending":
+         etag = make_etag(templates_version, "summary", meal)
+         return not_modified(etag) or add_validators(
+            make_response(render_template("meal_summary.html", meal=meal, pending=True)), etag
+         )
+
+      # recommendations are stored when the meal is added, meals from before
+      # that or from older food tables get them on their first view
+      if not is_current(meal):
+         with dependency_timer("recommend", "recommend_for_meal"):
+            meal["recommendations"] = recommend_for_meal(db.daily_totals, meal)
+         db.meals.update_one({"_id": meal["_id"]}, {"$set": {"recommendations": meal["recommendations"]}})
+
+      # the page is rendered from the meal document alone
+      etag = make_etag(templates_version, "summary", meal)
+      response = not_modified(etag, meal.get("added_at"))
+      if response is not None:
+         return response
+
+      response = make_response(render_template(
+         "meal_summary.html",
+         meal=meal,
+         recommendations=meal["recommendations"]["foods"],
+         still_needed=meal["recommendations"]["still_needed"],
+      ))
+      return add_validators(response, etag, meal.get("added_at"))
+
+   @app.route("/trends")
+   @login_required
+   def trends():
+      """
+      Route for viewing weekly or monthly nutrition trends
+      """
+      unit = request.args.get("unit", "week")
+      if unit not in UNITS:
+         unit = "week"
+      user_id = ObjectId(current_user.id)
+      analytics_db = reads.db("analytics")
+      with user_reads() as mongo_session:
+         with dependency_timer("analytics", "get_trends"):
+            periods = get_trends(analytics_db, user_id, unit, session=mongo_session)
+         current_streak, longest_streak = streaks(analytics_db.daily_totals, user_id, session=mongo_session)
+      return render_template(
+         "trends.html",
+         unit=unit,
+         periods=periods,
+         targets=daily_recommended,
+         current_streak=current_streak,
+         longest_streak=longest_streak,
+      )
+
+   @app.route("/api/meals/import", methods=["POST"])
+   @login_required
+   def import_meals_api():
+      """
+      Route for importing many meals from a JSON Lines or csv upload
+      """
+      # read as bytes, lines that aren't UTF-8 are reported like any other bad line
+      lines = request.stream
+      if request.mimetype == "text/csv" or request.args.get("format") == "csv":
+         records = read_csv(lines)
+      else:
+         records = read_ndjson(lines)
+
+      # lookups for the whole upload share one deadline that ends well inside
+      # the worker timeout, anything left over is looked up by the job queue
+      stop_at = time.monotonic() + import_nutrition_deadline
+
+      def resolve(foods):
+         remaining = stop_at - time.monotonic()
+         if remaining <= 0:
+            return {}, list(foods)
+         return resolve_nutrition(
+            foods, usda, nutrition_executor, remaining, nutrition_cache, food_db, nutrition_flights
+         )
+
+      def enqueue(meal_id):
+         job_queue.enqueue("enrich_meal", {"meal_id": meal_id})
+         # sync mode only starts workers once there is something to look up
+         job_queue.start()
+
+      summary = import_meals(
+         db, ObjectId(current_user.id), records, resolve, phrases=food_phrases, enqueue=enqueue
+      )
+      return jsonify(summary), 200 if summary["imported"] or not summary["errors"] else 400
+
+   @app.route("/api/meals/export")
+   @login_required
+   def export_meals_api():
+      """
+      Route for downloading all of a user's meals as JSON Lines
+      """
+      cursor = db.meals.find(
+         {"user_id": ObjectId(current_user.id)},
+         {"food_input": 1, "foods": 1, "meal_type": 1, "date": 1, "nutrition": 1, "added_at": 1},
+         batch_size=500,
+      ).sort("added_at", 1)
+      return Response(
+         stream_with_context(export_meals(cursor)),
+         mimetype="application/x-ndjson",
+         headers={"Content-Disposition": "attachment; filename=meals.jsonl"},
+      )
+
+   startup_times["create_app"] = time.perf_counter() - created
    return app
 
 
-app = create_app()
+# hashing processes (PASSWORD_POOL=process) re-import this module as __mp_main__
+# when it is run directly, they only need passwords.py
+if __name__ != "__mp_main__":
+   app = create_app()
 if __name__ == "__main__":
    app.run(debug=True, host="0.0.0.0", port=8080)
\ No newline at end of file
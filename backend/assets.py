@@ -0,0 +1,180 @@
+"""
+Fingerprinted, precompressed static files
+
+`python assets.py` (or `flask build-assets`) copies every file in static/ to
+static/build/ with a hash of its contents in the name, writes gzip and brotli
+copies next to it and a manifest of the original names. Templates link files
+with asset_url_for, which works like url_for but uses the fingerprinted name
+when there is one. A fingerprinted file never changes, so it is served with an
+immutable cache header and in the smallest encoding the browser accepts.
+
+Text responses from the app over a size threshold are gzipped as they are sent.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    # .br files are only written with `pip install brotli`
+    brotli = None
+
+BUILD_DIR = "build"
+MANIFEST = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# best first, browsers that accept brotli get it over gzip
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+def _compress(data, encoding):
+    if encoding == "gzip":
+        # mtime=0 so the same file always builds to the same bytes
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def build(static_dir, build_dir=None):
+    """
+    Fingerprint and compress every file in static_dir
+    returns: manifest of original name -> fingerprinted name under static_dir
+    """
+    build_dir = build_dir or os.path.join(static_dir, BUILD_DIR)
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != build_dir)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+
+            stem, extension = os.path.splitext(relative)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+            target = os.path.join(build_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+            for encoding, suffix in ENCODINGS:
+                if encoding == "br" and brotli is None:
+                    continue
+                compressed = _compress(data, encoding)
+                # tiny files can come out bigger
+                if len(compressed) < len(data):
+                    with open(target + suffix, "wb") as f:
+                        f.write(compressed)
+            manifest[relative] = f"{BUILD_DIR}/{hashed}"
+
+    with open(os.path.join(build_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class StaticAssets:
+    """
+    Serves built static files and links templates to them
+
+    Without a build, files are linked and served from static/ as usual.
+    folder: the app's static folder
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        try:
+            with open(os.path.join(folder, BUILD_DIR, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        # changes whenever any built file does, pages linking them are versioned with it
+        self.version = hashlib.sha1(json.dumps(self.manifest, sort_keys=True).encode()).hexdigest()[:12]
+        # precompressed copies on disk, checked once instead of on every request
+        self.encoded = {
+            name: [
+                (encoding, suffix) for encoding, suffix in ENCODINGS
+                if os.path.exists(os.path.join(folder, name + suffix))
+            ]
+            for name in self.manifest.values()
+        }
+
+    def url_for(self, endpoint, **values):
+        """
+        url_for that links static files to their fingerprinted copy
+        """
+        if endpoint == "static" and values.get("filename") in self.manifest:
+            values["filename"] = self.manifest[values["filename"]]
+        return url_for(endpoint, **values)
+
+    def send(self, filename):
+        """
+        View for /static/<filename>
+        """
+        if filename not in self.encoded:
+            return send_from_directory(self.folder, filename)
+
+        for encoding, suffix in self.encoded[filename]:
+            if request.accept_encodings[encoding]:
+                response = send_from_directory(
+                    self.folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0]
+                )
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_from_directory(self.folder, filename)
+        response.headers["Cache-Control"] = IMMUTABLE
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+def compress_response(response, min_size, level=6):
+    """
+    Gzip a text response if the browser accepts it and it is at least min_size bytes
+    """
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype or "").startswith(COMPRESSIBLE)
+        or not request.accept_encodings["gzip"]
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=level))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    # the compressed bytes differ, so the same tag can only be a weak match
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def main():
+    """
+    Build the static files from the command line
+    """
+    parser = argparse.ArgumentParser(description="Fingerprint and compress static files")
+    parser.add_argument("static", nargs="?", default=os.path.join(os.path.dirname(__file__), "static"))
+    args = parser.parse_args()
+
+    manifest = build(args.static)
+    print(f" * Built {len(manifest)} static files in {os.path.join(args.static, BUILD_DIR)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Measure food input parsing throughput and the lookups it saves
+
+Run from the backend folder:
+    python benchmarks/bench_parser.py --meals 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from food_parser import COMMON_PHRASES, DEFAULT_PHRASES, parse_food_input  # noqa: E402
+
+SINGLE_FOODS = ["eggs", "toast", "rice", "banana", "apple", "coffee", "oats", "salmon", "beans"]
+AMOUNTS = ["", "", "2", "a", "1 1/2 cups", "200g", "3 slices"]
+
+
+def random_meals(rng, count):
+    """
+    Return meals typed the way people type them, with and without commas
+    """
+    meals = []
+    for _ in range(count):
+        foods = rng.sample(SINGLE_FOODS, 2) + rng.sample(COMMON_PHRASES, 2) + rng.sample(SINGLE_FOODS, 1)
+        parts = [f"{rng.choice(AMOUNTS)} {food}".strip() for food in foods]
+        meals.append((", " if rng.random() < 0.5 else " ").join(parts))
+    return meals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--meals", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    meals = random_meals(random.Random(args.seed), args.meals)
+
+    start = time.perf_counter()
+    old = [[food for food in meal.split() if food.strip(",")] for meal in meals]
+    split_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = [parse_food_input(meal, DEFAULT_PHRASES) for meal in meals]
+    parse_seconds = time.perf_counter() - start
+
+    old_lookups = sum(len(set(foods)) for foods in old)
+    new_lookups = sum(len(foods) for foods in new)
+    print(f"{args.meals} meals, {DEFAULT_PHRASES.size} known phrases")
+    for name, seconds in [("split", split_seconds), ("parse_food_input", parse_seconds)]:
+        print(f"  {name:17} {seconds * 1e6 / args.meals:8.2f} us/meal  {args.meals / seconds:10.0f} meals/s")
+    print(f"  lookups per meal  {old_lookups / args.meals:.2f} split, {new_lookups / args.meals:.2f} parsed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Measure password checks per second for each bcrypt cost and pool type
+
+Run from the backend folder:
+    python benchmarks/bench_passwords.py --rounds 10 11 12 --logins 50
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from passwords import HashPool, PasswordHasher  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--pools", nargs="+", default=["inline", "thread", "process"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.logins} logins, {args.concurrency} at a time, {args.workers} hashing workers")
+    for kind in args.pools:
+        pool = HashPool(kind, args.workers, max_pending=args.concurrency, wait=60)
+        for rounds in args.rounds:
+            hasher = PasswordHasher("bcrypt", rounds, pool)
+            hashed = hasher.hash("password")
+
+            # the requests themselves run on threads like gthread workers
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as requests:
+                list(requests.map(lambda _: hasher.verify(hashed, "password"), range(args.logins)))
+            seconds = time.perf_counter() - start
+
+            per_second = args.logins / seconds
+            print(f"  {kind:8} rounds={rounds:<3} {seconds * 1000 / args.logins:8.1f} ms/login"
+                  f"  {per_second:7.1f} logins/s  {per_second / args.workers:7.1f} logins/s/core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare recommend_meal with the FoodMatrix recommendation engine
+
+Run from the backend folder:
+    python benchmarks/bench_recommend.py --users 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from recommend import NUTRIENT_ORDER, RECOMMENDED, FoodMatrix, daily_deficits, recommend_meal  # noqa: E402
+
+
+def random_totals(rng, count):
+    """
+    Return daily totals between 0% and 120% of the recommended values
+    """
+    amounts = rng.uniform(0, 1.2, size=(count, len(NUTRIENT_ORDER))) * RECOMMENDED
+    return [dict(zip(NUTRIENT_ORDER, row.tolist())) for row in amounts]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    totals = random_totals(rng, args.users)
+    matrix = FoodMatrix(seed=args.seed)
+
+    def baseline():
+        for day in totals:
+            recommend_meal(day)
+
+    def single():
+        for day in totals:
+            _, remaining = daily_deficits([day])
+            matrix.top_k(remaining, 3)
+
+    def batch():
+        _, remaining = daily_deficits(totals)
+        matrix.top_k(remaining, 3)
+
+    print(f"{args.users} users, {len(matrix.names)} candidate foods")
+    for name, function in [("recommend_meal", baseline), ("engine per call", single), ("engine batch", batch)]:
+        seconds = timed(function)
+        print(f"  {name:16} {seconds * 1e6 / args.users:8.1f} us/user  {args.users / seconds:12.0f} users/s")
+
+
+if __name__ == "__main__":
+    main()
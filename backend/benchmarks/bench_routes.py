@@ -0,0 +1,274 @@
+"""
+Benchmark the Flask routes against seeded users and meals
+
+Runs create_app() against mongomock (or a real MongoDB with --mongo-uri) with a
+local stub standing in for the USDA api, then drives each route and writes
+throughput and latency percentiles to a JSON file so runs can be compared
+between commits.
+
+Run from the backend folder:
+    python benchmarks/bench_routes.py --users 100 --meals 100 --output bench.json
+    python benchmarks/bench_routes.py --mongo-uri mongodb://localhost:27017 --users 10000 --meals 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import mongomock  # noqa: E402
+import pymongo  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from benchmarks.load_test import percentile  # noqa: E402
+from tests.usda_stub import USDAStub  # noqa: E402
+
+FOODS = ["eggs", "rice", "chicken", "broccoli", "beans", "milk", "bread", "apple", "banana", "oats"]
+PASSWORD = "benchmark-password"
+SEED_BATCH_SIZE = 10000
+
+
+def stub_foods():
+    """
+    Return label nutrients for every food the benchmark logs
+    """
+    rng = random.Random(0)
+    return {
+        food: {nutrient: {"value": rng.randint(0, 300)} for nutrient in
+               ("calories", "protein", "carbohydrates", "fiber", "calcium")}
+        for food in FOODS
+    }
+
+
+def seed(db, users, meals_per_user):
+    """
+    Insert users and their meals, returns list of (username, user id)
+    """
+    hashed = generate_password_hash(PASSWORD)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    rng = random.Random(0)
+    seeded = []
+    batch = []
+
+    for u in range(users):
+        username = f"bench-user-{u}"
+        user_id = db.users.insert_one({"username": username, "password": hashed}).inserted_id
+        for m in range(meals_per_user):
+            added_at = start + timedelta(minutes=m * 30)
+            meal = {
+                "user_id": user_id,
+                "food_input": " ".join(rng.sample(FOODS, 3)),
+                "meal_type": rng.choice(["breakfast", "lunch", "dinner", "snack"]),
+                "date": added_at.strftime("%Y-%m-%d"),
+                "nutrition": {"calories": 500, "protein": 20, "carbohydrates": 60, "fiber": 5, "calcium": 200},
+                "status": "complete",
+                "added_at": added_at,
+            }
+            meal["foods"] = meal["food_input"].split()
+            batch.append(meal)
+            if len(batch) >= SEED_BATCH_SIZE:
+                db.meals.insert_many(batch, ordered=False)
+                batch = []
+        seeded.append((username, user_id))
+    if batch:
+        db.meals.insert_many(batch, ordered=False)
+    return seeded
+
+
+def route_requests(db, seeded, count, rng):
+    """
+    Return (route name, username, method, path, form data) for each request to send,
+    every request is for a random seeded user so per user caches aren't always warm
+    """
+    def summary(user_id):
+        meal = db.meals.find_one({"user_id": user_id}, {"_id": 1})
+        return ("GET", f"/meal-summary/{meal['_id']}", None) if meal else None
+
+    routes = [
+        ("/", lambda user_id: ("GET", "/", None)),
+        ("/home", lambda user_id: ("GET", "/home", None)),
+        ("/meal-history", lambda user_id: ("GET", "/meal-history", None)),
+        ("/add-meal", lambda user_id: ("POST", "/add-meal", {
+            "food_list": " ".join(rng.sample(FOODS, 3)),
+            "meal_type": "lunch",
+            "date": datetime.now().strftime("%Y-%m-%d"),
+        })),
+        ("/meal-summary/<id>", summary),
+    ]
+    requests = []
+    for name, make in routes:
+        for _ in range(count):
+            username, user_id = rng.choice(seeded)
+            request = make(user_id)
+            if request:
+                requests.append((name, username, *request))
+    return requests
+
+
+def log_in(app, usernames):
+    """
+    Log every user in once, returns dict of username -> session cookie
+    """
+    cookie = app.config["SESSION_COOKIE_NAME"]
+    sessions = {}
+    for username in usernames:
+        client = app.test_client()
+        client.post("/", data={"username": username, "password": PASSWORD})
+        sessions[username] = client.get_cookie(cookie).value
+    return sessions
+
+
+def drive(app, requests, sessions, concurrency):
+    """
+    Send requests from logged in test clients
+    sessions: dict of username -> session cookie, from log_in
+    returns: dict of route -> (latencies, seconds from the route's first request to its last response)
+    """
+    latencies = {}
+    spans = {}
+    lock = threading.Lock()
+    queue = list(requests)
+
+    def worker():
+        clients = {}
+        while True:
+            with lock:
+                if not queue:
+                    return
+                name, username, method, path, data = queue.pop()
+            if username not in clients:
+                clients[username] = app.test_client()
+                clients[username].set_cookie(app.config["SESSION_COOKIE_NAME"], sessions[username])
+            start = time.perf_counter()
+            response = clients[username].open(path, method=method, data=data)
+            end = time.perf_counter()
+            if response.status_code >= 500:
+                raise RuntimeError(f"{method} {path} returned {response.status_code}")
+            with lock:
+                latencies.setdefault(name, []).append(end - start)
+                first, last = spans.get(name, (start, end))
+                spans[name] = (min(first, start), max(last, end))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {name: (values, spans[name][1] - spans[name][0]) for name, values in latencies.items()}
+
+
+def summarize(routes):
+    """
+    Return throughput and latency percentiles for each route
+    routes: dict of route -> (latencies, wall clock seconds), from drive
+    """
+    results = {}
+    for name, (values, seconds) in sorted(routes.items()):
+        values.sort()
+        results[name] = {
+            "requests": len(values),
+            "requests_per_second": round(len(values) / seconds, 1) if seconds else 0,
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+        }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(users=100, meals=100, requests=200, concurrency=1, usda_latency=0.05, mongo_uri=None):
+    """
+    Seed a database, start the app and benchmark every route
+    returns: dict of settings and per route results
+    """
+    if mongo_uri:
+        client = pymongo.MongoClient(mongo_uri)
+        dbname = f"benchmark_{int(time.time())}"
+    else:
+        client = mongomock.MongoClient()
+        dbname = "benchmark"
+    db = client[dbname]
+
+    # the app creates its client from these, hand it the one seeded above
+    original_dbname = os.environ.get("MONGO_DBNAME")
+    os.environ["MONGO_DBNAME"] = dbname
+    original_client = pymongo.MongoClient
+    pymongo.MongoClient = lambda *args, **kwargs: client
+
+    import app as app_module
+    original_usda = app_module.usda
+
+    try:
+        seeded = seed(db, users, meals)
+        with USDAStub(stub_foods(), latency=usda_latency) as stub:
+            app_module.usda = app_module.USDAClient(api_key="benchmark", base_url=stub.url, retries=0)
+            app = app_module.create_app()
+            app.testing = True
+
+            planned = route_requests(db, seeded, requests, random.Random(0))
+            sessions = log_in(app, {username for _, username, *_ in planned})
+            start = time.perf_counter()
+            routes = drive(app, planned, sessions, concurrency)
+            elapsed = time.perf_counter() - start
+    finally:
+        pymongo.MongoClient = original_client
+        app_module.usda = original_usda
+        if original_dbname is None:
+            os.environ.pop("MONGO_DBNAME", None)
+        else:
+            os.environ["MONGO_DBNAME"] = original_dbname
+        if mongo_uri:
+            client.drop_database(dbname)
+
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            "users": users,
+            "meals_per_user": meals,
+            "requests_per_route": requests,
+            "concurrency": concurrency,
+            "usda_latency": usda_latency,
+            "mongo": "mongodb" if mongo_uri else "mongomock",
+        },
+        "total_seconds": round(elapsed, 3),
+        "routes": summarize(routes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Flask routes")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--meals", type=int, default=100, help="meals per user")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--usda-latency", type=float, default=0.05, help="seconds per stub USDA response")
+    parser.add_argument("--mongo-uri", help="benchmark a real MongoDB instead of mongomock")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.users, args.meals, args.requests, args.concurrency, args.usda_latency, args.mongo_uri)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measure time from importing the app to answering its first request
+
+Each run starts a fresh interpreter, imports app.py, and sends one request to
+/healthz with the Flask test client. By default MONGO_URI points at an address
+nothing listens on, so a startup that waits for MongoDB shows up as a stall.
+
+Run from the backend folder:
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --mongo-uri mongodb://localhost:27017
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+status = app.app.test_client().get("/healthz").status_code
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_request": done - start, "status": status}))
+"""
+
+
+def run_once(mongo_uri, timeout):
+    env = dict(os.environ, MONGO_URI=mongo_uri, MONGO_DBNAME=os.getenv("MONGO_DBNAME", "bench_startup"))
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND, env=env, capture_output=True, text=True, timeout=timeout
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mongo-uri", default="mongodb://10.255.255.1:27017/?serverSelectionTimeoutMS=5000")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    runs = [run_once(args.mongo_uri, args.timeout) for _ in range(args.runs)]
+    print(f"{args.runs} runs against {args.mongo_uri}")
+    for key in ("import", "first_request"):
+        values = [run[key] * 1000 for run in runs]
+        print(f"  {key:14} median {statistics.median(values):8.0f} ms  max {max(values):8.0f} ms")
+    print(f"  statuses       {sorted({run['status'] for run in runs})}")
+
+
+if __name__ == "__main__":
+    main()
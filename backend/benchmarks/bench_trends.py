@@ -0,0 +1,127 @@
+"""
+Benchmark nutrition trends against a seeded MongoDB
+
+Seeds meals for many users over a year, then times reading a user's weekly
+trends by loading every meal into Python, with cached summaries on a cold and
+a warm read, and a full rebuild of every summary with $dateTrunc. Needs a real
+MongoDB, mongomock doesn't have the date operators.
+
+Run from the backend folder:
+    python benchmarks/bench_trends.py --mongo-uri mongodb://localhost:27017 --users 2000 --meals 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pymongo  # noqa: E402
+from bson.objectid import ObjectId  # noqa: E402
+
+from analytics import get_trends, period_start, rebuild_summaries  # noqa: E402
+from benchmarks.load_test import percentile  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+from nutrition import NUTRIENTS  # noqa: E402
+from recommend import daily_recommended  # noqa: E402
+
+SEED_BATCH_SIZE = 10000
+TODAY = "2025-04-30"
+
+
+def seed(db, users, meals_per_user):
+    """
+    Insert meals spread over the year before TODAY, returns the user ids
+    """
+    rng = random.Random(0)
+    first_day = date.fromisoformat(TODAY) - timedelta(days=364)
+    user_ids = [ObjectId() for _ in range(users)]
+    batch = []
+    for user_id in user_ids:
+        for _ in range(meals_per_user):
+            batch.append({
+                "user_id": user_id,
+                "date": (first_day + timedelta(days=rng.randrange(365))).isoformat(),
+                "status": "complete",
+                "nutrition": {nutrient: rng.uniform(0, 900) for nutrient in NUTRIENTS},
+            })
+            if len(batch) >= SEED_BATCH_SIZE:
+                db.meals.insert_many(batch, ordered=False)
+                batch = []
+    if batch:
+        db.meals.insert_many(batch, ordered=False)
+    return user_ids
+
+
+def python_trends(db, user_id, weeks):
+    """
+    Weekly trends worked out in Python over every meal, what a page would do without summaries
+    """
+    days = {}
+    for meal in db.meals.find({"user_id": user_id}):
+        day = days.setdefault(meal["date"], dict.fromkeys(NUTRIENTS, 0))
+        for nutrient in NUTRIENTS:
+            day[nutrient] += meal["nutrition"][nutrient]
+    periods = {}
+    for day, totals in days.items():
+        period = periods.setdefault(period_start(day, "week"), {"days": 0, "below": dict.fromkeys(NUTRIENTS, 0)})
+        period["days"] += 1
+        for nutrient in NUTRIENTS:
+            period["below"][nutrient] += totals[nutrient] < daily_recommended[nutrient]
+    return sorted(periods.items(), reverse=True)[:weeks]
+
+
+def time_users(function, db, user_ids, *args):
+    """
+    Return how long function took for each user, sorted
+    """
+    durations = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        function(db, user_id, *args)
+        durations.append(time.perf_counter() - start)
+    return sorted(durations)
+
+
+def report(name, durations):
+    print(f"  {name:22} p50 {percentile(durations, 50) * 1000:8.1f} ms"
+          f"  p95 {percentile(durations, 95) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--meals", type=int, default=1000, help="meals per user")
+    parser.add_argument("--samples", type=int, default=50, help="users to time reads for")
+    parser.add_argument("--weeks", type=int, default=8)
+    parser.add_argument("--keep", action="store_true", help="reuse the seeded database if it exists")
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(args.mongo_uri)
+    db = client["bench_trends"]
+    if not args.keep or not db.meals.estimated_document_count():
+        client.drop_database(db.name)
+        start = time.perf_counter()
+        seed(db, args.users, args.meals)
+        ensure_indexes(db)
+        print(f" * Seeded {args.users * args.meals} meals in {time.perf_counter() - start:.1f} s")
+    user_ids = random.Random(1).sample(db.meals.distinct("user_id"), args.samples)
+
+    print(f"{db.meals.estimated_document_count()} meals, {args.samples} users, {args.weeks} weeks")
+    db.nutrition_summaries.drop()
+    ensure_indexes(db)
+    report("python over meals", time_users(python_trends, db, user_ids, args.weeks))
+    report("summaries, cold", time_users(get_trends, db, user_ids, "week", args.weeks, TODAY))
+    report("summaries, warm", time_users(get_trends, db, user_ids, "week", args.weeks, TODAY))
+
+    start = time.perf_counter()
+    count = rebuild_summaries(db)
+    print(f"  rebuild_summaries      {count} summaries in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
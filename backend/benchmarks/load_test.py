@@ -0,0 +1,88 @@
+"""
+Send concurrent requests to a running server and report throughput
+
+Compare the development server with gunicorn:
+    python app.py
+    python benchmarks/load_test.py http://localhost:8080/ --concurrency 32
+
+    gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/load_test.py http://localhost:5000/ --concurrency 32
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import requests
+
+
+def percentile(values, percent):
+    """
+    Return the value at a percentile of a sorted list
+    """
+    if not values:
+        return 0
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+
+def run(url, concurrency, duration):
+    """
+    Request url from concurrency threads for duration seconds
+    returns: dict of results
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker():
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                ok = session.get(url, timeout=30).status_code < 500
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    latencies.sort()
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.concurrency, args.duration), indent=2))
+
+
+if __name__ == "__main__":
+    main()
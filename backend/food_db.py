@@ -0,0 +1,221 @@
+"""
+Local food nutrition database
+
+Stores label nutrients for common foods in SQLite so most lookups never go to
+the USDA api. Names are matched exactly first, then fuzzily with a trigram index.
+Nutrition is stored per serving, like the label nutrients the api returns.
+
+Build it from a USDA FoodData Central export:
+    python food_db.py FoodData_Central_branded_food_json.json foods.db
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+
+from nutrition import NUTRIENTS, parse_label_nutrients
+from nutrition_cache import normalize_food_name
+
+# FoodData Central nutrient numbers for foods that only have foodNutrients,
+# which are amounts per 100 g
+NUTRIENT_NUMBERS = {
+    "208": "calories",
+    "203": "protein",
+    "205": "carbohydrates",
+    "291": "fiber",
+    "301": "calcium",
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS foods (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    trigram_count INTEGER NOT NULL,
+    {", ".join(f"{nutrient} REAL NOT NULL" for nutrient in NUTRIENTS)}
+);
+CREATE TABLE IF NOT EXISTS trigrams (
+    trigram TEXT NOT NULL,
+    food_id INTEGER NOT NULL,
+    PRIMARY KEY (trigram, food_id)
+) WITHOUT ROWID;
+"""
+
+
+def trigrams(name):
+    """
+    Return the set of character trigrams in a padded food name
+    """
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodDatabase:
+    """
+    Read only lookups against a local food database
+    min_similarity: share of the typed name's trigrams a fuzzy match has to contain, from 0 to 1
+    """
+
+    def __init__(self, path, min_similarity=None):
+        self.path = path
+        self.min_similarity = min_similarity or float(os.getenv("FOOD_DB_MIN_SIMILARITY", 0.7))
+        self._local = threading.local()
+
+    @classmethod
+    def open(cls, path):
+        """
+        Return a FoodDatabase for path, or None if there is no database there
+        """
+        if not path or not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def _connection(self):
+        # sqlite connections can't be shared between threads
+        cxn = getattr(self._local, "cxn", None)
+        if cxn is None:
+            cxn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.cxn = cxn
+        return cxn
+
+    def lookup(self, food_name):
+        """
+        Return nutrition facts for the closest matching food, or None
+        """
+        name = normalize_food_name(food_name)
+        cxn = self._connection()
+        columns = ", ".join(NUTRIENTS)
+
+        row = cxn.execute(f"SELECT {columns} FROM foods WHERE name = ?", (name,)).fetchone()
+        if row:
+            return dict(zip(NUTRIENTS, row))
+
+        # fuzzy match on how much of the typed name a food's name contains, so
+        # "eggs" finds "eggs, grade a, large, egg whole", the shortest name wins ties
+        query = trigrams(name)
+        placeholders = ", ".join("?" * len(query))
+        row = cxn.execute(
+            f"""
+            SELECT {columns}, CAST(COUNT(*) AS REAL) / ? AS score
+            FROM trigrams t JOIN foods f ON f.id = t.food_id
+            WHERE t.trigram IN ({placeholders})
+            GROUP BY t.food_id
+            ORDER BY score DESC, f.trigram_count
+            LIMIT 1
+            """,
+            (len(query), *query),
+        ).fetchone()
+        if row and row[-1] >= self.min_similarity:
+            return dict(zip(NUTRIENTS, row[:-1]))
+        return None
+
+    def names(self, max_words):
+        """
+        Yield the names of foods with 2 to max_words words
+        """
+        spaces = "length(name) - length(replace(name, ' ', ''))"
+        yield from (row[0] for row in self._connection().execute(
+            f"SELECT name FROM foods WHERE {spaces} BETWEEN 1 AND ?", (max_words - 1,)
+        ))
+
+
+def _per_serving(food):
+    """
+    Return nutrition facts per serving from a food's foodNutrients, which are
+    per 100 g, or None if the export doesn't say how much a serving weighs
+    """
+    grams = None
+    if str(food.get("servingSizeUnit", "")).lower() in ("g", "grm", "ml"):
+        grams = food.get("servingSize")
+    if not grams:
+        grams = next((p["gramWeight"] for p in food.get("foodPortions", []) if p.get("gramWeight")), None)
+    if not grams:
+        return None
+
+    facts = dict.fromkeys(NUTRIENTS, 0)
+    for item in food.get("foodNutrients", []):
+        nutrient = NUTRIENT_NUMBERS.get(str(item.get("nutrient", {}).get("number")))
+        if nutrient:
+            facts[nutrient] = round(item.get("amount", 0) * grams / 100, 2)
+    return facts
+
+
+def read_export(path):
+    """
+    Yield (name, nutrition facts per serving) from a FoodData Central JSON export or a csv
+
+    csv files need a name column and a column for each nutrient. Foods with
+    neither label nutrients nor a serving weight are skipped.
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                yield row["name"], {n: float(row.get(n) or 0) for n in NUTRIENTS}
+        return
+
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        # exports wrap the list in a key like "BrandedFoods" or "FoundationFoods"
+        data = next(iter(data.values()))
+
+    for food in data:
+        if food.get("labelNutrients"):
+            facts = parse_label_nutrients(food["labelNutrients"])
+        else:
+            facts = _per_serving(food)
+            if facts is None:
+                continue
+        yield food["description"], facts
+
+
+def build(foods, path):
+    """
+    Write foods to a new database at path, returns the number of foods stored
+    foods: iterable of (name, nutrition facts)
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    cxn = sqlite3.connect(path)
+    cxn.executescript(SCHEMA)
+
+    count = 0
+    with cxn:
+        for name, facts in foods:
+            name = normalize_food_name(name)
+            grams = trigrams(name)
+            cursor = cxn.execute(
+                f"INSERT OR IGNORE INTO foods (name, trigram_count, {', '.join(NUTRIENTS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(NUTRIENTS))})",
+                (name, len(grams), *(facts[n] for n in NUTRIENTS)),
+            )
+            if not cursor.rowcount:
+                # keep the first entry for duplicate names
+                continue
+            cxn.executemany(
+                "INSERT INTO trigrams (trigram, food_id) VALUES (?, ?)",
+                [(gram, cursor.lastrowid) for gram in grams],
+            )
+            count += 1
+    cxn.execute("VACUUM")
+    cxn.close()
+    return count
+
+
+def main():
+    """
+    Build a food database from the command line
+    """
+    parser = argparse.ArgumentParser(description="Build the local food nutrition database")
+    parser.add_argument("export", help="FoodData Central JSON export or csv file")
+    parser.add_argument("database", nargs="?", default=os.getenv("FOOD_DB_PATH", "foods.db"))
+    args = parser.parse_args()
+
+    count = build(read_export(args.export), args.database)
+    print(f" * Stored {count} foods in {args.database}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Parse the foods typed for a meal
+
+"2 eggs, toast with peanut butter" becomes {"eggs": 2, "toast with peanut butter": 1}
+and "2 eggs toast peanut butter" becomes {"eggs": 2, "toast": 1, "peanut butter": 1}.
+When the input has commas (or ; + or new lines) each part is one food.
+Otherwise words are grouped into multi-word foods with a trie of known food
+names and any other word is a food on its own.
+
+Amounts are counted in servings. Weights and volumes are converted assuming a
+serving is about 100 g or one cup, which is roughly what USDA label nutrients
+describe.
+"""
+
+import re
+
+from recommend import food_options
+
+TOKEN_RE = re.compile(r"\d+(?:\.\d+)?(?:/\d+)?|[^\W\d_][\w'-]*|[,;+\n]")
+MULTIPLIER_RE = re.compile(r"x(\d+)")
+SEPARATORS = {",", ";", "+", "\n"}
+
+# words that are never foods on their own
+FILLERS = {"and", "with", "of", "some", "plus", "x"}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12,
+    "dozen": 12, "half": 0.5, "quarter": 0.25, "couple": 2,
+}
+
+GRAMS_PER_SERVING = 100
+CUP_ML = 240
+
+# servings per unit
+UNITS = {
+    "x": 1,
+    "serving": 1, "servings": 1,
+    "piece": 1, "pieces": 1,
+    "slice": 1, "slices": 1,
+    "bowl": 1, "bowls": 1,
+    "glass": 1, "glasses": 1,
+    "can": 1, "cans": 1,
+    "handful": 1, "handfuls": 1,
+    "cup": 1, "cups": 1,
+    "tbsp": 1 / 16, "tablespoon": 1 / 16, "tablespoons": 1 / 16,
+    "tsp": 1 / 48, "teaspoon": 1 / 48, "teaspoons": 1 / 48,
+    "ml": 1 / CUP_ML, "l": 1000 / CUP_ML, "liter": 1000 / CUP_ML, "liters": 1000 / CUP_ML,
+    "g": 1 / GRAMS_PER_SERVING, "gram": 1 / GRAMS_PER_SERVING, "grams": 1 / GRAMS_PER_SERVING,
+    "kg": 1000 / GRAMS_PER_SERVING,
+    "oz": 28.35 / GRAMS_PER_SERVING, "ounce": 28.35 / GRAMS_PER_SERVING, "ounces": 28.35 / GRAMS_PER_SERVING,
+    "lb": 453.6 / GRAMS_PER_SERVING, "lbs": 453.6 / GRAMS_PER_SERVING,
+    "pound": 453.6 / GRAMS_PER_SERVING, "pounds": 453.6 / GRAMS_PER_SERVING,
+}
+
+# multi-word foods people often type, on top of any in the local food database
+COMMON_PHRASES = (
+    "peanut butter", "almond butter", "ice cream", "sour cream", "cream cheese",
+    "cottage cheese", "greek yogurt", "orange juice", "apple juice", "almond milk",
+    "oat milk", "soy milk", "brown rice", "white rice", "fried rice", "sweet potato",
+    "sweet potatoes", "mashed potatoes", "french fries", "chicken breast",
+    "chicken thigh", "chicken wings", "ground beef", "pork chop", "hot dog",
+    "hard boiled egg", "scrambled eggs", "egg whites", "olive oil", "green beans",
+    "black beans", "kidney beans", "chia seeds", "sunflower seeds", "dried fruits",
+    "whole wheat bread", "white bread", "english muffin", "corn flakes",
+    "mac and cheese", "fish and chips", "half and half", "hot sauce", "soy sauce",
+    "protein bar", "protein shake", "granola bar", "dark chocolate", "green tea",
+)
+
+# longer names are left out, people rarely type them and they make the trie large
+MAX_PHRASE_WORDS = 4
+
+_END = ""
+
+
+def tokenize(text):
+    """
+    Split text into lowercase words, numbers and separators
+    """
+    return TOKEN_RE.findall(text.lower().replace("&", " and "))
+
+
+class PhraseTrie:
+    """
+    Trie of multi-word food names keyed by word
+    """
+
+    def __init__(self, phrases=(), max_words=MAX_PHRASE_WORDS):
+        self.max_words = max_words
+        self.root = {}
+        self.size = 0
+        for phrase in phrases:
+            self.add(phrase)
+
+    def add(self, phrase):
+        words = [token for token in tokenize(phrase) if token not in SEPARATORS]
+        # single words are foods without the trie
+        if not 2 <= len(words) <= self.max_words:
+            return
+        node = self.root
+        for word in words:
+            node = node.setdefault(word, {})
+        if _END not in node:
+            node[_END] = True
+            self.size += 1
+
+    def match(self, words, start):
+        """
+        Return how many words from start make the longest known phrase, or 0
+        """
+        node = self.root
+        longest = 0
+        for i in range(start, len(words)):
+            node = node.get(words[i])
+            if node is None:
+                break
+            if _END in node:
+                longest = i - start + 1
+        return longest
+
+
+def known_food_names(food_db=None):
+    """
+    Yield names of foods to build the phrase trie from
+    """
+    yield from COMMON_PHRASES
+    for foods in food_options.values():
+        yield from foods
+    if food_db is not None:
+        yield from food_db.names(MAX_PHRASE_WORDS)
+
+
+DEFAULT_PHRASES = PhraseTrie(known_food_names())
+
+
+def _number(token):
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    if not token[0].isdigit():
+        return None
+    if "/" in token:
+        numerator, denominator = token.split("/")
+        number = float(numerator) / (float(denominator) or 1)
+    else:
+        number = float(token)
+    return int(number) if number.is_integer() else number
+
+
+def _read_amount(tokens, i):
+    """
+    Read a quantity and unit starting at i, returns (servings or None, next index)
+    """
+    amount = None
+    while i < len(tokens):
+        number = _number(tokens[i])
+        if number is None:
+            break
+        if amount is None:
+            amount = number
+        elif number < 1:
+            # "1 1/2"
+            amount += number
+        else:
+            # "2 dozen"
+            amount *= number
+        i += 1
+
+    if i < len(tokens) and tokens[i] in UNITS:
+        # "cup of coffee" has a unit without a number, "can" alone may be a food
+        has_of = i + 1 < len(tokens) and tokens[i + 1] == "of"
+        if amount is not None or has_of:
+            amount = (1 if amount is None else amount) * UNITS[tokens[i]]
+            i += 1
+    if i < len(tokens) and tokens[i] == "of":
+        i += 1
+    return amount, i
+
+
+def _parse_part(tokens):
+    amount, i = _read_amount(tokens, 0)
+    amount = 1 if amount is None else amount
+    words = tokens[i:]
+    # "eggs x2"
+    if words and MULTIPLIER_RE.fullmatch(words[-1]):
+        amount *= int(words.pop()[1:])
+    while words and words[0] in FILLERS:
+        words = words[1:]
+    if words:
+        yield " ".join(words), amount
+
+
+def _parse_words(tokens, phrases):
+    i = 0
+    while i < len(tokens):
+        length = phrases.match(tokens, i)
+        amount = None
+        if not length:
+            # phrases win over amounts so "half and half" stays one food
+            amount, i = _read_amount(tokens, i)
+            if i >= len(tokens):
+                break
+            length = phrases.match(tokens, i) or 1
+        words = tokens[i:i + length]
+        i += length
+        if length == 1 and (words[0] in FILLERS or MULTIPLIER_RE.fullmatch(words[0])):
+            continue
+        amount = 1 if amount is None else amount
+        if i < len(tokens) and MULTIPLIER_RE.fullmatch(tokens[i]):
+            amount *= int(tokens[i][1:])
+            i += 1
+        yield " ".join(words), amount
+
+
+def parse_food_input(food_input, phrases=None):
+    """
+    Parse the foods typed for a meal
+    phrases: PhraseTrie of known multi-word foods, defaults to common foods
+    returns: dict of food name -> servings, repeated foods are added together
+    """
+    if phrases is None:
+        phrases = DEFAULT_PHRASES
+    tokens = tokenize(food_input)
+
+    if any(token in SEPARATORS for token in tokens):
+        items = []
+        part = []
+        for token in tokens + [","]:
+            if token in SEPARATORS:
+                items.extend(_parse_part(part))
+                part = []
+            else:
+                part.append(token)
+    else:
+        items = _parse_words(tokens, phrases)
+
+    servings = {}
+    for food, amount in items:
+        servings[food] = servings.get(food, 0) + amount
+    return servings
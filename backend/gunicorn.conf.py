@@ -0,0 +1,54 @@
+"""
+Gunicorn settings for running the app in production
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden with an environment variable. Send SIGHUP to
+the master process to gracefully reload workers with new code or settings.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+
+# the app mostly waits on mongo and the USDA api, so use a few threads per
+# process and two processes per core, plus one
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+# workers size their per process pools from this, see passwords.py
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# "gthread" by default, "gevent" needs `pip install gevent` and handles many
+# more slow USDA calls per worker
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# don't load the app in the master: each worker imports it after the fork so
+# it gets its own MongoClient, thread pools, job workers and metrics, and
+# nothing needs resetting in a post_fork hook
+preload_app = False
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# recycle workers now and then so slow leaks can't build up, the jitter stops
+# them all restarting at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 500))
+
+accesslog = "-"
+errorlog = "-"
+
+# workers write their metrics here so a scrape of any worker reports the
+# totals of all of them, see metrics.py
+metrics_dir = os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), "nutritrack-metrics"))
+
+
+def on_starting(server):
+    # counts from a previous run of the server start again from zero
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
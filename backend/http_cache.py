@@ -0,0 +1,58 @@
+"""
+HTTP conditional requests for pages that rarely change
+
+Pages are tagged with an ETag built from whatever they are rendered from, so a
+browser revalidating its copy gets an empty 304 without the page being queried
+for in full or rendered again.
+"""
+
+import hashlib
+import os
+
+from flask import Response, request
+from werkzeug.http import is_resource_modified
+
+
+def template_version(folder, assets_version=""):
+    """
+    Return a hash of every template so a deploy with new templates changes every ETag
+    assets_version: version of the static files the pages link to, so a deploy
+        that only changes css or js changes every ETag too
+    """
+    digest = hashlib.sha1(assets_version.encode())
+    for root, _, files in sorted(os.walk(folder)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as f:
+                digest.update(name.encode())
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def make_etag(*parts):
+    """
+    Return an ETag for a page rendered from parts
+    """
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def add_validators(response, etag, last_modified=None):
+    """
+    Tag a response so the browser keeps it and revalidates before every use
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # pages belong to the logged in user, so only the browser may keep them
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """
+    Return a 304 response if the browser's copy is current, otherwise None
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return add_validators(Response(status=304), etag, last_modified)
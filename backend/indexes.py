@@ -0,0 +1,117 @@
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, OperationFailure, PyMongoError
+
+# indexes for the queries every page view runs, create_index is a no-op when
+# an index already exists so this is safe to run on every start
+INDEXES = {
+    "users": [
+        {"keys": [("username", ASCENDING)], "name": "username_unique", "unique": True},
+    ],
+    "meals": [
+        {
+            "keys": [("user_id", ASCENDING), ("added_at", DESCENDING), ("_id", DESCENDING)],
+            "name": "user_added_at_id",
+        },
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date"},
+    ],
+    "daily_totals": [
+        {"keys": [("user_id", ASCENDING), ("date", ASCENDING)], "name": "user_date_unique", "unique": True},
+    ],
+    "nutrition_cache": [
+        # mongo removes documents once expires_at has passed
+        {"keys": [("expires_at", ASCENDING)], "name": "expires_at_1", "expireAfterSeconds": 0},
+    ],
+    "nutrition_locks": [
+        {"keys": [("expires_at", ASCENDING)], "name": "expires_at_1", "expireAfterSeconds": 0},
+    ],
+    "jobs": [
+        {"keys": [("status", ASCENDING), ("run_at", ASCENDING)], "name": "status_1_run_at_1"},
+    ],
+    "nutrition_summaries": [
+        {
+            "keys": [("user_id", ASCENDING), ("unit", ASCENDING), ("start", ASCENDING)],
+            "name": "user_unit_start_unique",
+            "unique": True,
+        },
+    ],
+}
+
+
+def ensure_indexes(db):
+    """
+    Create the indexes the app relies on
+    returns: list of (index name, error) for indexes that could not be created
+    """
+    failed = []
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            options = {key: value for key, value in index.items() if key != "keys"}
+            try:
+                db[collection].create_index(index["keys"], **options)
+            except PyMongoError as e:
+                print(f" * Could not create index {index['name']} on {collection}:", e)
+                failed.append((index["name"], e))
+    return failed
+
+
+def is_transient(error):
+    """
+    Return True if creating an index may work once mongo is reachable again,
+    errors such as duplicate keys under a unique index need someone to fix the data
+    """
+    return isinstance(error, ConnectionFailure)
+
+
+def hot_queries(db):
+    """
+    Return (description, cursor) for each query run on every login or page view
+    """
+    user_id = ObjectId()
+    return [
+        ("users by username", db.users.find({"username": ""})),
+        (
+            "meals by user, newest first",
+            db.meals.find({"user_id": user_id}).sort([("added_at", DESCENDING), ("_id", DESCENDING)]),
+        ),
+        ("meals by user and date", db.meals.find({"user_id": user_id, "date": ""})),
+    ]
+
+
+def plan_stages(plan):
+    """
+    Return every stage name in an explain() query plan
+    """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def index_report(db):
+    """
+    Return a text report of index usage and whether hot queries use an index
+    """
+    lines = []
+    for collection in INDEXES:
+        lines.append(f"{collection}:")
+        try:
+            stats = db[collection].aggregate([{"$indexStats": {}}])
+            for stat in stats:
+                lines.append(f"  {stat['name']}: {stat['accesses']['ops']} ops since {stat['accesses']['since']}")
+        except OperationFailure as e:
+            lines.append(f"  $indexStats not available: {e}")
+
+    lines.append("hot queries:")
+    for description, cursor in hot_queries(db):
+        stages = plan_stages(cursor.explain().get("queryPlanner", {}).get("winningPlan", {}))
+        covered = "IXSCAN" in stages and "COLLSCAN" not in stages and "SORT" not in stages
+        status = "ok" if covered else "NOT COVERED"
+        lines.append(f"  {description}: {status} ({' > '.join(stages)})")
+    return "\n".join(lines)
@@ -0,0 +1,141 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+
+class JobQueue:
+    """
+    Job queue stored in a MongoDB collection
+
+    Jobs are claimed atomically with find_one_and_update so any number of worker
+    threads, in this process or others, can share one collection. A job that is
+    still running after lease seconds is assumed lost and is claimed again.
+    collection: mongo collection for jobs
+    handlers: dict of job kind -> function taking the job's payload
+    failure_handlers: optional dict of job kind -> function taking the payload and
+        error, called once a job has failed max_attempts times
+    """
+
+    def __init__(self, collection, handlers, workers=None, poll_interval=None,
+                 lease=None, max_attempts=None, failure_handlers=None):
+        self.collection = collection
+        self.handlers = handlers
+        self.failure_handlers = failure_handlers or {}
+        self.workers = workers or int(os.getenv("JOB_WORKERS", 2))
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL", 1))
+        self.lease = lease or int(os.getenv("JOB_LEASE", 120))
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, kind, payload):
+        """
+        Add a job to the queue and wake up a worker
+        """
+        now = datetime.now(timezone.utc)
+        job_id = self.collection.insert_one({
+            "kind": kind,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": now,
+            "run_at": now,
+        }).inserted_id
+        self._wakeup.set()
+        return job_id
+
+    def start(self):
+        """
+        Start the worker threads, does nothing if they are already running
+        """
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"jobs-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """
+        Ask the worker threads to finish after their current job
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def run_pending(self):
+        """
+        Run jobs on the calling thread until none are ready, returns how many ran
+        """
+        count = 0
+        while self._run_one():
+            count += 1
+        return count
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                ran = self._run_one()
+            except PyMongoError as e:
+                print(" * Job queue error:", e)
+                ran = False
+            if not ran:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self):
+        now = datetime.now(timezone.utc)
+        return self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "started_at": {"$lte": now - timedelta(seconds=self.lease)}},
+            ]},
+            {"$set": {"status": "running", "started_at": now}, "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _run_one(self):
+        job = self._claim()
+        if job is None:
+            return False
+
+        try:
+            self.handlers[job["kind"]](job["payload"])
+        except Exception as e:
+            print(f" * Job {job['_id']} ({job['kind']}) failed:", e)
+            if job["attempts"] >= self.max_attempts:
+                self.collection.update_one(
+                    {"_id": job["_id"]},
+                    {"$set": {"status": "failed", "error": str(e)}},
+                )
+                self._give_up(job, e)
+            else:
+                # back off a little more on each attempt
+                retry_at = datetime.now(timezone.utc) + timedelta(seconds=2 ** job["attempts"])
+                self.collection.update_one(
+                    {"_id": job["_id"]},
+                    {"$set": {"status": "queued", "run_at": retry_at, "error": str(e)}},
+                )
+        else:
+            self.collection.delete_one({"_id": job["_id"]})
+        return True
+
+    def _give_up(self, job, error):
+        handler = self.failure_handlers.get(job["kind"])
+        if handler is None:
+            return
+        try:
+            handler(job["payload"], error)
+        except Exception as e:
+            print(f" * Job {job['_id']} ({job['kind']}) failure handler failed:", e)
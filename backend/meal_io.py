@@ -0,0 +1,162 @@
+"""
+Bulk meal import and export as JSON Lines
+
+Imports are read and written in chunks so uploads of any size use bounded
+memory, and each unique food in the whole upload is only looked up once.
+Meals with foods that couldn't be looked up in time are saved as pending and
+filled in later by the job queue, the same as meals added in async mode.
+"""
+
+import csv
+import json
+from datetime import datetime, timezone
+
+from food_parser import parse_food_input
+from nutrition import total_nutrition
+from analytics import mark_stale
+from rollups import add_meals_totals, valid_date
+
+IMPORT_CHUNK_SIZE = 500
+MEAL_TYPES = {"breakfast", "lunch", "dinner", "snack"}
+
+# stop listing errors after this many so a bad file can't make a huge response
+MAX_REPORTED_ERRORS = 100
+
+
+def read_ndjson(lines):
+    """
+    Yield (line number, record) for each non-empty line of JSON
+    lines: str, or bytes decoded as UTF-8 one line at a time
+    """
+    for number, line in enumerate(lines, start=1):
+        try:
+            if isinstance(line, bytes):
+                # a UnicodeDecodeError is a ValueError, reported like bad JSON
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            record = json.loads(line)
+        except ValueError as e:
+            record = e
+        yield number, record
+
+
+def read_csv(lines):
+    """
+    Yield (line number, record) for each row of a csv with a header row
+    lines: str, or bytes decoded as UTF-8
+    """
+    lines = (line.decode("utf-8", errors="replace") if isinstance(line, bytes) else line for line in lines)
+    for number, row in enumerate(csv.DictReader(lines), start=2):
+        if any("\ufffd" in str(value) for value in row.values()):
+            yield number, ValueError("row is not valid UTF-8")
+        else:
+            yield number, row
+
+
+def to_meal(record, user_id, now, phrases=None):
+    """
+    Build a meal document from an imported record, raises ValueError if invalid
+    phrases: optional PhraseTrie of known multi-word foods
+    """
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+    food_input = record.get("food_input")
+    if not food_input and isinstance(record.get("foods"), list):
+        food_input = ", ".join(str(food) for food in record["foods"])
+    if not food_input or not str(food_input).strip():
+        raise ValueError("food_input is required")
+
+    meal_type = str(record.get("meal_type", "snack")).lower()
+    if meal_type not in MEAL_TYPES:
+        raise ValueError(f"unknown meal_type {meal_type!r}")
+    date = valid_date(record.get("date") or now.strftime("%Y-%m-%d"))
+
+    food_input = str(food_input).strip()
+    servings = parse_food_input(food_input, phrases)
+    return {
+        "user_id": user_id,
+        "food_input": food_input,
+        "foods": list(servings),
+        "servings": list(servings.values()),
+        "meal_type": meal_type,
+        "date": date,
+        "status": "complete",
+        "added_at": now,
+    }
+
+
+def import_meals(db, user_id, records, resolve, chunk_size=IMPORT_CHUNK_SIZE, phrases=None, enqueue=None):
+    """
+    Insert meals from (line number, record) pairs
+    resolve: function taking a list of foods and returning (results, unresolved)
+    phrases: optional PhraseTrie of known multi-word foods
+    enqueue: optional function taking a meal id, meals with unresolved foods are
+        saved as pending and passed to it instead of keeping no nutrition for them
+    returns: dict summarizing the import
+    """
+    known = {}
+    summary = {"imported": 0, "pending": 0, "errors": [], "unresolved_foods": set()}
+
+    def flush(chunk):
+        # only look up foods no earlier chunk has seen
+        new_foods = list(dict.fromkeys(
+            food for meal in chunk for food in meal["foods"] if food not in known
+        ))
+        if new_foods:
+            results, unresolved = resolve(new_foods)
+            known.update(results)
+            # not retried by later chunks, the job queue retries them per meal
+            for food in unresolved:
+                known.setdefault(food, None)
+                summary["unresolved_foods"].add(food)
+
+        pending = []
+        for meal in chunk:
+            meal["nutrition"] = total_nutrition(meal["foods"], known, meal["servings"])
+            meal["unresolved_foods"] = [food for food in meal["foods"] if known.get(food) is None]
+            if meal["unresolved_foods"] and enqueue is not None:
+                meal["status"] = "pending"
+                pending.append(meal)
+        db.meals.insert_many(chunk, ordered=False)
+        add_meals_totals(db.daily_totals, chunk)
+        mark_stale(db.nutrition_summaries, {(meal["user_id"], meal["date"]) for meal in chunk})
+        for meal in pending:
+            enqueue(meal["_id"])
+        summary["imported"] += len(chunk)
+        summary["pending"] += len(pending)
+
+    chunk = []
+    for number, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise ValueError(f"invalid JSON: {record}")
+            chunk.append(to_meal(record, user_id, datetime.now(timezone.utc), phrases))
+        except ValueError as e:
+            if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                summary["errors"].append({"line": number, "error": str(e)})
+            continue
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    summary["unresolved_foods"] = sorted(summary["unresolved_foods"])
+    return summary
+
+
+def export_meals(cursor):
+    """
+    Yield each meal from a cursor as a line of JSON
+    """
+    for meal in cursor:
+        yield json.dumps({
+            "id": str(meal["_id"]),
+            "food_input": meal["food_input"],
+            "foods": meal.get("foods", []),
+            "meal_type": meal.get("meal_type"),
+            "date": meal.get("date"),
+            "nutrition": meal.get("nutrition"),
+            "added_at": meal["added_at"].isoformat() if meal.get("added_at") else None,
+        }) + "\n"
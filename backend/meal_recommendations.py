@@ -0,0 +1,114 @@
+"""
+Recommendations stored on meal documents
+
+Recommendations are worked out once, when a meal's nutrition is known, and
+saved on the meal so the summary page is a single read and doesn't change on
+every reload. Each stored set has the version of the recommendation tables it
+came from. Meals with an older version are updated the next time they are
+viewed, or all at once with `flask recompute-recommendations`.
+"""
+
+import hashlib
+import json
+
+from pymongo import UpdateOne
+
+from nutrition import NUTRIENTS, empty_nutrition
+from recommend import daily_recommended, food_nutrients, food_options, recommend_for_day, recommend_for_days
+from rollups import get_daily_totals
+
+# bump when the way recommendations are picked changes, changes to the food
+# tables change the version by themselves
+ENGINE_VERSION = 1
+
+RECOMPUTE_BATCH_SIZE = 500
+
+
+def recommendation_version():
+    """
+    Return a version string for the current recommendation engine and tables
+    """
+    tables = json.dumps([daily_recommended, food_options, food_nutrients], sort_keys=True)
+    return f"{ENGINE_VERSION}-{hashlib.sha1(tables.encode()).hexdigest()[:10]}"
+
+
+RECOMMENDATION_VERSION = recommendation_version()
+
+
+def _document(result):
+    recommendations, still_needed = result
+    return {"version": RECOMMENDATION_VERSION, "foods": recommendations, "still_needed": still_needed}
+
+
+def _day_totals(totals, meal, extra=None):
+    if extra:
+        totals = {nutrient: totals[nutrient] + extra.get(nutrient, 0) for nutrient in NUTRIENTS}
+    # meals logged before daily totals existed fall back to their own nutrition
+    if not any(totals.values()):
+        totals = meal["nutrition"]
+    return totals
+
+
+def is_current(meal):
+    """
+    Return True if a meal has recommendations from the current version
+    """
+    return meal.get("recommendations", {}).get("version") == RECOMMENDATION_VERSION
+
+
+def recommend_for_meal(daily_totals, meal, extra=None):
+    """
+    Recommend foods for the rest of a meal's day
+    extra: nutrition that isn't in the day's totals yet, like the meal being added
+    returns: recommendations document to store on the meal
+    """
+    totals = get_daily_totals(daily_totals, meal["user_id"], meal["date"])
+    totals = _day_totals(totals, meal, extra)
+    return _document(recommend_for_day(meal["user_id"], meal["date"], totals))
+
+
+def recompute_recommendations(db, force=False, batch_size=RECOMPUTE_BATCH_SIZE):
+    """
+    Store current recommendations on every meal that has an older version
+    force: recompute every meal
+    returns: number of meals updated
+    """
+    query = {"status": {"$ne": "pending"}}
+    if not force:
+        query["recommendations.version"] = {"$ne": RECOMMENDATION_VERSION}
+    cursor = db.meals.find(query, {"user_id": 1, "date": 1, "nutrition": 1}, batch_size=batch_size)
+
+    count = 0
+    batch = []
+    for meal in cursor:
+        batch.append(meal)
+        if len(batch) >= batch_size:
+            count += _recompute_batch(db, batch)
+            batch = []
+    if batch:
+        count += _recompute_batch(db, batch)
+    return count
+
+
+def _recompute_batch(db, meals):
+    days = {(meal["user_id"], meal["date"]) for meal in meals}
+    totals = {}
+    for doc in db.daily_totals.find(
+        {"$or": [{"user_id": user_id, "date": date} for user_id, date in days]},
+        {"user_id": 1, "date": 1, "nutrition": 1},
+    ):
+        totals[doc["user_id"], doc["date"]] = dict(empty_nutrition(), **doc["nutrition"])
+
+    results = recommend_for_days([
+        (
+            meal["user_id"],
+            meal["date"],
+            _day_totals(totals.get((meal["user_id"], meal["date"]), empty_nutrition()), meal),
+        )
+        for meal in meals
+    ])
+    db.meals.bulk_write([
+        UpdateOne({"_id": meal["_id"]}, {"$set": {"recommendations": _document(result)}})
+        for meal, result in zip(meals, results)
+    ], ordered=False)
+    return len(meals)
@@ -0,0 +1,442 @@
+"""
+In-process metrics exposed in the Prometheus text format
+
+Counters and latency histograms live in a module level registry so any module
+can record into it without passing objects around. create_app wires the Flask
+hooks and serves everything on /metrics.
+
+Under gunicorn each worker process has its own registry. With METRICS_DIR set
+(gunicorn.conf.py sets it), workers write their metrics to files there and a
+scrape of any worker adds up every worker's counters and histograms, so the
+totals don't depend on which worker answers. Other workers' counts can be up
+to METRICS_WRITE_INTERVAL seconds old. Gauges are reported per worker with a
+pid label.
+"""
+
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# latency buckets in seconds, from a fast cache hit to a slow USDA call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """
+    Counter with optional labels
+    """
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def snapshot(self):
+        """
+        Return a copy of every labelled value
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def render(self, values=None):
+        """
+        values: labelled values to render instead of this process's, e.g. every worker's added up
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        values = self.snapshot() if values is None else values
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Histogram of observed values with optional labels
+    """
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # one count per bucket plus +Inf, then the sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def count(self, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            return sum(series[:-1]) if series else 0
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def snapshot(self):
+        """
+        Return a copy of every labelled series of bucket counts and sum
+        """
+        with self._lock:
+            return {label_values: list(series) for label_values, series in self._series.items()}
+
+    def render(self, values=None):
+        """
+        values: labelled series to render instead of this process's, e.g. every worker's added up
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        values = self.snapshot() if values is None else values
+        for label_values, series in sorted(values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                total += count
+                labels = _format_labels(self.labels + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {total}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+class Registry:
+    """
+    Holds metrics and functions that report extra gauges when scraped
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge_collector(self, name, help_text, collect):
+        """
+        Register a gauge whose values are read when scraped
+        collect: function returning a list of (label dict, value)
+        """
+        # replace an earlier collector with the same name, e.g. from a previous app
+        self.collectors = [c for c in self.collectors if c[0] != name]
+        self.collectors.append((name, help_text, collect))
+
+    def gauges(self):
+        """
+        Return dict of gauge name -> list of (label dict, value) read now
+        """
+        return {name: list(collect()) for name, _, collect in self.collectors}
+
+    def render(self, values=None, gauges=None):
+        """
+        values: dict of metric name -> labelled values to render instead of this process's
+        gauges: dict of gauge name -> (label dict, value) samples instead of reading them now
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(None if values is None else values.get(metric.name, {})))
+        gauges = self.gauges() if gauges is None else gauges
+        for name, help_text, _ in self.collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in gauges.get(name, []):
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _add(total, value):
+    # counters are numbers, histograms are lists of bucket counts and a sum
+    if total is None:
+        return list(value) if isinstance(value, list) else value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(total, value)]
+    return total + value
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetrics:
+    """
+    Adds up the metrics of every worker process through files in a shared directory
+
+    Each process writes its metrics to <pid>.json every interval seconds and
+    when it is scraped. A scrape adds up every file. Files of workers that have
+    exited are folded into archive.json so their counts are kept and totals
+    never go down.
+    registry: the process's Registry
+    directory: directory every worker can write to
+    """
+
+    ARCHIVE = "archive.json"
+
+    def __init__(self, registry, directory, interval=None):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval or float(os.getenv("METRICS_WRITE_INTERVAL", 1))
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f"{self.pid}.json")
+        os.makedirs(directory, exist_ok=True)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Write this process's metrics in the background every interval seconds
+        """
+        if self._thread is None:
+            # a file left by an exited worker with the same pid
+            with self._locked():
+                self._archive(self.path)
+            self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(" * Could not write metrics:", e)
+
+    def write(self):
+        """
+        Write this process's metrics to its file
+        """
+        data = {
+            "metrics": {
+                metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+                for metric in self.registry.metrics
+            },
+            "gauges": self.registry.gauges(),
+        }
+        # written aside and renamed so readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def _locked(self):
+        lock = open(os.path.join(self.directory, ".lock"), "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # closing the file releases the lock
+        return lock
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _archive(self, path):
+        data = self._read(path)
+        if data is None:
+            return
+        archive_path = os.path.join(self.directory, self.ARCHIVE)
+        archive = self._read(archive_path) or {"metrics": {}}
+        for name, samples in data["metrics"].items():
+            merged = {tuple(labels): value for labels, value in archive["metrics"].get(name, [])}
+            for labels, value in samples:
+                merged[tuple(labels)] = _add(merged.get(tuple(labels)), value)
+            archive["metrics"][name] = [[list(labels), value] for labels, value in merged.items()]
+        with open(archive_path + ".tmp", "w") as f:
+            json.dump(archive, f)
+        os.replace(archive_path + ".tmp", archive_path)
+        os.remove(path)
+
+    def _worker_pids(self):
+        return [
+            name[:-len(".json")] for name in os.listdir(self.directory)
+            if name.endswith(".json") and name[:-len(".json")].isdigit()
+        ]
+
+    def render(self):
+        """
+        Render every worker's metrics added up, with gauges labelled by worker pid
+        """
+        self.write()
+        values = {}
+        gauges = {}
+        with self._locked():
+            for pid in self._worker_pids():
+                if not _alive(int(pid)):
+                    self._archive(os.path.join(self.directory, f"{pid}.json"))
+
+            for pid in self._worker_pids() + [None]:
+                data = self._read(os.path.join(self.directory, f"{pid}.json" if pid else self.ARCHIVE))
+                if data is None:
+                    continue
+                for metric, samples in data["metrics"].items():
+                    merged = values.setdefault(metric, {})
+                    for labels, value in samples:
+                        merged[tuple(labels)] = _add(merged.get(tuple(labels)), value)
+                for gauge, samples in data.get("gauges", {}).items():
+                    gauges.setdefault(gauge, []).extend(
+                        (dict(labels, pid=pid), value) for labels, value in samples
+                    )
+        return self.registry.render(values, gauges)
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time spent handling requests", ("route", "method")
+)
+REQUESTS = REGISTRY.counter(
+    "http_requests_total", "Requests handled", ("route", "method", "status")
+)
+DEPENDENCY_LATENCY = REGISTRY.histogram(
+    "dependency_duration_seconds",
+    "Time spent in calls to mongo, the USDA api and recommendations",
+    ("dependency", "operation"),
+)
+DEPENDENCY_ERRORS = REGISTRY.counter(
+    "dependency_errors_total", "Failed calls to dependencies", ("dependency", "operation")
+)
+
+_shared = None
+
+
+def shared_metrics(directory):
+    """
+    Return this process's SharedMetrics for REGISTRY, started on first use
+    """
+    global _shared
+    if _shared is None or _shared.pid != os.getpid() or _shared.directory != directory:
+        _shared = SharedMetrics(REGISTRY, directory)
+        _shared.start()
+    return _shared
+
+
+@contextmanager
+def dependency_timer(dependency, operation):
+    """
+    Time a call to a dependency and count it as an error if it raises
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DEPENDENCY_ERRORS.inc(dependency, operation)
+        raise
+    finally:
+        DEPENDENCY_LATENCY.observe(time.perf_counter() - start, dependency, operation)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    pymongo listener that times every command sent to mongo
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        DEPENDENCY_LATENCY.observe(event.duration_micros / 1e6, "mongo", event.command_name)
+
+    def failed(self, event):
+        DEPENDENCY_LATENCY.observe(event.duration_micros / 1e6, "mongo", event.command_name)
+        DEPENDENCY_ERRORS.inc("mongo", event.command_name)
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler that prints where slow requests spent their time
+
+    While enabled, one background thread records the stack of every thread
+    that is handling a request each interval. When a request takes longer than
+    threshold seconds its most common stacks are printed.
+    """
+
+    def __init__(self, threshold, interval=0.005, top=5):
+        self.threshold = threshold
+        self.interval = interval
+        self.top = top
+        self._active = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._sample, name="profiler", daemon=True).start()
+
+    def start(self):
+        with self._lock:
+            self._active[threading.get_ident()] = StackCounter()
+
+    def stop(self, description, duration):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples is None or duration < self.threshold:
+            return
+        print(f" * Slow request {description} took {duration * 1000:.0f} ms, top stacks:")
+        total = sum(samples.values()) or 1
+        for stack, count in samples.most_common(self.top):
+            print(f"   {count * 100 / total:5.1f}%  {stack}")
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = traceback.extract_stack(frame)[-8:]
+                    samples[" <- ".join(
+                        f"{entry.name} ({entry.filename.rsplit('/', 1)[-1]}:{entry.lineno})"
+                        for entry in reversed(stack)
+                    )] += 1
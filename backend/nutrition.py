@@ -0,0 +1,185 @@
+import time
+from concurrent.futures import TimeoutError, wait
+
+from nutrition_cache import normalize_food_name
+from usda_client import USDAError
+
+NUTRIENTS = ("calories", "protein", "carbohydrates", "fiber", "calcium")
+
+
+def empty_nutrition():
+    """
+    Return nutrition facts with every nutrient set to 0
+    """
+    return {nutrient: 0 for nutrient in NUTRIENTS}
+
+
+def parse_label_nutrients(nutrients):
+    """
+    Convert a USDA labelNutrients dict into nutrition facts
+    """
+    return {
+        nutrient: nutrients.get(nutrient, {}).get("value", 0)
+        for nutrient in NUTRIENTS
+    }
+
+
+def lookup_all(foods, lookup, executor, deadline):
+    """
+    Look up nutrition facts for every food concurrently
+    foods: list of food names, duplicates are only looked up once
+    lookup: function taking a food name and returning nutrition facts
+    executor: thread pool to run lookups on
+    deadline: seconds to wait before giving up on slow lookups
+    returns: (dict of food -> nutrition facts, list of foods that timed out)
+    """
+    futures = {food: executor.submit(lookup, food) for food in dict.fromkeys(foods)}
+    wait(futures.values(), timeout=deadline)
+
+    results = {}
+    unresolved = []
+    for food, future in futures.items():
+        if future.done() and not future.cancelled() and future.exception() is None:
+            results[food] = future.result()
+        else:
+            # drop queued lookups so they don't hold up the next request
+            future.cancel()
+            unresolved.append(food)
+    return results, unresolved
+
+
+def resolve_nutrition(foods, client, executor, deadline, cache=None, food_db=None, flights=None):
+    """
+    Resolve nutrition facts for the foods in a meal in two phases
+
+    Foods in the local food database or the cache are answered straight away.
+    Every other food is searched concurrently, then the details for all of the
+    ids found are fetched with one bulk request, so a meal of N new foods costs
+    N + 1 api calls. With flights, foods another request is already looking up
+    wait for that lookup instead of calling the api again.
+    foods: list of food names
+    client: USDAClient used for searches and the bulk fetch
+    executor: thread pool to run requests on
+    deadline: seconds the whole lookup may take
+    cache: optional NutritionCache
+    food_db: optional FoodDatabase checked before anything else
+    flights: optional SingleFlight shared by every request
+    returns: (dict of food -> nutrition facts, list of foods that could not be resolved)
+    """
+    stop_at = time.monotonic() + deadline
+    results = {}
+    pending = []
+    for food in dict.fromkeys(foods):
+        cached = food_db.lookup(food) if food_db is not None else None
+        if cached is None and cache is not None:
+            cached = cache.get(food)
+        if cached is not None:
+            results[food] = cached
+        else:
+            pending.append(food)
+    if not pending:
+        return results, []
+    if flights is None:
+        fetched, unresolved = _fetch_from_usda(pending, client, executor, stop_at, cache)
+        results.update(fetched)
+        return results, unresolved
+
+    # lead the lookup for foods nobody else is fetching, wait for the rest
+    own = []
+    shared = {}
+    for food in pending:
+        flight, leader = flights.claim(normalize_food_name(food))
+        if leader:
+            own.append(food)
+        else:
+            shared[food] = flight
+
+    fetched = {}
+    unresolved = []
+    locked = []
+    try:
+        to_fetch = []
+        for food in own:
+            key = normalize_food_name(food)
+            if cache is None or flights.acquire_remote(key):
+                locked.append(key)
+            else:
+                # another worker is fetching it, wait for it to reach the cache
+                facts = flights.wait_remote(
+                    key, lambda: cache.get(food), max(stop_at - time.monotonic(), 0)
+                )
+                if facts is not None:
+                    fetched[food] = facts
+                    continue
+            to_fetch.append(food)
+        if to_fetch:
+            new, unresolved = _fetch_from_usda(to_fetch, client, executor, stop_at, cache)
+            fetched.update(new)
+    finally:
+        for food in own:
+            flights.complete(normalize_food_name(food), fetched.get(food))
+        for key in locked:
+            flights.release_remote(key)
+    results.update(fetched)
+
+    for food, flight in shared.items():
+        try:
+            facts = flight.wait(max(stop_at - time.monotonic(), 0))
+        except (TimeoutError, USDAError):
+            facts = None
+        if facts is None:
+            unresolved.append(food)
+        else:
+            results[food] = facts
+    return results, unresolved
+
+
+def _fetch_from_usda(foods, client, executor, stop_at, cache):
+    results = {}
+
+    # phase 1: search every food
+    fdc_ids, unresolved = lookup_all(foods, client.search, executor, max(stop_at - time.monotonic(), 0))
+    for food, fdc_id in list(fdc_ids.items()):
+        if fdc_id is None:
+            # remember foods usda doesn't know for a shorter time
+            results[food] = empty_nutrition()
+            del fdc_ids[food]
+            if cache is not None:
+                cache.set(food, results[food], negative=True)
+    if not fdc_ids:
+        return results, unresolved
+
+    # phase 2: fetch details for every id in one request
+    future = executor.submit(client.foods, fdc_ids.values())
+    try:
+        details = future.result(timeout=max(stop_at - time.monotonic(), 0))
+    except (TimeoutError, USDAError) as e:
+        print(" * USDA bulk lookup failed -", e)
+        future.cancel()
+        details = {}
+
+    for food, fdc_id in fdc_ids.items():
+        if fdc_id not in details:
+            unresolved.append(food)
+            continue
+        results[food] = parse_label_nutrients(details[fdc_id])
+        if cache is not None:
+            cache.set(food, results[food])
+    return results, unresolved
+
+
+def total_nutrition(foods, results, servings=None):
+    """
+    Add up nutrition facts for each food in a meal, skipping foods without results
+    servings: optional list of servings of each food, 1 each by default
+    """
+    if servings is None:
+        servings = [1] * len(foods)
+    totals = empty_nutrition()
+    for food, amount in zip(foods, servings):
+        facts = results.get(food)
+        if facts is None:
+            continue
+        for nutrient in NUTRIENTS:
+            totals[nutrient] += facts.get(nutrient, 0) * amount
+    return {nutrient: round(value, 2) for nutrient, value in totals.items()}
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import PyMongoError
+
+
+def normalize_food_name(food_name):
+    """
+    Normalize a food name so "Eggs", " eggs " and "EGGS" share one cache entry
+    """
+    return " ".join(food_name.lower().split())
+
+
+class NutritionCache:
+    """
+    Two tier cache for nutrition lookups
+
+    The first tier is an in-process LRU, the second is a MongoDB collection
+    with a TTL index (created by ensure_indexes) so entries are shared between
+    workers and survive restarts.
+    Negative results (foods USDA does not know) are kept for a shorter time.
+    """
+
+    def __init__(self, collection=None, max_size=None, ttl=None, negative_ttl=None):
+        self.collection = collection
+        self.max_size = max_size or int(os.getenv("NUTRITION_CACHE_SIZE", 1024))
+        self.ttl = ttl or int(os.getenv("NUTRITION_CACHE_TTL", 7 * 24 * 3600))
+        self.negative_ttl = negative_ttl or int(os.getenv("NUTRITION_CACHE_NEGATIVE_TTL", 3600))
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, food_name):
+        """
+        Return cached nutrition facts for a food, or None on a miss
+        """
+        key = normalize_food_name(food_name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                expires, nutrition = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(nutrition)
+                del self._entries[key]
+
+        nutrition = self._get_from_db(key)
+        with self._lock:
+            if nutrition is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return nutrition
+
+    def set(self, food_name, nutrition, negative=False):
+        """
+        Store nutrition facts for a food in both tiers
+        """
+        key = normalize_food_name(food_name)
+        ttl = self.negative_ttl if negative else self.ttl
+        self._remember(key, nutrition, ttl)
+
+        if self.collection is not None:
+            try:
+                self.collection.replace_one(
+                    {"_id": key},
+                    {
+                        "_id": key,
+                        "nutrition": nutrition,
+                        "negative": negative,
+                        "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl),
+                    },
+                    upsert=True,
+                )
+            except PyMongoError as e:
+                print(" * Could not write nutrition cache:", e)
+
+    def stats(self):
+        """
+        Return cache counters
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+    def _remember(self, key, nutrition, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, dict(nutrition))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _get_from_db(self, key):
+        if self.collection is None:
+            return None
+        try:
+            doc = self.collection.find_one({"_id": key})
+        except PyMongoError as e:
+            print(" * Could not read nutrition cache:", e)
+            return None
+        if not doc:
+            return None
+
+        # the TTL monitor only runs once a minute so check expiry ourselves
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining <= 0:
+            return None
+
+        # promote to the in-process tier for the rest of its lifetime
+        self._remember(key, doc["nutrition"], remaining)
+        return dict(doc["nutrition"])
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import DESCENDING
+
+# fields the meal list templates render, everything else stays in mongo
+MEAL_LIST_FIELDS = {"meal_type": 1, "date": 1, "food_input": 1, "added_at": 1}
+
+# newest first, _id breaks ties between meals added in the same millisecond
+MEAL_LIST_SORT = [("added_at", DESCENDING), ("_id", DESCENDING)]
+
+EPOCH = datetime(1970, 1, 1)
+MAX_MILLIS = (datetime.max - EPOCH) // timedelta(milliseconds=1)
+
+
+def encode_cursor(meal):
+    """
+    Return a page token pointing just after the given meal
+    """
+    added_at = meal["added_at"].replace(tzinfo=None)
+    millis = (added_at - EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}-{meal['_id']}"
+
+
+def decode_cursor(token):
+    """
+    Return (added_at, _id) from a page token, or None if the token is invalid
+    """
+    try:
+        millis, meal_id = token.split("-", 1)
+        millis = int(millis)
+        if not 0 <= millis <= MAX_MILLIS:
+            return None
+        return EPOCH + timedelta(milliseconds=millis), ObjectId(meal_id)
+    except (ValueError, OverflowError, InvalidId):
+        return None
+
+
+def meal_page(meals, user_id, page_size, token=None, session=None):
+    """
+    Return one page of a user's meals, newest first
+    meals: the meals collection
+    token: page token from a previous page, or None for the first page
+    session: optional session to read in
+    returns: (list of meals, token for the next page or None)
+    """
+    query = {"user_id": user_id}
+    cursor = decode_cursor(token) if token else None
+    if cursor:
+        added_at, meal_id = cursor
+        query["$or"] = [
+            {"added_at": {"$lt": added_at}},
+            {"added_at": added_at, "_id": {"$lt": meal_id}},
+        ]
+
+    # fetch one extra meal to know if there is another page
+    page = list(meals.find(query, MEAL_LIST_FIELDS, session=session).sort(MEAL_LIST_SORT).limit(page_size + 1))
+    if len(page) > page_size:
+        return page[:page_size], encode_cursor(page[page_size - 1])
+    return page, None
+
+
+def latest_meal(meals, user_id, session=None):
+    """
+    Return the _id and added_at of a user's newest meal, or None, read from the index alone
+    """
+    return meals.find_one({"user_id": user_id}, {"added_at": 1}, sort=MEAL_LIST_SORT, session=session)
@@ -0,0 +1,139 @@
+"""
+Password hashing with a configurable cost
+
+Hashes are computed and checked on a small bounded pool so a burst of logins
+can't take every web worker's CPU time away from the other routes. Every web
+worker on a host has its own pool, so by default the pools split the host's
+cores between them.
+
+The pool runs threads by default, bcrypt releases the GIL while it hashes.
+PASSWORD_POOL=process opts in to a process pool instead. Its processes are
+spawned and re-import the main module, so a script that starts the app must
+only do so under `if __name__ == "__main__"` (app.py skips create_app() in
+them).
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordPoolBusy(Exception):
+    """
+    Raised when too many hashes are already waiting for the pool
+    """
+
+
+def _hash(scheme, rounds, password):
+    if scheme == "bcrypt":
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+    return generate_password_hash(password)
+
+
+def _verify(hashed, password):
+    if hashed.startswith("$2"):
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+    # hashes made by werkzeug before bcrypt was used
+    return check_password_hash(hashed, password)
+
+
+class HashPool:
+    """
+    Bounded pool that runs hashing away from the request threads
+    kind: "process", "thread" or "inline" to hash on the calling thread
+    workers: number of processes or threads
+    max_pending: hashes allowed to wait or run at once, more raise PasswordPoolBusy
+    """
+
+    def __init__(self, kind="thread", workers=2, max_pending=16, wait=5):
+        self.kind = kind
+        self.workers = workers
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # start the pool on first use so each gunicorn worker makes its own
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="passwords"
+                    )
+            return self._executor
+
+    def run(self, function, *args):
+        if self.kind == "inline":
+            return function(*args)
+        if not self._slots.acquire(timeout=self.wait):
+            raise PasswordPoolBusy("too many password checks waiting")
+        try:
+            return self._get_executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _web_workers():
+    # set by gunicorn.conf.py to the number of gunicorn workers
+    return max(int(os.getenv("WEB_CONCURRENCY", 1)), 1)
+
+
+def shared_pool(kind=None, workers=None, max_pending=None):
+    """
+    Return the pool for this process, settings come from the environment
+
+    Defaults keep the hashes running at once across all web workers on the
+    host to about one per core.
+    """
+    kind = kind or os.getenv("PASSWORD_POOL", "thread")
+    workers = workers or int(os.getenv("PASSWORD_WORKERS", max((os.cpu_count() or 1) // _web_workers(), 1)))
+    max_pending = max_pending or int(os.getenv("PASSWORD_MAX_PENDING", 16))
+    key = (kind, workers, max_pending)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = HashPool(kind, workers, max_pending)
+        return _pools[key]
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords
+    scheme: "bcrypt" or "werkzeug"
+    rounds: bcrypt work factor, each extra round doubles the cost
+    """
+
+    def __init__(self, scheme=None, rounds=None, pool=None):
+        self.scheme = scheme or os.getenv("PASSWORD_HASHER", "bcrypt")
+        self.rounds = rounds or int(os.getenv("BCRYPT_ROUNDS", 12))
+        self.pool = pool or shared_pool()
+
+    def hash(self, password):
+        return self.pool.run(_hash, self.scheme, self.rounds, password)
+
+    def verify(self, hashed, password):
+        return self.pool.run(_verify, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """
+        Return True if a hash was made with a different scheme or cost
+        """
+        if self.scheme != "bcrypt":
+            return hashed.startswith("$2")
+        if not hashed.startswith("$2"):
+            return True
+        # bcrypt hashes look like $2b$12$..., the middle part is the cost
+        return int(hashed.split("$")[2]) != self.rounds
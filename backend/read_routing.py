@@ -0,0 +1,111 @@
+"""
+Read routing for replica sets
+
+The pages that only show a user's meals (home and history), trends and the
+meal summary can each be read from a different kind of replica set member,
+set with READ_PREFERENCE_HISTORY, READ_PREFERENCE_ANALYTICS and
+READ_PREFERENCE_SUMMARY (or READ_PREFERENCE for all three). Secondaries more
+than READ_MAX_STALENESS seconds behind the primary are never used. Writes
+always go to the primary.
+
+Once any route reads from secondaries, writes made for a user run in a causal
+session and the session's operation time is kept in the user's cookie. Reads
+for that user wait until the member they're sent to has caught up to it, so
+a meal shows up on the summary and history pages right after it's added.
+"""
+
+import os
+from contextlib import contextmanager
+
+from bson.timestamp import Timestamp
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+ROUTES = ("history", "analytics", "summary")
+
+MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# the smallest max staleness the server accepts
+MIN_MAX_STALENESS = 90
+
+
+def read_preference(mode, max_staleness=-1):
+    """
+    Return the read preference for a mode name
+    max_staleness: seconds a secondary may be behind to be read from, -1 for no limit
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown read preference {mode!r}, expected one of {', '.join(MODES)}")
+    if mode == "primary":
+        return Primary()
+    if max_staleness != -1 and max_staleness < MIN_MAX_STALENESS:
+        raise ValueError(f"max staleness must be -1 or at least {MIN_MAX_STALENESS} seconds")
+    return MODES[mode](max_staleness=max_staleness)
+
+
+def route_preferences():
+    """
+    Return the read preference mode for each route from the environment
+    """
+    default = os.getenv("READ_PREFERENCE", "primary")
+    return {route: os.getenv(f"READ_PREFERENCE_{route.upper()}", default) for route in ROUTES}
+
+
+class ReadRouter:
+    """
+    Database handles with a read preference per route
+
+    client: MongoClient the database belongs to
+    db: database to read from
+    preferences: dict of route -> mode name, defaults to the environment
+    max_staleness: seconds, defaults to READ_MAX_STALENESS
+    """
+
+    def __init__(self, client, db, preferences=None, max_staleness=None):
+        self.client = client
+        preferences = dict(route_preferences(), **(preferences or {}))
+        if max_staleness is None:
+            max_staleness = int(os.getenv("READ_MAX_STALENESS", 120))
+        self.preferences = {
+            route: read_preference(mode, max_staleness) for route, mode in preferences.items()
+        }
+        self.dbs = {
+            route: db.with_options(read_preference=preference)
+            for route, preference in self.preferences.items()
+        }
+        # reading from the primary alone already sees every write
+        self.causal = any(preference.mode != Primary().mode for preference in self.preferences.values())
+
+    def db(self, route):
+        """
+        Return the database handle for a route
+        """
+        return self.dbs[route]
+
+    @contextmanager
+    def session(self, token=None):
+        """
+        Causal session for a user's reads or writes, None when every route reads the primary
+        token: operation time of the user's last write, from write_token
+        """
+        if not self.causal:
+            yield None
+            return
+        with self.client.start_session(causal_consistency=True) as session:
+            if token:
+                session.advance_operation_time(Timestamp(*token))
+            yield session
+
+
+def write_token(session):
+    """
+    Return the operation time of a session's last write as a cookie-safe list, or None
+    """
+    if session is None or session.operation_time is None:
+        return None
+    return [session.operation_time.time, session.operation_time.inc]
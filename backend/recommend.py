@@ -1,4 +1,9 @@
+import os
 import random
+import threading
+from collections import OrderedDict
+
+import numpy as np
 
 # used National Institutes of Health for recommend values
 # https://ods.od.nih.gov/HealthInformation/dailyvalues.aspx
@@ -38,4 +43,184 @@ def recommend_meal(nutrition):
         second: random.sample(food_options[second], 3)
     }
 
-    return recommendations
\ No newline at end of file
+    return recommendations
+
+
+# nutrient order used for vectorized calculations
+NUTRIENT_ORDER = list(daily_recommended)
+RECOMMENDED = np.array([daily_recommended[n] for n in NUTRIENT_ORDER], dtype=float)
+
+# approximate values per typical serving from USDA FoodData Central
+# calories, protein (g), carbohydrates (g), fiber (g), calcium (mg)
+food_nutrients = {
+    "granola": (290, 8, 32, 4, 45),
+    "avocado": (240, 3, 13, 10, 18),
+    "nuts": (170, 5, 6, 2, 30),
+    "quinoa": (222, 8, 39, 5, 31),
+    "dried fruits": (120, 1, 32, 2, 20),
+    "peanut butter": (190, 7, 7, 2, 15),
+    "chicken": (140, 26, 0, 0, 13),
+    "beef": (210, 22, 0, 0, 15),
+    "eggs": (144, 13, 1, 0, 56),
+    "fish": (175, 19, 0, 0, 10),
+    "lentils": (230, 18, 40, 16, 38),
+    "turkey": (135, 25, 0, 0, 10),
+    "pork": (180, 24, 0, 0, 20),
+    "bread": (160, 8, 28, 4, 100),
+    "pasta": (220, 8, 43, 3, 10),
+    "rice": (205, 4, 45, 1, 16),
+    "oats": (166, 6, 28, 4, 21),
+    "potatoes": (160, 4, 37, 4, 26),
+    "tortillas": (110, 3, 23, 3, 40),
+    "beans": (227, 15, 41, 15, 46),
+    "broccoli": (55, 4, 11, 5, 62),
+    "spinach": (41, 5, 7, 4, 245),
+    "lettuce": (16, 1, 3, 2, 31),
+    "chia seeds": (138, 5, 12, 10, 179),
+    "milk": (150, 8, 12, 0, 300),
+    "yogurt": (154, 13, 17, 0, 448),
+    "cheese": (115, 7, 0, 0, 200),
+    "cottage cheese": (206, 28, 8, 0, 187),
+    "kale": (36, 2, 7, 3, 177),
+}
+
+
+class FoodMatrix:
+    """
+    Candidate foods stored as a matrix of per serving nutrients
+
+    Scores every food against one or many deficit vectors in a single numpy
+    operation and picks the foods that close the most of the gap.
+    seed: fixes the small random variety added to scores so results repeat
+    variety: how much scores are randomly scaled, 0 ranks purely by score
+    """
+
+    def __init__(self, foods=None, categories=None, seed=None, variety=0.1):
+        foods = foods or food_nutrients
+        categories = categories or food_options
+        self.names = list(foods)
+        self.matrix = np.array([foods[name] for name in self.names], dtype=float)
+        # which foods belong to each nutrient's list of options
+        self.categories = np.array(
+            [[name in categories.get(n, ()) for name in self.names] for n in NUTRIENT_ORDER]
+        )
+        self.variety = variety
+        self._rng = np.random.default_rng(seed)
+        self._rng_lock = threading.Lock()
+
+    def score(self, remaining):
+        """
+        Score each food for each deficit vector
+        remaining: (days, nutrients) array of amounts still needed
+        returns: (days, foods) array, the share of a day's values each food
+        would cover without counting anything past the deficit
+        """
+        covered = np.minimum(self.matrix[np.newaxis, :, :], remaining[:, np.newaxis, :])
+        return (covered / RECOMMENDED).sum(axis=2)
+
+    def top_k(self, remaining, k=3, mask=None):
+        """
+        Return the k best foods for each deficit vector
+        remaining: (nutrients,) or (days, nutrients) array of amounts still needed
+        mask: optional (days, foods) boolean array of foods allowed for each day
+        returns: list of lists of food names, one list per day
+        """
+        remaining = np.atleast_2d(np.asarray(remaining, dtype=float))
+        scores = self.score(remaining)
+        if self.variety:
+            with self._rng_lock:
+                noise = self._rng.uniform(1, 1 + self.variety, size=scores.shape)
+            scores = scores * noise
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return [[self.names[j] for j in row] for row in top]
+
+
+_food_matrix = None
+_food_matrix_lock = threading.Lock()
+
+
+def shared_food_matrix():
+    """
+    Return the FoodMatrix used for recommendations, built on first use so a
+    RECOMMEND_SEED from .env is read after the app has loaded it
+    """
+    global _food_matrix
+    with _food_matrix_lock:
+        if _food_matrix is None:
+            seed = os.getenv("RECOMMEND_SEED")
+            _food_matrix = FoodMatrix(seed=int(seed) if seed else None)
+        return _food_matrix
+
+# memoized day recommendations keyed by (user_id, date, totals)
+MEMO_SIZE = 4096
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def daily_deficits(totals_list):
+    """
+    Given a list of daily nutrition totals, return (percent of recommended eaten,
+    amount still needed) as arrays with one row per day in NUTRIENT_ORDER
+    """
+    intake = np.array(
+        [[totals.get(n, 0) for n in NUTRIENT_ORDER] for totals in totals_list],
+        dtype=float,
+    ).reshape(-1, len(NUTRIENT_ORDER))
+    percentages = intake / RECOMMENDED * 100
+    remaining = np.maximum(RECOMMENDED - intake, 0)
+    return percentages, remaining
+
+
+def _memo_key(user_id, date, totals):
+    return (str(user_id), date, tuple(float(totals.get(n, 0)) for n in NUTRIENT_ORDER))
+
+
+def recommend_for_days(days):
+    """
+    Recommend foods for many users' days at once
+    days: list of (user_id, date, daily nutrition totals)
+    returns: list of (recommendations, dict of nutrient -> amount still needed)
+    """
+    keys = [_memo_key(*day) for day in days]
+    results = [None] * len(days)
+    missing = []
+    with _memo_lock:
+        for i, key in enumerate(keys):
+            if key in _memo:
+                _memo.move_to_end(key)
+                results[i] = _memo[key]
+            else:
+                missing.append(i)
+    if not missing:
+        return results
+
+    percentages, remaining = daily_deficits([days[i][2] for i in missing])
+    # the two nutrients furthest below their daily value for every day, then the
+    # foods from each nutrient's options that close the most of that day's gap
+    lowest = np.argsort(percentages, axis=1, kind="stable")[:, :2]
+    food_matrix = shared_food_matrix()
+    firsts = food_matrix.top_k(remaining, 3, food_matrix.categories[lowest[:, 0]])
+    seconds = food_matrix.top_k(remaining, 3, food_matrix.categories[lowest[:, 1]])
+
+    with _memo_lock:
+        for row, i in enumerate(missing):
+            first, second = (NUTRIENT_ORDER[j] for j in lowest[row])
+            recommendations = {first: firsts[row], second: seconds[row]}
+            needed = dict(zip(NUTRIENT_ORDER, remaining[row].round(1).tolist()))
+            results[i] = (recommendations, needed)
+            _memo[keys[i]] = results[i]
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return results
+
+
+def recommend_for_day(user_id, date, totals):
+    """
+    Given everything a user has eaten on a date, recommend foods for the
+    nutrients they are furthest behind on
+    returns: (recommendations, dict of nutrient -> amount still needed)
+    """
+    return recommend_for_days([(user_id, date, totals)])[0]
@@ -0,0 +1,133 @@
+from datetime import date as Date, datetime, timedelta, timezone
+
+from pymongo import ReplaceOne, UpdateOne
+
+from nutrition import NUTRIENTS, empty_nutrition
+
+# how many daily totals to write per bulk request when rebuilding
+REBUILD_BATCH_SIZE = 1000
+
+# days written by live updates this long before a rebuild started are kept even
+# if the rebuild didn't see them, in case the writer's clock is behind
+LIVE_WRITE_MARGIN = timedelta(minutes=5)
+
+# meals and daily totals are keyed by their day as YYYY-MM-DD
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+
+def valid_date(value):
+    """
+    Return a date as YYYY-MM-DD, raises ValueError if it isn't a date
+    """
+    return Date.fromisoformat(str(value).strip()).isoformat()
+
+
+def _inc(nutrition, sign):
+    return {f"nutrition.{nutrient}": sign * nutrition.get(nutrient, 0) for nutrient in NUTRIENTS}
+
+
+def _touched():
+    # when a live update last wrote the day, so a running rebuild doesn't delete it
+    return {"updated_at": datetime.now(timezone.utc)}
+
+
+def add_meal_totals(daily_totals, meal, sign=1, session=None):
+    """
+    Add a meal's nutrition to its day's totals, sign=-1 takes a deleted meal back out
+    session: optional session to write in
+    """
+    update = {"$inc": dict(_inc(meal["nutrition"], sign), meals=sign), "$set": _touched()}
+    daily_totals.update_one(
+        {"user_id": meal["user_id"], "date": meal["date"]},
+        update,
+        upsert=True,
+        session=session,
+    )
+
+
+def add_meals_totals(daily_totals, meals):
+    """
+    Add many meals to their days' totals with one bulk write
+    """
+    days = {}
+    for meal in meals:
+        key = (meal["user_id"], meal["date"])
+        day = days.setdefault(key, dict.fromkeys(NUTRIENTS, 0))
+        day["meals"] = day.get("meals", 0) + 1
+        for nutrient in NUTRIENTS:
+            day[nutrient] += meal["nutrition"].get(nutrient, 0)
+    if not days:
+        return
+    daily_totals.bulk_write([
+        UpdateOne(
+            {"user_id": user_id, "date": date},
+            {"$inc": dict(_inc(day, 1), meals=day["meals"]), "$set": _touched()},
+            upsert=True,
+        )
+        for (user_id, date), day in days.items()
+    ], ordered=False)
+
+
+def update_meal_totals(daily_totals, meal, old_nutrition):
+    """
+    Apply the change in a meal's nutrition after it was edited or enriched
+    meal: the meal with its new nutrition
+    old_nutrition: the nutrition the meal was counted with before
+    """
+    change = {
+        f"nutrition.{nutrient}": meal["nutrition"].get(nutrient, 0) - old_nutrition.get(nutrient, 0)
+        for nutrient in NUTRIENTS
+    }
+    daily_totals.update_one(
+        {"user_id": meal["user_id"], "date": meal["date"]},
+        {"$inc": change, "$set": _touched()},
+        upsert=True,
+    )
+
+
+def get_daily_totals(daily_totals, user_id, date):
+    """
+    Return a user's total nutrition for a day
+    """
+    doc = daily_totals.find_one({"user_id": user_id, "date": date}, {"nutrition": 1})
+    if not doc:
+        return empty_nutrition()
+    return dict(empty_nutrition(), **doc["nutrition"])
+
+
+def rebuild_daily_totals(db):
+    """
+    Rebuild the daily_totals collection from every meal, returns the number of days written
+    """
+    started = datetime.now(timezone.utc)
+    group = {"_id": {"user_id": "$user_id", "date": "$date"}, "meals": {"$sum": 1}}
+    for nutrient in NUTRIENTS:
+        group[nutrient] = {"$sum": f"$nutrition.{nutrient}"}
+
+    count = 0
+    batch = []
+    # meals saved with a date that isn't a day can't be totalled
+    pipeline = [{"$match": {"date": {"$regex": DATE_PATTERN}}}, {"$group": group}]
+    for day in db.meals.aggregate(pipeline, allowDiskUse=True):
+        key = {"user_id": day["_id"]["user_id"], "date": day["_id"]["date"]}
+        batch.append(ReplaceOne(key, dict(
+            key,
+            meals=day["meals"],
+            nutrition={nutrient: day[nutrient] for nutrient in NUTRIENTS},
+            rebuilt_at=started,
+        ), upsert=True))
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            db.daily_totals.bulk_write(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        db.daily_totals.bulk_write(batch, ordered=False)
+        count += len(batch)
+
+    # days that no longer have any meals, days added by live updates while
+    # the rebuild ran weren't seen by it but are kept
+    db.daily_totals.delete_many({"$and": [
+        {"$or": [{"rebuilt_at": {"$exists": False}}, {"rebuilt_at": {"$lt": started}}]},
+        {"$or": [{"updated_at": {"$exists": False}}, {"updated_at": {"$lt": started - LIVE_WRITE_MARGIN}}]},
+    ]})
+    return count
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from metrics import REGISTRY
+
+COALESCED = REGISTRY.counter(
+    "nutrition_lookups_coalesced_total",
+    "Food lookups that waited for one already in flight",
+    ("scope",),
+)
+
+
+class Flight:
+    """
+    One lookup in progress that any number of callers can wait for
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        """
+        Return the lookup's result, raises concurrent.futures.TimeoutError if it
+        isn't done in time, the same error lookups with a deadline raise elsewhere
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError("lookup still in flight")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Make concurrent lookups for the same key share one request
+
+    The first caller to claim a key is the leader and does the lookup, callers
+    that claim it while it is in flight wait for the leader's result. With a
+    locks collection, workers in other processes are coordinated through short
+    lived lock documents: a worker that can't get the lock waits for the leader
+    to store its result in the shared cache instead of calling upstream too.
+    """
+
+    def __init__(self, locks=None, lock_ttl=None, poll_interval=0.05):
+        self.locks = locks
+        self.lock_ttl = lock_ttl or float(os.getenv("NUTRITION_LOCK_TTL", 10))
+        self.poll_interval = poll_interval
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """
+        Return (flight, True) if the caller should do the lookup for key, or
+        (flight, False) if it should wait for the flight already running
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                COALESCED.inc("thread")
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def complete(self, key, result=None, error=None):
+        """
+        Hand the leader's result to every waiting caller
+        """
+        with self._lock:
+            flight = self._flights.pop(key, None)
+        if flight is not None:
+            flight.result = result
+            flight.error = error
+            flight._done.set()
+
+    def do(self, key, function, timeout=None):
+        """
+        Run function() for key unless it is already running, then return its result
+        """
+        flight, leader = self.claim(key)
+        if not leader:
+            return flight.wait(timeout)
+        try:
+            result = function()
+        except Exception as e:
+            self.complete(key, error=e)
+            raise
+        self.complete(key, result)
+        return result
+
+    def acquire_remote(self, key):
+        """
+        Return True if no other worker holds the lock for key
+        """
+        if self.locks is None:
+            return True
+        try:
+            self.locks.insert_one({
+                "_id": key,
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.lock_ttl),
+            })
+            return True
+        except DuplicateKeyError:
+            # a lock left behind by a crashed worker is only cleared by the TTL
+            # monitor once a minute, so take over expired ones here
+            result = self.locks.update_one(
+                {"_id": key, "expires_at": {"$lte": datetime.now(timezone.utc)}},
+                {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.lock_ttl)}},
+            )
+            return result.modified_count == 1
+        except PyMongoError as e:
+            print(" * Could not take lookup lock:", e)
+            return True
+
+    def release_remote(self, key):
+        if self.locks is None:
+            return
+        try:
+            self.locks.delete_one({"_id": key})
+        except PyMongoError as e:
+            print(" * Could not release lookup lock:", e)
+
+    def wait_remote(self, key, check, timeout):
+        """
+        Poll check() while another worker holds the lock for key
+        returns: the first result check() gives that isn't None, or None if the
+        lock was released or timeout passed without one
+        """
+        COALESCED.inc("worker")
+        stop_at = time.monotonic() + min(timeout, self.lock_ttl)
+        while time.monotonic() < stop_at:
+            result = check()
+            if result is not None:
+                return result
+            try:
+                if self.locks.find_one({"_id": key}) is None:
+                    return check()
+            except PyMongoError:
+                return None
+            time.sleep(self.poll_interval)
+        return None
@@ -0,0 +1,68 @@
+"""shared fixtures for tests that run the app on a mock database"""
+
+import os
+
+import mongomock
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """
+    Mock mongo client that every app the test creates connects to
+    """
+    client = mongomock.MongoClient()
+    monkeypatch.setattr("pymongo.MongoClient", lambda *args, **kwargs: client)
+    return client
+
+
+@pytest.fixture
+def db(mongo):
+    """
+    Database the app reads and writes
+    """
+    return mongo[os.getenv("MONGO_DBNAME")]
+
+
+@pytest.fixture
+def make_app(mongo):
+    """
+    Return a function that creates the app on the mock client, call it after
+    setting any environment variables the test needs
+    """
+    def make():
+        app = create_app()
+        app.testing = True
+        return app
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def register(db):
+    """
+    Return a function that registers a user on a test client, which logs them in
+    returns: the new user's id
+    """
+    def register(client, username, password="pass"):
+        client.post("/register", data={
+            "username": username,
+            "password": password,
+            "confirm_password": password,
+        })
+        return db.users.find_one({"username": username})["_id"]
+
+    return register
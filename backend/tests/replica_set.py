@@ -0,0 +1,105 @@
+"""local three member replica set for tests that need secondaries"""
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ReplicaSet:
+    """
+    Start mongod members on free ports and initiate them as one replica set
+
+    Use `ReplicaSet.available()` to skip when mongod isn't installed.
+    members: number of mongod processes
+    name: replica set name
+    """
+
+    def __init__(self, members=3, name="rs-test", timeout=60):
+        self.name = name
+        self.timeout = timeout
+        self.ports = [_free_port() for _ in range(members)]
+        self.processes = []
+        self.dbpath = None
+
+    @staticmethod
+    def available():
+        return shutil.which("mongod") is not None
+
+    @property
+    def uri(self):
+        hosts = ",".join(f"127.0.0.1:{port}" for port in self.ports)
+        return f"mongodb://{hosts}/?replicaSet={self.name}"
+
+    def __enter__(self):
+        self.dbpath = tempfile.mkdtemp(prefix="replica-set-")
+        try:
+            for i, port in enumerate(self.ports):
+                path = os.path.join(self.dbpath, str(i))
+                os.makedirs(path)
+                self.processes.append(subprocess.Popen(
+                    [
+                        "mongod", "--replSet", self.name, "--port", str(port),
+                        "--bind_ip", "127.0.0.1", "--dbpath", path,
+                        "--oplogSize", "50", "--setParameter", "periodicNoopIntervalSecs=1",
+                    ],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                ))
+            self._initiate()
+        except BaseException:
+            self.__exit__()
+            raise
+        return self
+
+    def _initiate(self):
+        # the first member becomes primary, the others only replicate
+        first = pymongo.MongoClient(
+            "127.0.0.1", self.ports[0], directConnection=True, serverSelectionTimeoutMS=1000
+        )
+        config = {"_id": self.name, "members": [
+            {"_id": i, "host": f"127.0.0.1:{port}", "priority": 1 if i == 0 else 0}
+            for i, port in enumerate(self.ports)
+        ]}
+        stop_at = time.monotonic() + self.timeout
+        while True:
+            try:
+                first.admin.command("replSetInitiate", config)
+                break
+            except PyMongoError:
+                if time.monotonic() > stop_at:
+                    raise
+                time.sleep(0.5)
+
+        # wait for a primary and every secondary to be readable
+        while True:
+            status = first.admin.command("replSetGetStatus")
+            states = [member["stateStr"] for member in status["members"]]
+            if states.count("PRIMARY") == 1 and states.count("SECONDARY") == len(self.ports) - 1:
+                break
+            if time.monotonic() > stop_at:
+                raise TimeoutError(f"replica set did not come up: {states}")
+            time.sleep(0.5)
+        first.close()
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.dbpath:
+            shutil.rmtree(self.dbpath, ignore_errors=True)
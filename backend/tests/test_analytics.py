@@ -0,0 +1,165 @@
+"""testing for nutrition trends"""
+
+import os
+
+import mongomock
+import pymongo
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import PyMongoError
+
+from analytics import (
+    _switch,
+    get_trends,
+    mark_stale,
+    period_end,
+    period_start,
+    rebuild_summaries,
+    recent_periods,
+    streaks,
+)
+from nutrition import empty_nutrition
+from rollups import add_meal_totals
+
+TODAY = "2025-04-30"
+
+
+def add_meal(db, user_id, date, calories):
+    meal = {"user_id": user_id, "date": date, "nutrition": dict(empty_nutrition(), calories=calories)}
+    db.meals.insert_one(meal)
+    add_meal_totals(db.daily_totals, meal)
+    mark_stale(db.nutrition_summaries, [(user_id, date)])
+
+
+def test_periods():
+    assert period_start("2025-04-30", "week") == "2025-04-28"
+    assert period_start("2025-04-30", "month") == "2025-04-01"
+    assert period_end("2025-04-28", "week") == "2025-05-05"
+    assert period_end("2024-12-01", "month") == "2025-01-01"
+    assert recent_periods("month", 3, TODAY) == ["2025-04-01", "2025-03-01", "2025-02-01"]
+
+
+def test_trends_refresh_only_changed_periods(monkeypatch):
+    """
+    Test summaries are computed once and recomputed after a new meal
+    """
+    db = mongomock.MongoClient().db
+    user_id = ObjectId()
+    add_meal(db, user_id, "2025-04-28", 1500)
+    add_meal(db, user_id, "2025-04-28", 1000)
+    add_meal(db, user_id, "2025-04-30", 500)
+    add_meal(db, user_id, "2025-04-21", 2000)
+    add_meal(db, ObjectId(), "2025-04-29", 3000)
+
+    pipelines = []
+    aggregate = db.meals.aggregate
+    monkeypatch.setattr(
+        db.meals, "aggregate", lambda pipeline, **kwargs: pipelines.append(pipeline) or aggregate(pipeline, **kwargs)
+    )
+
+    this_week, last_week, empty = get_trends(db, user_id, "week", 3, TODAY)
+    assert (this_week["start"], this_week["end"]) == ("2025-04-28", "2025-05-04")
+    assert this_week["days"] == 2
+    assert this_week["meals"] == 3
+    assert this_week["averages"]["calories"] == 1500
+    assert this_week["days_below"]["calories"] == 1
+    assert last_week["days_below"]["calories"] == 0
+    assert empty["days"] == 0
+    assert len(pipelines) == 1
+
+    get_trends(db, user_id, "week", 3, TODAY)
+    assert len(pipelines) == 1
+
+    add_meal(db, user_id, "2025-04-30", 1500)
+    this_week = get_trends(db, user_id, "week", 3, TODAY)[0]
+    assert len(pipelines) == 2
+    assert this_week["days_below"]["calories"] == 0
+
+
+def test_rebuild_keeps_changes_made_while_running(monkeypatch):
+    """
+    Test a meal added while the rebuild aggregates leaves its periods stale
+    """
+    db = mongomock.MongoClient().db
+    user_id = ObjectId()
+    add_meal(db, user_id, "2025-04-28", 1500)
+    get_trends(db, user_id, "week", 1, TODAY)
+
+    # mongomock has no $dateTrunc, these are the only periods the meals fall in
+    starts = {"week": ["2025-04-28"], "month": ["2025-04-01"]}
+    monkeypatch.setattr("analytics._truncate", lambda unit: _switch(starts[unit], unit))
+    aggregate = db.meals.aggregate
+    added = []
+
+    def aggregate_then_add(pipeline, **kwargs):
+        # the first aggregation has read the meals when another one is added
+        results = list(aggregate(pipeline, **kwargs))
+        if not added:
+            added.append(add_meal(db, user_id, "2025-04-30", 500))
+        return results
+
+    monkeypatch.setattr(db.meals, "aggregate", aggregate_then_add)
+    assert rebuild_summaries(db) == 2
+    monkeypatch.setattr(db.meals, "aggregate", aggregate)
+
+    this_week = get_trends(db, user_id, "week", 1, TODAY)[0]
+    assert this_week["meals"] == 2
+    assert get_trends(db, user_id, "month", 1, TODAY)[0]["meals"] == 2
+
+
+def test_streaks():
+    db = mongomock.MongoClient().db
+    user_id = ObjectId()
+    for date in ["2025-04-20", "2025-04-21", "2025-04-22", "2025-04-28", "2025-04-29"]:
+        add_meal(db, user_id, date, 100)
+    assert streaks(db.daily_totals, user_id, TODAY) == (2, 3)
+    assert streaks(db.daily_totals, user_id, "2025-05-02") == (0, 3)
+    assert streaks(db.daily_totals, ObjectId(), TODAY) == (0, 0)
+
+    # a day saved with a bad date is skipped
+    db.daily_totals.insert_one({"user_id": user_id, "date": "not a date", "meals": 1})
+    assert streaks(db.daily_totals, user_id, TODAY) == (2, 3)
+
+
+def test_trends_page(client, register):
+    register(client, "trendsuser")
+    html = client.get("/trends?unit=month").data.decode("utf-8")
+    assert "Longest streak" in html
+    assert "No meals logged" in html
+
+
+def test_add_meal_rejects_bad_date(client, db, register):
+    """
+    Test a meal with a date that isn't a day is refused before anything is written
+    """
+    register(client, "baddateuser")
+    for date in ["", "28/04/2025", "2025-02-30"]:
+        response = client.post("/add-meal", data={"food_list": "apple", "meal_type": "lunch", "date": date})
+        assert response.status_code == 400
+        assert "YYYY-MM-DD" in response.data.decode("utf-8")
+    assert db.meals.count_documents({}) == 0
+    assert db.daily_totals.count_documents({}) == 0
+    assert client.get("/trends").status_code == 200
+
+
+def test_rebuild_summaries_matches_incremental():
+    """
+    Test the $dateTrunc rebuild agrees with the incremental summaries, needs a mongo server
+    """
+    client = pymongo.MongoClient(
+        os.getenv("MONGO_URI", "mongodb://localhost:27017/"), serverSelectionTimeoutMS=300
+    )
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("no mongo server")
+    db = client["test_analytics"]
+    client.drop_database(db.name)
+    user_id = ObjectId()
+    for date, calories in [("2025-04-21", 2000), ("2025-04-28", 1500), ("2025-04-30", 500)]:
+        add_meal(db, user_id, date, calories)
+
+    incremental = get_trends(db, user_id, "week", 2, TODAY)
+    assert rebuild_summaries(db) == 3
+    assert get_trends(db, user_id, "week", 2, TODAY) == incremental
+    client.drop_database(db.name)
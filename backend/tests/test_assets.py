@@ -0,0 +1,100 @@
+"""testing for built static files and response compression"""
+
+import gzip
+
+from flask import Flask, make_response
+
+from assets import IMMUTABLE, StaticAssets, build, brotli, compress_response
+from http_cache import not_modified, template_version
+
+CSS = "body { color: black; }\n" * 100
+
+
+def make_app(tmp_path):
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "style.css").write_text(CSS)
+    manifest = build(str(static))
+
+    app = Flask(__name__, static_folder=str(static))
+    assets = StaticAssets(app.static_folder)
+    app.view_functions["static"] = assets.send
+    app.after_request(lambda response: compress_response(response, 1000))
+
+    @app.route("/page/<int:size>")
+    def page(size):
+        cached = not_modified("abc")
+        if cached is not None:
+            return cached
+        response = make_response("x" * size)
+        response.set_etag("abc")
+        return response
+
+    return app, assets, manifest
+
+
+def test_build_fingerprints_files(tmp_path):
+    app, assets, manifest = make_app(tmp_path)
+    hashed = manifest["style.css"]
+    assert hashed.startswith("build/style.") and hashed.endswith(".css")
+    assert gzip.decompress((tmp_path / "static" / (hashed + ".gz")).read_bytes()).decode() == CSS
+    # the same contents build to the same name
+    assert build(str(tmp_path / "static")) == manifest
+
+    with app.test_request_context():
+        assert assets.url_for("static", filename="style.css") == f"/static/{hashed}"
+        assert assets.url_for("static", filename="other.js") == "/static/other.js"
+
+
+def test_asset_changes_change_page_version(tmp_path):
+    """
+    Test a deploy that only changes css gives pages new ETags
+    """
+    _, assets, _ = make_app(tmp_path)
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    (templates / "page.html").write_text("<link href=\"{{ url }}\">")
+    before = template_version(str(templates), assets.version)
+
+    (tmp_path / "static" / "style.css").write_text(CSS + "p { margin: 0; }\n")
+    build(str(tmp_path / "static"))
+    rebuilt = StaticAssets(str(tmp_path / "static"))
+    assert rebuilt.version != assets.version
+    assert template_version(str(templates), rebuilt.version) != before
+
+
+def test_fingerprinted_files_are_immutable_and_precompressed(tmp_path):
+    app, _, manifest = make_app(tmp_path)
+    client = app.test_client()
+    url = f"/static/{manifest['style.css']}"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Cache-Control"] == IMMUTABLE
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.mimetype == "text/css"
+    assert gzip.decompress(response.data).decode() == CSS
+
+    if brotli is not None:
+        response = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+        assert response.headers["Content-Encoding"] == "br"
+
+    response = client.get(url)
+    assert "Content-Encoding" not in response.headers
+    assert response.data.decode() == CSS
+
+    # the original name is still served, without the long cache header
+    assert client.get("/static/style.css").headers.get("Cache-Control") != IMMUTABLE
+
+
+def test_compress_large_responses(tmp_path):
+    app, _, _ = make_app(tmp_path)
+    client = app.test_client()
+
+    large = client.get("/page/5000", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(large.data) == b"x" * 5000
+    assert large.headers["ETag"] == 'W/"abc"'
+    assert client.get("/page/5000", headers={"If-None-Match": 'W/"abc"'}).status_code == 304
+
+    assert "Content-Encoding" not in client.get("/page/500", headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get("/page/5000").headers
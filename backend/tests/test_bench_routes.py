@@ -0,0 +1,30 @@
+"""smoke test for the route benchmark harness"""
+
+import random
+
+import mongomock
+
+from benchmarks.bench_routes import route_requests, run, seed
+
+
+def test_bench_routes_small_run():
+    """
+    Test a tiny benchmark run reports every route
+    """
+    results = run(users=2, meals=3, requests=2, usda_latency=0)
+    assert set(results["routes"]) == {"/", "/home", "/meal-history", "/add-meal", "/meal-summary/<id>"}
+    for route in results["routes"].values():
+        assert route["requests"] == 2
+        assert route["p50_ms"] <= route["p99_ms"]
+
+
+def test_requests_spread_across_users():
+    """
+    Test the planned requests come from more than one seeded user
+    """
+    db = mongomock.MongoClient().db
+    seeded = seed(db, users=5, meals_per_user=2)
+    planned = route_requests(db, seeded, 20, random.Random(0))
+    assert len({username for _, username, *_ in planned}) > 1
+    summaries = [path for name, _, _, path, _ in planned if name == "/meal-summary/<id>"]
+    assert len(summaries) == 20
@@ -0,0 +1,104 @@
+"""testing for the local food database"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from food_db import FoodDatabase, build, read_export
+from nutrition import resolve_nutrition
+from usda_client import USDAClient
+
+CSV = """name,calories,protein,carbohydrates,fiber,calcium
+Egg,72,6.3,0.4,0,28
+Peanut Butter,190,7,8,2,15
+Brown Rice,216,5,45,3.5,20
+"Eggs, Grade A, Large, egg whole",70,6,0,0,25
+"""
+
+
+@pytest.fixture
+def food_db(tmp_path):
+    """
+    Build a small food database from a csv
+    """
+    export = tmp_path / "foods.csv"
+    export.write_text(CSV)
+    path = str(tmp_path / "foods.db")
+    assert build(read_export(str(export)), path) == 4
+    return FoodDatabase(path)
+
+
+def test_exact_lookup(food_db):
+    """
+    Test names are matched after normalizing
+    """
+    assert food_db.lookup("PEANUT  butter")["calories"] == 190
+
+
+def test_fuzzy_lookup(food_db):
+    """
+    Test close names match through the trigram index
+    """
+    assert food_db.lookup("brown rce")["carbohydrates"] == 45
+    # typed names match inside longer FoodData Central descriptions
+    assert food_db.lookup("eggs")["calories"] == 70
+    assert food_db.lookup("large egg")["calories"] == 70
+
+
+def test_no_match(food_db):
+    """
+    Test unrelated names return None
+    """
+    assert food_db.lookup("xylophone") is None
+
+
+def test_open_missing_database(tmp_path):
+    """
+    Test no database is used when the file doesn't exist
+    """
+    assert FoodDatabase.open(str(tmp_path / "missing.db")) is None
+
+
+def test_read_usda_json_export(tmp_path):
+    """
+    Test label nutrients are read as they are and food nutrients are scaled
+    from per 100 g to a serving
+    """
+    per_100g = [
+        {"nutrient": {"number": "208"}, "amount": 35},
+        {"nutrient": {"number": "301"}, "amount": 254},
+    ]
+    export = tmp_path / "export.json"
+    export.write_text(json.dumps({"FoundationFoods": [
+        {"description": "Milk", "labelNutrients": {"calcium": {"value": 300}}},
+        {"description": "Kale", "foodPortions": [{"gramWeight": 20}], "foodNutrients": per_100g},
+        {"description": "Spinach", "servingSize": 50, "servingSizeUnit": "g", "foodNutrients": per_100g},
+        {"description": "Mystery", "foodNutrients": per_100g},
+    ]}))
+    foods = dict(read_export(str(export)))
+    assert foods["Milk"]["calcium"] == 300
+    assert foods["Kale"]["calories"] == 7
+    assert foods["Kale"]["calcium"] == 50.8
+    assert foods["Spinach"]["calories"] == 17.5
+    assert "Mystery" not in foods
+
+
+def test_resolve_nutrition_offline(food_db):
+    """
+    Test local foods resolve without reaching the api
+    """
+    client = USDAClient(api_key="key", base_url="http://127.0.0.1:9", retries=0)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results, unresolved = resolve_nutrition(
+            ["egg", "peanut butter"], client, executor, 5, food_db=food_db
+        )
+    assert unresolved == []
+    assert results["egg"]["calories"] == 72
+
+
+def test_multi_word_names(food_db):
+    """
+    Test only names with more than one word are listed for the phrase trie
+    """
+    assert sorted(food_db.names(4)) == ["brown rice", "peanut butter"]
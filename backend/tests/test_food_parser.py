@@ -0,0 +1,34 @@
+"""testing for parsing the foods typed for a meal"""
+
+import pytest
+
+from food_parser import PhraseTrie, parse_food_input
+
+
+@pytest.mark.parametrize("food_input, expected", [
+    ("eggs rice", {"eggs": 1, "rice": 1}),
+    ("2 eggs toast peanut butter", {"eggs": 2, "toast": 1, "peanut butter": 1}),
+    ("2 eggs, toast with jam", {"eggs": 2, "toast with jam": 1}),
+    ("200g chicken breast and 1 1/2 cups brown rice", {"chicken breast": 2, "brown rice": 1.5}),
+    ("a cup of coffee", {"coffee": 1}),
+    ("half and half", {"half and half": 1}),
+    ("mac & cheese", {"mac and cheese": 1}),
+    ("3 slices pizza; coke x2", {"pizza": 3, "coke": 2}),
+    ("Eggs EGGS  eggs", {"eggs": 3}),
+    ("2", {}),
+])
+def test_parse_food_input(food_input, expected):
+    assert parse_food_input(food_input) == pytest.approx(expected)
+
+
+def test_custom_phrases():
+    """
+    Test phrases from the food database group words
+    """
+    phrases = PhraseTrie(["grilled cheese sandwich", "grilled cheese", "x"])
+    assert phrases.size == 2
+    assert parse_food_input("grilled cheese sandwich soup", phrases) == {
+        "grilled cheese sandwich": 1,
+        "soup": 1,
+    }
+    assert parse_food_input("grilled cheese tomato", phrases) == {"grilled cheese": 1, "tomato": 1}
@@ -0,0 +1,59 @@
+"""testing for startup and health probes"""
+
+import time
+
+import mongomock
+
+from app import create_app
+
+UNREACHABLE = "mongodb://10.255.255.1:27017/?serverSelectionTimeoutMS=5000"
+
+
+def test_probes_when_ready(client):
+    assert client.get("/healthz").json == {"status": "ok"}
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json["mongo"] == "ok"
+    assert response.json["usda"] == "closed"
+
+
+def test_startup_does_not_wait_for_mongo(monkeypatch):
+    """
+    Test an unreachable mongo doesn't hold up startup or the liveness probe
+    """
+    monkeypatch.setenv("MONGO_URI", UNREACHABLE)
+    monkeypatch.setenv("READY_TIMEOUT", "0.2")
+    start = time.perf_counter()
+    app = create_app()
+    client = app.test_client()
+    assert client.get("/healthz").status_code == 200
+    assert time.perf_counter() - start < 1
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json["mongo"].startswith("unreachable")
+    assert response.json["indexes"] == "pending"
+
+    metrics = client.get("/metrics").data.decode("utf-8")
+    assert 'app_startup_seconds{phase="create_app"}' in metrics
+
+
+def test_index_errors_fail_readiness(monkeypatch):
+    """
+    Test an index that can't be built is reported instead of retried forever
+    """
+    client = mongomock.MongoClient()
+    client.test.users.insert_many([{"username": "twin"}, {"username": "twin"}])
+    monkeypatch.setattr("pymongo.MongoClient", lambda *args, **kwargs: client)
+    monkeypatch.setenv("MONGO_DBNAME", "test")
+    monkeypatch.setenv("MONGO_STARTUP_RETRY", "0")
+    app = create_app()
+
+    for _ in range(50):
+        response = app.test_client().get("/readyz")
+        if response.json["indexes"] != "pending":
+            break
+        time.sleep(0.05)
+    assert response.status_code == 503
+    assert response.json["indexes"] == "failed"
+    assert "username_unique" in response.json["index_errors"]
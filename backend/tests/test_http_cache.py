@@ -0,0 +1,73 @@
+"""testing for conditional requests and cached meal lists"""
+
+from datetime import datetime, timezone
+
+import pytest
+from bson.objectid import ObjectId
+
+from nutrition import empty_nutrition
+
+
+@pytest.fixture
+def log_meal(client, db, register):
+    """
+    Return a function that saves a meal for a logged in user without the api
+    """
+    user_id = register(client, "cacheuser")
+
+    def log_meal(food_input):
+        return db.meals.insert_one({
+            "user_id": user_id,
+            "food_input": food_input,
+            "foods": [food_input],
+            "meal_type": "lunch",
+            "date": "2025-04-28",
+            "nutrition": empty_nutrition(),
+            "status": "complete",
+            "added_at": datetime.now(timezone.utc),
+        }).inserted_id
+
+    return log_meal
+
+
+def test_home_not_modified_until_a_meal_is_added(client, log_meal):
+    log_meal("eggs")
+
+    first = client.get("/home")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    etag = first.headers["ETag"]
+
+    again = client.get("/home", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+
+    log_meal("toast")
+    changed = client.get("/home", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert "toast" in changed.data.decode("utf-8")
+
+
+def test_meal_list_fragments_are_cached(monkeypatch, client, log_meal):
+    log_meal("eggs")
+    calls = []
+    monkeypatch.setattr("app.meal_page", lambda *args: calls.append(args) or ([], None))
+
+    assert "eggs" not in client.get("/meal-history").data.decode("utf-8")
+    client.get("/meal-history")
+    assert len(calls) == 1
+
+    # a new meal changes the key, so the list is queried again
+    log_meal("toast")
+    client.get("/meal-history")
+    assert len(calls) == 2
+
+
+def test_summary_not_modified(client, log_meal):
+    meal_id = log_meal("eggs")
+
+    first = client.get(f"/meal-summary/{meal_id}")
+    assert first.status_code == 200
+    again = client.get(f"/meal-summary/{meal_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert client.get(f"/meal-summary/{ObjectId()}").status_code == 302
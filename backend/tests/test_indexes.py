@@ -0,0 +1,43 @@
+"""testing for mongo index bootstrap"""
+
+import mongomock
+from pymongo.errors import ServerSelectionTimeoutError
+
+from indexes import ensure_indexes, is_transient, plan_stages
+
+
+def test_ensure_indexes_is_idempotent():
+    """
+    Test indexes are created once and can be ensured again
+    """
+    db = mongomock.MongoClient().db
+    assert ensure_indexes(db) == []
+    assert ensure_indexes(db) == []
+
+    assert db.users.index_information()["username_unique"]["unique"] is True
+    assert db.meals.index_information()["user_added_at_id"]["key"] == [
+        ("user_id", 1),
+        ("added_at", -1),
+        ("_id", -1),
+    ]
+    assert "user_date" in db.meals.index_information()
+
+
+def test_plan_stages():
+    """
+    Test stages are found in nested explain output
+    """
+    plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "user_added_at"}}
+    assert plan_stages(plan) == ["FETCH", "IXSCAN"]
+
+
+def test_duplicate_keys_are_not_retried():
+    """
+    Test a unique index over duplicates fails with an error retrying won't fix
+    """
+    db = mongomock.MongoClient().db
+    db.users.insert_many([{"username": "twin"}, {"username": "twin"}])
+    failed = ensure_indexes(db)
+    assert [name for name, _ in failed] == ["username_unique"]
+    assert not is_transient(failed[0][1])
+    assert is_transient(ServerSelectionTimeoutError("no servers"))
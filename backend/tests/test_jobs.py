@@ -0,0 +1,130 @@
+"""testing for the mongo job queue and async meal ingestion"""
+
+import mongomock
+import pytest
+
+from jobs import JobQueue
+from tests.usda_stub import USDAStub
+from usda_client import USDAClient
+
+
+@pytest.fixture
+def collection():
+    """
+    Create a mock mongo collection for jobs
+    """
+    return mongomock.MongoClient().db.jobs
+
+
+def test_jobs_run_and_are_removed(collection):
+    """
+    Test queued jobs are handed to their handler
+    """
+    seen = []
+    queue = JobQueue(collection, {"echo": seen.append})
+    queue.enqueue("echo", {"n": 1})
+    queue.enqueue("echo", {"n": 2})
+
+    assert queue.run_pending() == 2
+    assert seen == [{"n": 1}, {"n": 2}]
+    assert collection.count_documents({}) == 0
+
+
+def test_failed_jobs_are_retried_then_marked_failed(collection):
+    """
+    Test a failing job is retried later and gives up after max attempts
+    """
+    def fail(payload):
+        raise ValueError("boom")
+
+    queue = JobQueue(collection, {"fail": fail}, max_attempts=2)
+    queue.enqueue("fail", {})
+    assert queue.run_pending() == 1
+
+    job = collection.find_one()
+    assert job["status"] == "queued"
+    assert job["attempts"] == 1
+
+    # make the retry due now
+    collection.update_one({}, {"$set": {"run_at": job["created_at"]}})
+    queue.run_pending()
+    job = collection.find_one()
+    assert job["status"] == "failed"
+    assert job["error"] == "boom"
+
+
+def test_failure_handler_runs_once_job_gives_up(collection):
+    """
+    Test the failure handler only runs after the last attempt
+    """
+    def fail(payload):
+        raise ValueError("boom")
+
+    failures = []
+    queue = JobQueue(
+        collection, {"fail": fail}, max_attempts=2,
+        failure_handlers={"fail": lambda payload, error: failures.append((payload, str(error)))},
+    )
+    queue.enqueue("fail", {"n": 1})
+    queue.run_pending()
+    assert failures == []
+
+    collection.update_one({}, {"$set": {"run_at": collection.find_one()["created_at"]}})
+    queue.run_pending()
+    assert failures == [({"n": 1}, "boom")]
+
+
+def test_async_add_meal(monkeypatch, make_app, register):
+    """
+    Test meals are saved as pending and filled in by the worker
+    """
+    monkeypatch.setenv("INGEST_MODE", "async")
+    monkeypatch.setattr(JobQueue, "start", lambda self: None)
+    app = make_app()
+    client = app.test_client()
+    register(client, "asyncuser")
+    response = client.post(
+        "/add-meal",
+        data={"food_list": "eggs", "meal_type": "breakfast", "date": "2025-04-28"},
+        follow_redirects=True,
+    )
+    assert "Looking up nutrition facts" in response.data.decode("utf-8")
+
+    with USDAStub({"eggs": {"calories": {"value": 70}}}) as stub:
+        monkeypatch.setattr("app.usda", USDAClient(api_key="key", base_url=stub.url, retries=0))
+        assert app.config["JOB_QUEUE"].run_pending() == 1
+
+    response = client.get(response.request.path)
+    html = response.data.decode("utf-8")
+    assert "Looking up nutrition facts" not in html
+    assert "70 kcal" in html
+
+
+def test_async_meal_stops_waiting_when_lookup_gives_up(monkeypatch, make_app, register):
+    """
+    Test a pending meal whose job runs out of attempts is marked failed
+    and its page stops refreshing
+    """
+    monkeypatch.setenv("INGEST_MODE", "async")
+    monkeypatch.setenv("JOB_MAX_ATTEMPTS", "1")
+    monkeypatch.setattr(JobQueue, "start", lambda self: None)
+    app = make_app()
+    client = app.test_client()
+    register(client, "failinguser")
+    response = client.post(
+        "/add-meal",
+        data={"food_list": "eggs", "meal_type": "breakfast", "date": "2025-04-28"},
+    )
+
+    def broken(*args):
+        raise RuntimeError("lookup broke")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("app.recommend_for_meal", broken)
+        with USDAStub({}) as stub:
+            patch.setattr("app.usda", USDAClient(api_key="key", base_url=stub.url, retries=0))
+            assert app.config["JOB_QUEUE"].run_pending() == 1
+
+    html = client.get(response.location).data.decode("utf-8")
+    assert "http-equiv=\"refresh\"" not in html
+    assert "couldn't be looked up for: eggs" in html
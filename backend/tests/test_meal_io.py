@@ -0,0 +1,186 @@
+"""testing for bulk meal import and export"""
+
+import json
+
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+
+from jobs import JobQueue
+from meal_io import import_meals, read_csv, read_ndjson
+from tests.usda_stub import USDAStub
+from usda_client import USDAClient
+
+FOODS = {
+    "eggs": {"calories": {"value": 70}},
+    "rice": {"calories": {"value": 200}},
+}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """
+    Stand in for the USDA api
+    """
+    with USDAStub(FOODS) as stub:
+        monkeypatch.setattr("app.usda", USDAClient(api_key="key", base_url=stub.url, retries=0))
+        yield stub
+
+
+def test_import_looks_up_each_food_once():
+    """
+    Test foods repeated across chunks are only resolved once
+    """
+    db = mongomock.MongoClient().db
+    lookups = []
+
+    def resolve(foods):
+        lookups.extend(foods)
+        return {food: {"calories": 100} for food in foods}, []
+
+    lines = [json.dumps({"food_input": "eggs rice", "meal_type": "lunch", "date": "2025-04-28"})] * 5
+    summary = import_meals(db, ObjectId(), read_ndjson(lines), resolve, chunk_size=2)
+
+    assert summary["imported"] == 5
+    assert sorted(lookups) == ["eggs", "rice"]
+    assert db.meals.count_documents({}) == 5
+    assert db.daily_totals.find_one()["nutrition"]["calories"] == 1000
+
+
+def test_import_reports_bad_lines():
+    """
+    Test invalid lines are skipped and reported
+    """
+    db = mongomock.MongoClient().db
+    lines = [
+        "not json",
+        json.dumps({"meal_type": "lunch"}),
+        json.dumps({"food_input": "eggs", "date": "yesterday"}),
+        json.dumps({"foods": ["eggs"], "meal_type": "Dinner"}),
+    ]
+    summary = import_meals(db, ObjectId(), read_ndjson(lines), lambda foods: ({}, foods))
+
+    assert summary["imported"] == 1
+    assert [error["line"] for error in summary["errors"]] == [1, 2, 3]
+    assert summary["unresolved_foods"] == ["eggs"]
+
+
+def test_import_queues_unresolved_meals():
+    """
+    Test meals with foods that timed out are saved as pending and queued
+    """
+    db = mongomock.MongoClient().db
+    queued = []
+    lines = [
+        json.dumps({"food_input": "eggs", "date": "2025-04-28"}),
+        json.dumps({"food_input": "eggs rice", "date": "2025-04-28"}),
+    ]
+    summary = import_meals(
+        db, ObjectId(), read_ndjson(lines),
+        lambda foods: ({"eggs": {"calories": 70}}, ["rice"]),
+        enqueue=queued.append,
+    )
+
+    assert summary["imported"] == 2
+    assert summary["pending"] == 1
+    assert summary["unresolved_foods"] == ["rice"]
+    pending = db.meals.find_one({"status": "pending"})
+    assert queued == [pending["_id"]]
+    assert pending["nutrition"]["calories"] == 70
+    assert db.meals.count_documents({"status": "complete"}) == 1
+
+
+def test_import_past_deadline_is_filled_in_by_jobs(monkeypatch, make_app, db, register):
+    """
+    Test an import that runs out of lookup time is completed by the job queue
+    """
+    monkeypatch.setenv("IMPORT_NUTRITION_DEADLINE", "0")
+    monkeypatch.setattr(JobQueue, "start", lambda self: None)
+    app = make_app()
+    client = app.test_client()
+    register(client, "slowimporter")
+    body = "\n".join(json.dumps({"food_input": "eggs", "date": "2025-04-28"}) for _ in range(2))
+    response = client.post("/api/meals/import", data=body, content_type="application/x-ndjson")
+    assert response.get_json()["pending"] == 2
+
+    with USDAStub(FOODS) as stub:
+        monkeypatch.setattr("app.usda", USDAClient(api_key="key", base_url=stub.url, retries=0))
+        assert app.config["JOB_QUEUE"].run_pending() == 2
+    assert db.meals.count_documents({"status": "complete", "nutrition.calories": 70}) == 2
+    assert db.daily_totals.find_one()["nutrition"]["calories"] == 140
+
+
+def test_enriched_import_counts_resolved_foods_once(monkeypatch, make_app, db, register):
+    """
+    Test a partly resolved imported meal's recommendations count its day's nutrition once
+    """
+    monkeypatch.setattr(JobQueue, "start", lambda self: None)
+    app = make_app()
+    user_id = register(app.test_client(), "partialimporter")
+    queue = app.config["JOB_QUEUE"]
+    lines = [json.dumps({"food_input": "eggs rice", "date": "2025-04-28"})]
+    import_meals(
+        db, user_id, read_ndjson(lines),
+        lambda foods: ({"eggs": {"calories": 70}}, ["rice"]),
+        enqueue=lambda meal_id: queue.enqueue("enrich_meal", {"meal_id": meal_id}),
+    )
+
+    with USDAStub(FOODS) as stub:
+        monkeypatch.setattr("app.usda", USDAClient(api_key="key", base_url=stub.url, retries=0))
+        assert queue.run_pending() == 1
+    meal = db.meals.find_one()
+    assert meal["nutrition"]["calories"] == 270
+    assert db.daily_totals.find_one()["nutrition"]["calories"] == 270
+    assert meal["recommendations"]["still_needed"]["calories"] == 2000 - 270
+
+
+def test_import_reports_lines_that_are_not_utf8(client, register, stub):
+    """
+    Test bytes that aren't UTF-8 fail only their own line or row
+    """
+    register(client, "latin1importer")
+    body = b'{"food_input": "eggs", "date": "2025-04-28"}\n{"food_input": "cr\xe8me"}\n'
+    response = client.post("/api/meals/import", data=body, content_type="application/x-ndjson")
+    summary = response.get_json()
+    assert response.status_code == 200
+    assert summary["imported"] == 1
+    assert [error["line"] for error in summary["errors"]] == [2]
+
+    body = b"food_input,date\ncr\xe8me,2025-04-28\nrice,2025-04-28\n"
+    summary = client.post("/api/meals/import", data=body, content_type="text/csv").get_json()
+    assert summary["imported"] == 1
+    assert [error["line"] for error in summary["errors"]] == [2]
+
+
+def test_read_csv():
+    """
+    Test csv rows become records with their line numbers
+    """
+    rows = list(read_csv(["food_input,meal_type,date", "eggs rice,lunch,2025-04-28"]))
+    assert rows == [(2, {"food_input": "eggs rice", "meal_type": "lunch", "date": "2025-04-28"})]
+
+
+def test_import_and_export_api(client, register, stub):
+    """
+    Test meals uploaded as JSON Lines and csv come back from the export
+    """
+    register(client, "importer")
+    body = "\n".join(json.dumps({"food_input": "eggs", "meal_type": "breakfast", "date": "2025-04-28"}) for _ in range(3))
+    response = client.post("/api/meals/import", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert response.get_json()["imported"] == 3
+    assert stub.count("GET", "/foods/search") == 1
+
+    response = client.post(
+        "/api/meals/import",
+        data="food_input,meal_type,date\nrice eggs,dinner,2025-04-29\n",
+        content_type="text/csv",
+    )
+    assert response.get_json()["imported"] == 1
+
+    response = client.get("/api/meals/export")
+    assert response.mimetype == "application/x-ndjson"
+    meals = [json.loads(line) for line in response.data.decode("utf-8").splitlines()]
+    assert len(meals) == 4
+    assert meals[0]["nutrition"]["calories"] == 70
+    assert meals[-1]["nutrition"]["calories"] == 270
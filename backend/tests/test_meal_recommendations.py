@@ -0,0 +1,87 @@
+"""testing for recommendations stored on meals"""
+
+import mongomock
+from bson.objectid import ObjectId
+
+from meal_recommendations import (
+    RECOMMENDATION_VERSION,
+    is_current,
+    recommend_for_meal,
+    recompute_recommendations,
+)
+from nutrition import empty_nutrition
+from rollups import add_meal_totals
+from tests.usda_stub import USDAStub
+from usda_client import USDAClient
+
+
+def add_meal(db, user_id, calories, **fields):
+    meal = dict(
+        {"status": "complete"},
+        user_id=user_id,
+        date="2025-04-28",
+        nutrition=dict(empty_nutrition(), calories=calories),
+        **fields,
+    )
+    meal["_id"] = db.meals.insert_one(meal).inserted_id
+    add_meal_totals(db.daily_totals, meal)
+    return meal
+
+
+def test_recommend_for_meal_counts_extra_nutrition():
+    """
+    Test nutrition not yet in the day's totals is counted
+    """
+    db = mongomock.MongoClient().db
+    meal = add_meal(db, ObjectId(), 500)
+    stored = recommend_for_meal(db.daily_totals, meal, {"calories": 1000})
+    assert stored["version"] == RECOMMENDATION_VERSION
+    assert stored["still_needed"]["calories"] == 500
+    assert len(stored["foods"]) == 2
+
+
+def test_recompute_only_updates_old_versions():
+    """
+    Test meals with current recommendations are skipped unless forced
+    """
+    db = mongomock.MongoClient().db
+    user_id = ObjectId()
+    add_meal(db, user_id, 500)
+    add_meal(db, user_id, 300, recommendations={"version": "0-old"})
+    current = add_meal(db, user_id, 200)
+    add_meal(db, user_id, 100, status="pending")
+    db.meals.update_one(
+        {"_id": current["_id"]},
+        {"$set": {"recommendations": recommend_for_meal(db.daily_totals, current)}},
+    )
+
+    assert recompute_recommendations(db, batch_size=1) == 2
+    meals = list(db.meals.find({"status": "complete"}))
+    assert all(is_current(meal) for meal in meals)
+    # every meal that day sees the same day's totals
+    assert {meal["recommendations"]["still_needed"]["calories"] for meal in meals} == {900}
+
+    assert recompute_recommendations(db) == 0
+    assert recompute_recommendations(db, force=True) == 3
+
+
+def test_summary_reads_stored_recommendations(monkeypatch, client, db, register):
+    """
+    Test the summary page shows the recommendations saved when the meal was added
+    """
+    meals = db.meals
+    register(client, "recommenduser")
+    with USDAStub({}) as stub:
+        monkeypatch.setattr("app.usda", USDAClient(api_key="key", base_url=stub.url, retries=0))
+        response = client.post(
+            "/add-meal",
+            data={"food_list": "unknownfood", "meal_type": "lunch", "date": "2025-04-28"},
+        )
+    meal = meals.find_one({"foods": ["unknownfood"]})
+    assert is_current(meal)
+
+    # a meal saved before recommendations were stored gets them on first view
+    meals.update_one({"_id": meal["_id"]}, {"$unset": {"recommendations": ""}})
+    first = client.get(response.location).data
+    assert is_current(meals.find_one({"_id": meal["_id"]}))
+    assert client.get(response.location).data == first
@@ -0,0 +1,110 @@
+"""testing for request and dependency metrics"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from metrics import Histogram, Registry, SharedMetrics, SlowRequestProfiler, dependency_timer, DEPENDENCY_ERRORS
+
+
+def test_histogram_render():
+    """
+    Test histogram buckets are cumulative and labeled
+    """
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1))
+    histogram.observe(0.05, "/")
+    histogram.observe(0.5, "/")
+    histogram.observe(5, "/")
+    lines = histogram.render()
+
+    assert 'latency_seconds_bucket{route="/",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/"} 3' in lines
+
+
+def test_gauge_collector():
+    """
+    Test gauges are read when the registry is rendered
+    """
+    registry = Registry()
+    registry.gauge_collector("cache", "Cache stats", lambda: [({"stat": "hits"}, 3)])
+    assert 'cache{stat="hits"} 3' in registry.render()
+
+
+def test_shared_metrics_add_up_workers(tmp_path):
+    """
+    Test a scrape adds up every worker's counters and histograms and keeps the
+    counts of workers that have exited
+    """
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(1,))
+    registry.gauge_collector("cache_size", "Cache size", lambda: [({}, 7)])
+    requests.inc("/", amount=2)
+    latency.observe(0.5)
+
+    # another worker that has since exited
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    (tmp_path / f"{exited.pid}.json").write_text(json.dumps({
+        "metrics": {"requests_total": [[["/"], 3]], "latency_seconds": [[[], [0, 1, 2.0]]]},
+        "gauges": {"cache_size": [[{}, 9]]},
+    }))
+
+    shared = SharedMetrics(registry, str(tmp_path))
+    text = shared.render()
+    assert 'requests_total{route="/"} 5' in text
+    assert 'latency_seconds_count 2' in text
+    assert 'latency_seconds_sum 2.5' in text
+    # gauges are only reported for running workers
+    assert f'cache_size{{pid="{os.getpid()}"}} 7' in text
+    assert f'pid="{exited.pid}"' not in text
+
+    # the exited worker was folded into the archive and still counts
+    assert not (tmp_path / f"{exited.pid}.json").exists()
+    requests.inc("/")
+    assert 'requests_total{route="/"} 6' in shared.render()
+
+
+def test_dependency_timer_counts_errors():
+    """
+    Test a failing dependency call is counted
+    """
+    before = DEPENDENCY_ERRORS.value("test", "boom")
+    with pytest.raises(ValueError):
+        with dependency_timer("test", "boom"):
+            raise ValueError()
+    assert DEPENDENCY_ERRORS.value("test", "boom") == before + 1
+
+
+def test_metrics_route(client):
+    """
+    Test request metrics are served in the prometheus format
+    """
+    client.get("/")
+    response = client.get("/metrics")
+    text = response.data.decode("utf-8")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert 'http_requests_total{route="/",method="GET",status="200"}' in text
+    assert 'http_request_duration_seconds_count{route="/",method="GET"}' in text
+    assert 'nutrition_cache{stat="hits"}' in text
+
+
+def test_slow_request_profiler(capsys):
+    """
+    Test slow requests print where they spent their time
+    """
+    profiler = SlowRequestProfiler(threshold=0.01, interval=0.001)
+    profiler.start()
+    time.sleep(0.05)
+    profiler.stop("GET /slow", 0.05)
+    output = capsys.readouterr().out
+    assert "Slow request GET /slow" in output
+    assert "test_slow_request_profiler" in output
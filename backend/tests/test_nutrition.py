@@ -0,0 +1,122 @@
+"""testing for concurrent nutrition lookups"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nutrition import empty_nutrition, lookup_all, resolve_nutrition, total_nutrition
+from nutrition_cache import NutritionCache
+from tests.usda_stub import USDAStub
+from usda_client import USDAClient
+
+
+@pytest.fixture
+def executor():
+    """
+    Create a thread pool for lookups
+    """
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def test_lookup_all_runs_concurrently(executor):
+    """
+    Test lookups overlap instead of running one after another
+    """
+    def lookup(food):
+        time.sleep(0.2)
+        return dict(empty_nutrition(), calories=100)
+
+    start = time.monotonic()
+    results, unresolved = lookup_all(["rice", "eggs", "beans"], lookup, executor, 5)
+    assert time.monotonic() - start < 0.5
+    assert set(results) == {"rice", "eggs", "beans"}
+    assert unresolved == []
+
+
+def test_lookup_all_deadline_keeps_partial_results(executor):
+    """
+    Test slow foods are reported as unresolved and the rest are totaled
+    """
+    release = threading.Event()
+
+    def lookup(food):
+        if food == "slow":
+            release.wait(2)
+        return dict(empty_nutrition(), calories=100)
+
+    foods = ["rice", "slow", "rice"]
+    results, unresolved = lookup_all(foods, lookup, executor, 0.2)
+    release.set()
+
+    assert unresolved == ["slow"]
+    assert total_nutrition(foods, results)["calories"] == 200
+
+
+def test_lookup_all_failed_lookup_is_unresolved(executor):
+    """
+    Test a lookup that raises does not break the meal
+    """
+    def lookup(food):
+        if food == "bad":
+            raise ValueError(food)
+        return empty_nutrition()
+
+    results, unresolved = lookup_all(["bad", "rice"], lookup, executor, 1)
+    assert list(results) == ["rice"]
+    assert unresolved == ["bad"]
+
+
+def test_resolve_nutrition_batches_details(executor):
+    """
+    Test a meal costs one search per new food plus one bulk detail request
+    """
+    foods = {
+        "eggs": {"calories": {"value": 70}, "protein": {"value": 6}},
+        "rice": {"calories": {"value": 200}},
+        "beans": {"fiber": {"value": 7}},
+    }
+    meal = ["eggs", "rice", "beans", "eggs", "unknownfood"]
+    cache = NutritionCache()
+
+    with USDAStub(foods) as stub:
+        client = USDAClient(api_key="key", base_url=stub.url, retries=0)
+        results, unresolved = resolve_nutrition(meal, client, executor, 5, cache)
+
+        assert stub.count("GET", "/foods/search") == 4
+        assert stub.count("POST", "/foods") == 1
+        assert stub.count("GET", "/food/") == 0
+        assert unresolved == []
+
+        totals = total_nutrition(meal, results)
+        assert totals["calories"] == 340
+        assert totals["protein"] == 12
+        assert totals["fiber"] == 7
+
+        # second meal is answered from the cache
+        resolve_nutrition(meal, client, executor, 5, cache)
+        assert len(stub.requests) == 5
+
+
+def test_resolve_nutrition_upstream_down(executor):
+    """
+    Test foods are unresolved when the api can't be reached
+    """
+    with USDAStub({}) as stub:
+        url = stub.url
+    client = USDAClient(api_key="key", base_url=url, retries=0)
+    results, unresolved = resolve_nutrition(["eggs"], client, executor, 5)
+    assert results == {}
+    assert unresolved == ["eggs"]
+
+
+def test_total_nutrition_scales_servings():
+    """
+    Test nutrition facts are multiplied by the servings of each food
+    """
+    results = {"eggs": dict(empty_nutrition(), calories=70), "rice": dict(empty_nutrition(), calories=200)}
+    totals = total_nutrition(["eggs", "rice", "beans"], results, [2, 0.5, 1])
+    assert totals["calories"] == 240
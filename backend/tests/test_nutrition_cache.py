@@ -0,0 +1,91 @@
+"""testing for nutrition lookup cache"""
+
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from nutrition_cache import NutritionCache, normalize_food_name
+
+EGGS = {"calories": 70, "protein": 6, "carbohydrates": 0, "fiber": 0, "calcium": 30}
+
+
+@pytest.fixture
+def collection():
+    """
+    Create a mock mongo collection for the cache
+    """
+    return mongomock.MongoClient().db.nutrition_cache
+
+
+def test_normalize_food_name():
+    """
+    Test food names are normalized to one key
+    """
+    assert normalize_food_name("  Peanut   BUTTER ") == "peanut butter"
+
+
+def test_cache_miss_then_hit(collection):
+    """
+    Test a stored entry is returned and counted
+    """
+    cache = NutritionCache(collection)
+    assert cache.get("eggs") is None
+    cache.set("eggs", EGGS)
+    assert cache.get("Eggs") == EGGS
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_cache_shared_through_mongo(collection):
+    """
+    Test a second cache reads entries written by the first
+    """
+    NutritionCache(collection).set("eggs", EGGS)
+    other = NutritionCache(collection)
+    assert other.get("eggs") == EGGS
+    assert other.stats()["size"] == 1
+
+
+def test_cache_lru_eviction():
+    """
+    Test least recently used entries are evicted from memory
+    """
+    cache = NutritionCache(max_size=2)
+    cache.set("eggs", EGGS)
+    cache.set("rice", EGGS)
+    cache.get("eggs")
+    cache.set("beans", EGGS)
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("rice") is None
+    assert cache.get("eggs") == EGGS
+
+
+def test_cache_negative_ttl(collection):
+    """
+    Test negative results use the shorter ttl
+    """
+    cache = NutritionCache(collection, ttl=3600, negative_ttl=60)
+    cache.set("zzzz", EGGS, negative=True)
+    doc = collection.find_one({"_id": "zzzz"})
+    assert doc["negative"] is True
+
+    expires_at = doc["expires_at"].replace(tzinfo=timezone.utc)
+    assert expires_at < datetime.now(timezone.utc) + timedelta(seconds=120)
+
+
+def test_cache_ignores_expired_mongo_entries(collection):
+    """
+    Test expired documents are treated as a miss
+    """
+    collection.insert_one({
+        "_id": "eggs",
+        "nutrition": EGGS,
+        "negative": False,
+        "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1),
+    })
+    assert NutritionCache(collection).get("eggs") is None
+
@@ -0,0 +1,72 @@
+"""testing for meal history pagination"""
+
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+from bson.objectid import ObjectId
+
+from pagination import decode_cursor, encode_cursor, meal_page
+
+
+def add_meals(meals, user_id, count):
+    """
+    Insert meals where pairs share the same added_at time
+    """
+    start = datetime(2025, 4, 28, tzinfo=timezone.utc)
+    for i in range(count):
+        meals.insert_one({
+            "user_id": user_id,
+            "food_input": f"meal {i}",
+            "meal_type": "lunch",
+            "date": "2025-04-28",
+            "nutrition": {"calories": i},
+            "added_at": start + timedelta(minutes=i // 2),
+        })
+
+
+def test_pages_cover_every_meal_once():
+    """
+    Test walking the pages returns each meal once, newest first
+    """
+    meals = mongomock.MongoClient().db.meals
+    user_id = ObjectId()
+    add_meals(meals, user_id, 7)
+    add_meals(meals, ObjectId(), 3)
+
+    seen = []
+    token = None
+    while True:
+        page, token = meal_page(meals, user_id, 3, token)
+        seen.extend(page)
+        if token is None:
+            break
+
+    assert len(seen) == 7
+    assert len({meal["_id"] for meal in seen}) == 7
+    assert [meal["food_input"] for meal in seen][0] == "meal 6"
+    added = [meal["added_at"] for meal in seen]
+    assert added == sorted(added, reverse=True)
+
+
+def test_page_only_fetches_list_fields():
+    """
+    Test meals in a page don't carry fields the list doesn't show
+    """
+    meals = mongomock.MongoClient().db.meals
+    user_id = ObjectId()
+    add_meals(meals, user_id, 1)
+    page, token = meal_page(meals, user_id, 3)
+    assert token is None
+    assert "nutrition" not in page[0]
+    assert page[0]["food_input"] == "meal 0"
+
+
+def test_cursor_round_trip():
+    """
+    Test tokens decode to the meal they were made from
+    """
+    meal = {"_id": ObjectId(), "added_at": datetime(2025, 4, 28, 12, 30, 0, 123000)}
+    assert decode_cursor(encode_cursor(meal)) == (meal["added_at"], meal["_id"])
+    assert decode_cursor("not-a-token") is None
+    assert decode_cursor("99999999999999999999-" + "0" * 24) is None
+    assert decode_cursor(f"{10 ** 300}-" + "0" * 24) is None
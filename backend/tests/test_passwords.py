@@ -0,0 +1,93 @@
+"""testing for password hashing"""
+
+import os
+import runpy
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from passwords import HashPool, PasswordHasher, PasswordPoolBusy, shared_pool
+
+
+@pytest.fixture
+def hasher():
+    return PasswordHasher("bcrypt", 4, HashPool("thread", workers=2))
+
+
+def test_hash_and_verify(hasher):
+    hashed = hasher.hash("secret")
+    assert hashed.startswith("$2b$04$")
+    assert hasher.verify(hashed, "secret")
+    assert not hasher.verify(hashed, "wrong")
+
+
+def test_verify_werkzeug_hash(hasher):
+    hashed = generate_password_hash("secret")
+    assert hasher.verify(hashed, "secret")
+    assert not hasher.verify(hashed, "wrong")
+
+
+def test_needs_rehash(hasher):
+    assert hasher.needs_rehash(generate_password_hash("secret"))
+    assert hasher.needs_rehash(PasswordHasher("bcrypt", 5, hasher.pool).hash("secret"))
+    assert not hasher.needs_rehash(hasher.hash("secret"))
+
+
+def test_process_pool():
+    hasher = PasswordHasher("bcrypt", 4, HashPool("process", workers=1))
+    assert hasher.verify(hasher.hash("secret"), "secret")
+
+
+def test_pool_splits_cores_between_web_workers(monkeypatch):
+    """
+    Test the default pool uses threads and this web worker's share of the cores
+    """
+    monkeypatch.delenv("PASSWORD_POOL", raising=False)
+    monkeypatch.delenv("PASSWORD_WORKERS", raising=False)
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    pool = shared_pool()
+    assert (pool.kind, pool.workers) == ("thread", 2)
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "17")
+    assert shared_pool().workers == 1
+
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    pool = shared_pool()
+    assert (pool.kind, pool.workers) == ("thread", 8)
+
+
+def test_hashing_processes_do_not_create_the_app():
+    """
+    Test app.py re-imported by a spawned hashing process doesn't start the app
+    """
+    path = os.path.join(os.path.dirname(__file__), "..", "app.py")
+    assert "app" not in runpy.run_path(path, run_name="__mp_main__")
+
+
+def test_pool_busy():
+    release = threading.Event()
+    pool = HashPool("thread", workers=1, max_pending=1, wait=0.01)
+    thread = threading.Thread(target=pool.run, args=(release.wait,))
+    thread.start()
+    try:
+        with pytest.raises(PasswordPoolBusy):
+            pool.run(str, "x")
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_login_upgrades_old_hash(monkeypatch, make_app, db, register):
+    monkeypatch.setenv("BCRYPT_ROUNDS", "4")
+    app = make_app()
+    users = db.users
+    client = app.test_client()
+    register(client, "olduser")
+    client.get("/logout")
+    users.update_one({"username": "olduser"}, {"$set": {"password": generate_password_hash("pass")}})
+
+    response = client.post("/", data={"username": "olduser", "password": "pass"})
+    assert response.status_code == 302
+    assert users.find_one({"username": "olduser"})["password"].startswith("$2b$04$")
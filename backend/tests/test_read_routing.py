@@ -0,0 +1,134 @@
+"""testing for read routing to secondaries"""
+
+import mongomock
+import pymongo
+import pytest
+from bson.objectid import ObjectId
+
+from app import create_app
+from metrics import MongoCommandTimer
+from read_routing import ReadRouter, read_preference, write_token
+from tests.replica_set import ReplicaSet
+from tests.usda_stub import USDAStub
+from usda_client import USDAClient
+
+
+def test_read_preference_modes():
+    assert read_preference("primary").mongos_mode == "primary"
+    preference = read_preference("secondaryPreferred", 90)
+    assert preference.mongos_mode == "secondaryPreferred"
+    assert preference.max_staleness == 90
+    assert read_preference("nearest").max_staleness == -1
+
+    with pytest.raises(ValueError):
+        read_preference("secondaryPrefered")
+    with pytest.raises(ValueError):
+        read_preference("secondary", 30)
+
+
+def test_routes_default_to_primary_without_sessions(monkeypatch):
+    """
+    Test a router with no settings reads the primary and doesn't start sessions
+    """
+    monkeypatch.delenv("READ_PREFERENCE", raising=False)
+    client = mongomock.MongoClient()
+    reads = ReadRouter(client, client.db)
+    assert not reads.causal
+    assert reads.db("history").read_preference.mongos_mode == "primary"
+    with reads.session([1, 1]) as session:
+        assert session is None
+    assert write_token(None) is None
+
+
+def test_routes_from_environment(monkeypatch):
+    monkeypatch.setenv("READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setenv("READ_PREFERENCE_SUMMARY", "primary")
+    monkeypatch.setenv("READ_MAX_STALENESS", "90")
+    client = mongomock.MongoClient()
+    reads = ReadRouter(client, client.db)
+    assert reads.causal
+    assert reads.db("history").read_preference.max_staleness == 90
+    assert reads.db("analytics").read_preference.mongos_mode == "secondaryPreferred"
+    assert reads.db("summary").read_preference.mongos_mode == "primary"
+
+
+@pytest.fixture(scope="module")
+def replica_set():
+    if not ReplicaSet.available():
+        pytest.skip("mongod is not installed")
+    with ReplicaSet() as members:
+        yield members
+
+
+class CommandRecorder(MongoCommandTimer):
+    """
+    Command timer that also records which member each command was sent to
+    """
+
+    commands = []
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self.commands.append((event.command_name, collection, event.connection_id))
+
+
+def test_summary_reads_own_write_from_secondary(monkeypatch, replica_set):
+    """
+    Test a meal is on its summary and history pages right after it's added
+    while those pages are read from secondaries
+    """
+    monkeypatch.setenv("MONGO_URI", replica_set.uri)
+    monkeypatch.setenv("MONGO_DBNAME", "test_read_routing")
+    monkeypatch.setenv("READ_PREFERENCE", "secondary")
+    monkeypatch.setenv("READ_MAX_STALENESS", "90")
+    monkeypatch.setattr("app.MongoCommandTimer", CommandRecorder)
+    app = create_app()
+    app.testing = True
+    db = pymongo.MongoClient(replica_set.uri)["test_read_routing"]
+    db.client.drop_database(db.name)
+    client = app.test_client()
+    client.post("/register", data={
+        "username": "replicauser",
+        "password": "pass",
+        "confirm_password": "pass",
+    })
+
+    CommandRecorder.commands.clear()
+    with USDAStub({}) as stub:
+        monkeypatch.setattr("app.usda", USDAClient(api_key="key", base_url=stub.url, retries=0))
+        for i in range(5):
+            response = client.post(
+                "/add-meal",
+                data={"food_list": f"replicafood{i}", "meal_type": "lunch", "date": "2025-04-28"},
+            )
+            assert f"replicafood{i}" in client.get(response.location).data.decode("utf-8")
+            assert f"replicafood{i}" in client.get("/meal-history").data.decode("utf-8")
+
+    primary = db.client.primary
+    reads = [
+        address for name, collection, address in CommandRecorder.commands
+        if name == "find" and collection == "meals"
+    ]
+    assert reads
+    assert primary not in reads
+    db.client.drop_database(db.name)
+    db.client.close()
+
+
+def test_session_token_reads_after_write(monkeypatch, replica_set):
+    """
+    Test a read in a session advanced to a write token sees the write
+    """
+    monkeypatch.setenv("MONGO_URI", replica_set.uri)
+    monkeypatch.setenv("MONGO_DBNAME", "test_read_routing_trends")
+    monkeypatch.setenv("READ_PREFERENCE_ANALYTICS", "secondaryPreferred")
+    app = create_app()
+    reads = app.config["READ_ROUTER"]
+    db = reads.db("analytics")
+    user_id = ObjectId()
+    with reads.session() as session:
+        db.daily_totals.insert_one({"user_id": user_id, "date": "2025-04-28", "meals": 1}, session=session)
+        token = write_token(session)
+    with reads.session(token) as session:
+        assert db.daily_totals.find_one({"user_id": user_id}, session=session) is not None
+    db.client.drop_database(db.name)
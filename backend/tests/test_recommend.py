@@ -1,6 +1,17 @@
 """pytest tests for recommend.py"""
 
-from recommend import recommend_meal
+import numpy as np
+
+from recommend import (
+    FoodMatrix,
+    daily_deficits,
+    food_nutrients,
+    food_options,
+    recommend_for_day,
+    recommend_for_days,
+    recommend_meal,
+    shared_food_matrix,
+)
 
 def test_recommend_meal_output():
     nutrition = {
@@ -19,3 +30,86 @@ def test_recommend_meal_output():
     for foods in result.values():
         assert isinstance(foods, list)
         assert len(foods) == 3
+
+
+def test_daily_deficits():
+    totals = {"calories": 2500, "protein": 25, "carbohydrates": 0, "fiber": 14, "calcium": 1300}
+    percentages, remaining = daily_deficits([totals])
+
+    assert percentages.shape == (1, 5)
+    assert remaining[0].tolist() == [0, 25, 275, 14, 0]
+
+
+def test_recommend_for_day_picks_lowest_nutrients():
+    totals = {"calories": 1800, "protein": 45, "carbohydrates": 10, "fiber": 1, "calcium": 1200}
+    recommendations, still_needed = recommend_for_day("user1", "2025-04-28", totals)
+
+    assert set(recommendations) == {"carbohydrates", "fiber"}
+    assert still_needed["fiber"] == 27
+
+
+def test_recommend_for_day_is_memoized():
+    totals = {"calories": 100, "protein": 1, "carbohydrates": 1, "fiber": 1, "calcium": 1}
+    first = recommend_for_day("user2", "2025-04-28", totals)
+    second = recommend_for_day("user2", "2025-04-28", dict(totals))
+    assert first is second
+
+    # a new meal that day changes the totals and the recommendation
+    changed = recommend_for_day("user2", "2025-04-28", dict(totals, calories=900))
+    assert changed is not first
+
+
+def test_recommend_for_days_batch():
+    days = [
+        (f"user{i}", "2025-04-28", {"calories": 0, "protein": i, "carbohydrates": 0, "fiber": 0, "calcium": 0})
+        for i in range(100)
+    ]
+    results = recommend_for_days(days)
+    assert len(results) == 100
+    assert all(len(recommendations) == 2 for recommendations, _ in results)
+
+
+def test_every_option_has_nutrients():
+    for foods in food_options.values():
+        for food in foods:
+            assert food in food_nutrients
+
+
+def test_food_matrix_closes_the_gap():
+    matrix = FoodMatrix(variety=0)
+    # only calcium is missing so calcium rich foods should rank first
+    remaining = np.array([0, 0, 0, 0, 1000])
+    top = matrix.top_k(remaining, 3)[0]
+    assert top == ["yogurt", "milk", "spinach"]
+
+
+def test_food_matrix_batch_matches_single():
+    matrix = FoodMatrix(variety=0)
+    remaining = np.array([[0, 50, 0, 0, 0], [0, 0, 0, 28, 0]])
+    batch = matrix.top_k(remaining, 2)
+    assert batch == [matrix.top_k(row, 2)[0] for row in remaining]
+
+
+def test_food_matrix_seed_is_deterministic():
+    remaining = np.array([[500, 20, 100, 10, 500]] * 5)
+    first = FoodMatrix(seed=7, variety=0.5).top_k(remaining, 3)
+    second = FoodMatrix(seed=7, variety=0.5).top_k(remaining, 3)
+    assert first == second
+
+
+def test_shared_food_matrix_reads_seed_on_first_use(monkeypatch):
+    """
+    Test the seed is read when recommendations are first made, not at import
+    """
+    monkeypatch.setattr("recommend._food_matrix", None)
+    monkeypatch.setenv("RECOMMEND_SEED", "7")
+    remaining = np.array([[500, 20, 100, 10, 500]] * 5)
+    assert shared_food_matrix().top_k(remaining, 3) == FoodMatrix(seed=7).top_k(remaining, 3)
+    assert shared_food_matrix() is shared_food_matrix()
+
+
+def test_recommendations_come_from_nutrient_options():
+    totals = {"calories": 2000, "protein": 50, "carbohydrates": 275, "fiber": 0, "calcium": 0}
+    recommendations, _ = recommend_for_day("user3", "2025-04-28", totals)
+    for nutrient, foods in recommendations.items():
+        assert set(foods) <= set(food_options[nutrient])
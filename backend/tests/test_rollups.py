@@ -0,0 +1,115 @@
+"""testing for daily nutrition totals"""
+
+from datetime import datetime, timezone
+
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+
+from rollups import add_meal_totals, get_daily_totals, rebuild_daily_totals, update_meal_totals
+
+
+@pytest.fixture
+def db():
+    """
+    Create a mock mongo database
+    """
+    return mongomock.MongoClient().db
+
+
+def make_meal(user_id, date, calories, protein=0):
+    return {
+        "user_id": user_id,
+        "date": date,
+        "nutrition": {
+            "calories": calories,
+            "protein": protein,
+            "carbohydrates": 0,
+            "fiber": 0,
+            "calcium": 0,
+        },
+    }
+
+
+def test_totals_follow_inserts_and_deletes(db):
+    """
+    Test meals are added to and taken out of their day's totals
+    """
+    user_id = ObjectId()
+    breakfast = make_meal(user_id, "2025-04-28", 300, 10)
+    lunch = make_meal(user_id, "2025-04-28", 500, 20)
+    add_meal_totals(db.daily_totals, breakfast)
+    add_meal_totals(db.daily_totals, lunch)
+
+    totals = get_daily_totals(db.daily_totals, user_id, "2025-04-28")
+    assert totals["calories"] == 800
+    assert totals["protein"] == 30
+
+    add_meal_totals(db.daily_totals, lunch, sign=-1)
+    assert get_daily_totals(db.daily_totals, user_id, "2025-04-28")["calories"] == 300
+    assert db.daily_totals.find_one()["meals"] == 1
+
+
+def test_totals_follow_edits(db):
+    """
+    Test an edited meal only changes the totals by the difference
+    """
+    user_id = ObjectId()
+    meal = make_meal(user_id, "2025-04-28", 0)
+    add_meal_totals(db.daily_totals, meal)
+
+    old_nutrition = meal["nutrition"]
+    meal["nutrition"] = dict(old_nutrition, calories=450)
+    update_meal_totals(db.daily_totals, meal, old_nutrition)
+    assert get_daily_totals(db.daily_totals, user_id, "2025-04-28")["calories"] == 450
+
+
+def test_missing_day_is_empty(db):
+    """
+    Test a day without meals has zero totals
+    """
+    assert get_daily_totals(db.daily_totals, ObjectId(), "2025-04-28")["calories"] == 0
+
+
+def test_rebuild_matches_meals(db):
+    """
+    Test rebuilding sums every meal per user and day and drops stale days
+    """
+    user_id = ObjectId()
+    db.meals.insert_many([
+        make_meal(user_id, "2025-04-28", 300),
+        make_meal(user_id, "2025-04-28", 500),
+        make_meal(user_id, "2025-04-29", 200),
+        make_meal(ObjectId(), "2025-04-28", 100),
+        make_meal(user_id, "", 50),
+    ])
+    add_meal_totals(db.daily_totals, make_meal(user_id, "2025-01-01", 999))
+    # written long before the rebuild
+    db.daily_totals.update_one(
+        {"date": "2025-01-01"}, {"$set": {"updated_at": datetime(2025, 1, 1, tzinfo=timezone.utc)}}
+    )
+
+    assert rebuild_daily_totals(db) == 3
+    assert db.daily_totals.count_documents({}) == 3
+    assert get_daily_totals(db.daily_totals, user_id, "2025-04-28")["calories"] == 800
+    assert get_daily_totals(db.daily_totals, user_id, "2025-01-01")["calories"] == 0
+
+
+def test_rebuild_keeps_days_added_while_running(db, monkeypatch):
+    """
+    Test a day created by a live update during a rebuild isn't deleted
+    """
+    user_id = ObjectId()
+    db.meals.insert_one(make_meal(user_id, "2025-04-28", 300))
+    aggregate = db.meals.aggregate
+
+    def aggregate_then_add_meal(pipeline, **kwargs):
+        results = list(aggregate(pipeline, **kwargs))
+        meal = make_meal(user_id, "2025-04-29", 200)
+        db.meals.insert_one(meal)
+        add_meal_totals(db.daily_totals, meal)
+        return results
+
+    monkeypatch.setattr(db.meals, "aggregate", aggregate_then_add_meal)
+    assert rebuild_daily_totals(db) == 1
+    assert get_daily_totals(db.daily_totals, user_id, "2025-04-29")["calories"] == 200
@@ -0,0 +1,128 @@
+"""testing for coalescing concurrent lookups"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mongomock
+import pytest
+
+from nutrition import resolve_nutrition
+from nutrition_cache import NutritionCache
+from singleflight import SingleFlight
+from tests.usda_stub import USDAStub
+from usda_client import USDAClient
+
+FOODS = {"chicken": {"calories": {"value": 140}}, "rice": {"calories": {"value": 205}}}
+
+
+@pytest.fixture
+def executor():
+    """
+    Create a thread pool for lookups
+    """
+    pool = ThreadPoolExecutor(max_workers=16)
+    yield pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_concurrently(count, function):
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        barrier.wait()
+        results[i] = function()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_do_shares_one_call():
+    """
+    Test concurrent callers for one key share a single call
+    """
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+
+    results = run_concurrently(8, lambda: flights.do("eggs", slow))
+    assert results == ["result"] * 8
+    assert len(calls) == 1
+
+
+def test_do_shares_errors():
+    """
+    Test waiting callers get the leader's error
+    """
+    flights = SingleFlight()
+    flight, leader = flights.claim("eggs")
+    assert leader
+    _, leader = flights.claim("eggs")
+    assert not leader
+
+    flights.complete("eggs", error=ValueError("down"))
+    with pytest.raises(ValueError):
+        flight.wait(1)
+
+
+def test_waiter_gives_up_at_its_deadline(executor):
+    """
+    Test a meal waiting on another request's lookup leaves the food unresolved
+    once its deadline passes instead of raising
+    """
+    flights = SingleFlight()
+    _, leader = flights.claim("chicken")
+    assert leader
+    try:
+        results, unresolved = resolve_nutrition(["chicken"], None, executor, 0.05, flights=flights)
+    finally:
+        flights.complete("chicken", None)
+    assert results == {}
+    assert unresolved == ["chicken"]
+
+
+def test_concurrent_meals_call_upstream_once(executor):
+    """
+    Test many requests adding the same foods at once make one set of calls
+    """
+    flights = SingleFlight()
+    with USDAStub(FOODS, latency=0.1) as stub:
+        client = USDAClient(api_key="key", base_url=stub.url, retries=0, max_concurrency=16)
+        results = run_concurrently(8, lambda: resolve_nutrition(
+            ["chicken", "rice"], client, executor, 5, NutritionCache(), flights=flights
+        ))
+
+        assert stub.count("GET", "/foods/search") == 2
+        assert stub.count("POST", "/foods") == 1
+    for facts, unresolved in results:
+        assert unresolved == []
+        assert facts["chicken"]["calories"] == 140
+
+
+def test_workers_share_lookups_through_mongo(executor):
+    """
+    Test a second worker waits for the first one's result in the shared cache
+    """
+    db = mongomock.MongoClient().db
+    with USDAStub(FOODS, latency=0.2) as stub:
+        def worker():
+            # each worker has its own flights and in-process cache
+            client = USDAClient(api_key="key", base_url=stub.url, retries=0)
+            cache = NutritionCache(db.nutrition_cache)
+            return resolve_nutrition(
+                ["chicken"], client, executor, 5, cache, flights=SingleFlight(db.nutrition_locks)
+            )
+
+        results = run_concurrently(2, worker)
+        assert stub.count("GET", "/foods/search") == 1
+    assert all(facts["chicken"]["calories"] == 140 for facts, _ in results)
+    assert db.nutrition_locks.count_documents({}) == 0
@@ -0,0 +1,85 @@
+"""testing for cached user loading"""
+
+import time
+
+import mongomock
+import pytest
+
+from ttl_cache import CACHE_LOOKUPS, TTLCache
+
+
+@pytest.fixture
+def count_user_queries(monkeypatch):
+    """
+    Count queries against the users collection
+    """
+    calls = []
+    find_one = mongomock.collection.Collection.find_one
+
+    def counting_find_one(self, *args, **kwargs):
+        if self.name == "users":
+            calls.append(args)
+        return find_one(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "find_one", counting_find_one)
+    return calls
+
+
+def test_ttl_cache_expiry_and_eviction():
+    """
+    Test entries expire and the least recently used entry is evicted
+    """
+    cache = TTLCache("test", max_size=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_logged_in_requests_skip_user_query(client, register, count_user_queries):
+    """
+    Test page views after login load the user from the cache
+    """
+    register(client, "cacheduser")
+    hits = CACHE_LOOKUPS.value("users", "hit")
+    count_user_queries.clear()
+
+    for _ in range(3):
+        response = client.get("/home")
+        assert "Welcome, cacheduser!" in response.data.decode("utf-8")
+    assert count_user_queries == []
+    assert CACHE_LOOKUPS.value("users", "hit") == hits + 3
+
+
+def test_logout_invalidates_cached_user(app, client, register):
+    """
+    Test a logged out user is dropped from the cache
+    """
+    register(client, "cacheduser")
+    cache = app.config["USER_CACHE"]
+    assert len(cache._entries) == 1
+
+    client.get("/logout")
+    assert len(cache._entries) == 0
+    assert client.get("/home").status_code == 302
+
+
+def test_user_in_session(monkeypatch, make_app, register, count_user_queries):
+    """
+    Test the username can be carried in the signed session
+    """
+    monkeypatch.setenv("USER_SESSION_MODE", "session")
+    app = make_app()
+    client = app.test_client()
+    register(client, "cacheduser")
+    app.config["USER_CACHE"].clear()
+    count_user_queries.clear()
+
+    response = client.get("/home")
+    assert "Welcome, cacheduser!" in response.data.decode("utf-8")
+    assert count_user_queries == []
@@ -0,0 +1,141 @@
+"""testing for the USDA api client"""
+
+import pytest
+import requests
+
+from tests.usda_stub import USDAStub
+from usda_client import CircuitBreaker, USDAClient, USDAError, USDAUnavailable
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data
+
+
+class FakeSession(requests.Session):
+    """
+    Session that returns queued responses instead of calling the api
+    """
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def make_client(responses, **kwargs):
+    kwargs.setdefault("retries", 2)
+    kwargs.setdefault("backoff", 0)
+    return USDAClient(api_key="key", session=FakeSession(responses), **kwargs)
+
+
+def test_search_uses_timeout_and_params():
+    """
+    Test search sends the query, key and timeout
+    """
+    client = make_client([FakeResponse(200, {"foods": [{"fdcId": 42}]})])
+    assert client.search("peanut butter") == 42
+
+    _, url, kwargs = client.session.calls[0]
+    assert url.endswith("/foods/search")
+    assert kwargs["params"] == {"query": "peanut butter", "api_key": "key"}
+    assert kwargs["timeout"] == client.timeout
+
+
+def test_retries_server_errors():
+    """
+    Test 429 and 5xx responses are retried
+    """
+    client = make_client([
+        FakeResponse(429),
+        requests.ConnectionError(),
+        FakeResponse(200, {"labelNutrients": {"calories": {"value": 5}}}),
+    ])
+    assert client.food(1) == {"calories": {"value": 5}}
+    assert len(client.session.calls) == 3
+
+
+def test_client_errors_are_not_retried():
+    """
+    Test a 4xx response fails straight away
+    """
+    client = make_client([FakeResponse(404)])
+    with pytest.raises(USDAError):
+        client.food(1)
+    assert len(client.session.calls) == 1
+    assert client.breaker.state == "closed"
+
+
+def test_breaker_opens_after_failures():
+    """
+    Test the breaker stops calls once the api keeps failing
+    """
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    client = make_client([FakeResponse(503)] * 2, retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(USDAError):
+            client.search("eggs")
+
+    assert breaker.state == "open"
+    with pytest.raises(USDAUnavailable):
+        client.search("eggs")
+    assert len(client.session.calls) == 2
+
+
+def test_breaker_half_open_trial():
+    """
+    Test one trial call is allowed after the reset timeout
+    """
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_bad_bodies_release_half_open_trial():
+    """
+    Test errors other than connection failures still finish a half-open trial
+    """
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    client = make_client([
+        requests.exceptions.ChunkedEncodingError(),
+        ValueError("unexpected"),
+        FakeResponse(200, {"foods": []}),
+    ], retries=0, breaker=breaker)
+    # each failed trial lets the next call be the next trial instead of sticking open
+    with pytest.raises(USDAError):
+        client.search("eggs")
+    with pytest.raises(ValueError):
+        client.search("eggs")
+    assert client.search("eggs") is None
+    assert breaker.state == "closed"
+
+
+def test_bulk_foods_against_stub():
+    """
+    Test details for many ids come back from one bulk request
+    """
+    foods = {
+        "eggs": {"calories": {"value": 70}},
+        "rice": {"calories": {"value": 200}},
+    }
+    with USDAStub(foods) as stub:
+        client = USDAClient(api_key="key", base_url=stub.url, retries=0)
+        nutrients = client.foods([1, 2, 2, 99])
+        assert nutrients == {1: foods["eggs"], 2: foods["rice"]}
+        assert stub.count("POST", "/foods") == 1
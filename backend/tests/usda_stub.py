@@ -0,0 +1,101 @@
+"""local stand-in for the USDA FoodData Central api used by tests"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class USDAStub:
+    """
+    Serve /foods/search, /food/<id> and POST /foods from a dict of foods
+
+    foods: dict of food name -> labelNutrients, ids are assigned in order
+    latency: seconds to sleep before each response
+    """
+
+    def __init__(self, foods, latency=0):
+        self.foods = {}
+        self.ids = {}
+        for fdc_id, (name, nutrients) in enumerate(foods.items(), start=1):
+            self.ids[name] = fdc_id
+            self.foods[fdc_id] = nutrients
+        self.latency = latency
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, method, path_prefix):
+        """
+        Return how many requests were made for a method and path prefix
+        """
+        with self._lock:
+            return sum(
+                1 for m, p in self.requests if m == method and p.startswith(path_prefix)
+            )
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                stub._record("GET", url.path)
+                if url.path == "/foods/search":
+                    query = parse_qs(url.query).get("query", [""])[0]
+                    fdc_id = stub.ids.get(query)
+                    foods = [{"fdcId": fdc_id}] if fdc_id else []
+                    return self._send(200, {"foods": foods})
+                if url.path.startswith("/food/"):
+                    fdc_id = int(url.path.rsplit("/", 1)[1])
+                    if fdc_id not in stub.foods:
+                        return self._send(404, {})
+                    return self._send(200, {"fdcId": fdc_id, "labelNutrients": stub.foods[fdc_id]})
+                self._send(404, {})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                stub._record("POST", url.path)
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if url.path != "/foods":
+                    return self._send(404, {})
+                foods = [
+                    {"fdcId": fdc_id, "labelNutrients": stub.foods[fdc_id]}
+                    for fdc_id in body["fdcIds"]
+                    if fdc_id in stub.foods
+                ]
+                self._send(200, foods)
+
+            def _send(self, status, data):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def _record(self, method, path):
+        with self._lock:
+            self.requests.append((method, path))
@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+CACHE_LOOKUPS = REGISTRY.counter(
+    "cache_lookups_total", "In-process cache lookups", ("cache", "result")
+)
+
+
+class TTLCache:
+    """
+    Bounded in-process cache where entries expire after ttl seconds
+
+    Least recently used entries are evicted once max_size is reached. Hits and
+    misses are counted in /metrics under the cache's name.
+    """
+
+    def __init__(self, name, max_size, ttl):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the value for key, or None if it is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_LOOKUPS.inc(self.name, "hit")
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        CACHE_LOOKUPS.inc(self.name, "miss")
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,213 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import dependency_timer
+
+USDA_BASE_URL = "https://api.nal.usda.gov/fdc/v1"
+
+# most ids the bulk /foods endpoint accepts in one request
+FOODS_BATCH_SIZE = 20
+
+# status codes worth retrying, everything else is returned to the caller
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class USDAError(Exception):
+    """
+    Raised when the USDA api can not answer a request
+    """
+
+
+class USDAUnavailable(USDAError):
+    """
+    Raised without calling the api while the circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Stop calling the USDA api after repeated failures
+
+    After failure_threshold failures in a row the breaker opens and every call
+    is rejected for reset_timeout seconds. After that a single trial call is let
+    through (half-open); success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """
+        Return True if a call to the api may be made
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class USDAClient:
+    """
+    Client for the USDA FoodData Central api
+
+    Keeps a pooled keep-alive session shared by all threads, applies connect and
+    read timeouts, retries 429/5xx responses with jittered exponential backoff and
+    limits how many requests are in flight at once.
+    """
+
+    def __init__(
+        self,
+        api_key=None,
+        base_url=None,
+        timeout=None,
+        retries=None,
+        backoff=None,
+        max_concurrency=None,
+        breaker=None,
+        session=None,
+    ):
+        self._api_key = api_key
+        self.base_url = (base_url or os.getenv("USDA_BASE_URL", USDA_BASE_URL)).rstrip("/")
+        self.timeout = timeout or (
+            float(os.getenv("USDA_CONNECT_TIMEOUT", 3.05)),
+            float(os.getenv("USDA_READ_TIMEOUT", 10)),
+        )
+        self.retries = int(os.getenv("USDA_RETRIES", 3)) if retries is None else retries
+        self.backoff = float(os.getenv("USDA_BACKOFF", 0.5)) if backoff is None else backoff
+        self.max_concurrency = max_concurrency or int(os.getenv("USDA_MAX_CONCURRENCY", 4))
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("USDA_BREAKER_FAILURES", 5)),
+            reset_timeout=float(os.getenv("USDA_BREAKER_RESET", 30)),
+        )
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def api_key(self):
+        # read lazily so keys loaded from .env after import are picked up
+        return self._api_key or os.getenv("FOOD_API_KEY")
+
+    def search(self, query):
+        """
+        Search for a food and return the fdcId of the first result, or None
+        """
+        data = self._request("GET", "/foods/search", "search", params={"query": query})
+        foods = data.get("foods") or []
+        if not foods:
+            return None
+        return foods[0]["fdcId"]
+
+    def food(self, fdc_id):
+        """
+        Return the labelNutrients dict for a food
+        """
+        data = self._request("GET", f"/food/{fdc_id}", "food")
+        return data.get("labelNutrients", {})
+
+    def foods(self, fdc_ids):
+        """
+        Fetch details for many foods with the bulk /foods endpoint
+        returns: dict of fdcId -> labelNutrients, ids USDA doesn't return are left out
+        """
+        fdc_ids = list(dict.fromkeys(fdc_ids))
+        nutrients = {}
+        for i in range(0, len(fdc_ids), FOODS_BATCH_SIZE):
+            data = self._request(
+                "POST", "/foods", "foods", json={"fdcIds": fdc_ids[i:i + FOODS_BATCH_SIZE]}
+            )
+            for food in data:
+                nutrients[food["fdcId"]] = food.get("labelNutrients", {})
+        return nutrients
+
+    def _request(self, method, path, operation, params=None, json=None):
+        if not self.breaker.allow():
+            raise USDAUnavailable("USDA api circuit breaker is open")
+
+        params = dict(params or {}, api_key=self.api_key)
+        url = self.base_url + path
+        error = None
+        # every way out records success or failure, so a half-open trial is
+        # always finished even if something unexpected is raised
+        api_up = False
+
+        try:
+            for attempt in range(self.retries + 1):
+                retry_after = None
+                try:
+                    with self._slots, dependency_timer("usda", operation):
+                        response = self.session.request(
+                            method, url, params=params, json=json, timeout=self.timeout
+                        )
+                        data = response.json() if response.status_code == 200 else None
+                except requests.RequestException as e:
+                    # connection errors, timeouts, broken or invalid bodies
+                    error = e
+                else:
+                    if response.status_code == 200:
+                        api_up = True
+                        return data
+                    if response.status_code not in RETRY_STATUSES:
+                        # the api is up but did not like this request
+                        api_up = True
+                        raise USDAError(f"USDA api returned {response.status_code} for {path}")
+                    error = USDAError(f"USDA api returned {response.status_code} for {path}")
+                    retry_after = response.headers.get("Retry-After")
+
+                if attempt < self.retries:
+                    time.sleep(self._backoff_delay(attempt, retry_after))
+
+            raise USDAError(str(error)) from error
+        finally:
+            if api_up:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.timeout[1])
+        # full jitter so retrying workers don't hit the api in lockstep
+        return random.uniform(0, self.backoff * (2 ** attempt))